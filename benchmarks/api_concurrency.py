@@ -0,0 +1,92 @@
+"""API throughput and tail latency under many concurrent dashboard clients
+
+Seeds a database, then runs api_server.py once per --pool value (0 is the
+old connect-per-request behaviour) while --clients concurrent clients
+request a dashboard mix of /api/history and /api/trip/summary for
+--seconds each.
+
+    python benchmarks/api_concurrency.py --rows 200000 --clients 128 --pool 0 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from common import percentile, start, stop, wait_for
+from run_suite import seed_database
+
+PORT = 8779
+URLS = (
+    '/api/trip/summary',
+    '/api/history?minutes=1',
+    '/api/history?hours=1&resolution=1m',
+    '/api/trips?limit=20',
+)
+
+async def request(url):
+    """(status, body bytes) over a fresh connection; werkzeug closes after each response"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    try:
+        writer.write(f'GET {url} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode())
+        status = int((await reader.readline()).split()[1])
+        return status, await reader.read()
+    finally:
+        writer.close()
+
+async def client(urls, index, deadline, latencies, errors):
+    i = index
+    while time.perf_counter() < deadline:
+        url = urls[i % len(urls)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            status, _ = await request(url)
+        except (OSError, IndexError, ValueError) as exc:
+            errors.append(type(exc).__name__)
+            continue
+        if status != 200:
+            errors.append(status)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+async def load(urls, clients, seconds):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(client(urls, i, deadline, latencies, errors) for i in range(clients)))
+    return latencies, errors, time.perf_counter() - started
+
+def run(urls, pool, clients, seconds, workdir):
+    server = start('python/api_server.py', '--host', '127.0.0.1', '--port', PORT, '--db-pool', pool, cwd=workdir)
+    try:
+        wait_for(f'http://127.0.0.1:{PORT}/api/trips?limit=1')
+        latencies, errors, elapsed = asyncio.run(load(urls, clients, seconds))
+    finally:
+        stop(server)
+    return {
+        'pool': pool,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else None,
+        'errors': len(errors),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--clients', type=int, default=128)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--pool', type=int, nargs='+', default=[0, 8])
+    parser.add_argument('--urls', nargs='+', default=URLS, help='request mix, cycled per client')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_database(os.path.join(workdir, 'vehicle_data.db'), args.rows)
+        results = {'rows': args.rows, 'clients': args.clients, 'runs': []}
+        for pool in args.pool:
+            results['runs'].append(run(args.urls, pool, args.clients, args.seconds, workdir))
+
+    print(json.dumps(results, indent=2))
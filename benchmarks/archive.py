@@ -0,0 +1,114 @@
+"""Columnar archive vs SQLite day shard: size, range scans and analytics loads
+
+Seeds one day shard with --hours of 20 Hz random-walk samples (engine
+signals drift, coolant warms up and holds, gear changes every few
+seconds), converts it with write_archive and compares:
+
+  size       the VACUUMed shard file vs the archive
+  range_1h   one hour of raw rows as tuples (the /api/history and export path)
+  day_numpy  the whole day as analytics column arrays (TripAnalytics.iter_chunks)
+
+    python benchmarks/archive.py --hours 8 --repeat 5
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import common  # noqa: F401  (puts python/ on sys.path)
+from columnar_archive import COLUMNS, ColumnarArchive, write_archive
+from trip_analytics import LOAD_SQL, TripAnalytics
+from trip_shards import TRIP_DATA_COLUMNS
+
+DAY = datetime(2026, 10, 1)
+
+def seed(path, hours, rate=20):
+    conn = sqlite3.connect(path)
+    conn.execute(f'CREATE TABLE trip_data {TRIP_DATA_COLUMNS}')
+    conn.execute('CREATE INDEX idx_trip_data_timestamp ON trip_data(timestamp)')
+    rng = random.Random(1)
+    ts = DAY + timedelta(hours=6)
+    rpm, speed, throttle, coolant, gear = 800, 0.0, 0, 20, 'N'
+    batch = []
+    for n in range(int(hours * 3600 * rate)):
+        # Sample clock with a little scheduling jitter
+        ts += timedelta(microseconds=1_000_000 // rate + rng.randint(-500, 500))
+        throttle = max(0, min(100, throttle + rng.randint(-3, 3)))
+        rpm = max(700, min(6500, rpm + rng.randint(-30, 30) + (throttle - 30) // 10))
+        speed = max(0.0, min(160.0, speed + (throttle - 30) / 400))
+        if n % 1200 == 0:
+            coolant = min(90, coolant + 2)
+        if n % 160 == 0:
+            gear = str(max(1, min(6, int(speed // 25) + 1))) if speed > 2 else 'N'
+        fuel = round(0.0002 + rpm / 1000 * 0.001 + throttle / 100 * 0.002, 6)
+        batch.append((n + 1, ts, rpm, int(speed), coolant, throttle, gear, fuel))
+        if len(batch) == 50000:
+            conn.executemany('INSERT INTO trip_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            batch = []
+    conn.executemany('INSERT INTO trip_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+def best_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 2), result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        shard = os.path.join(workdir, 'trip_data_2026-10-01.db')
+        target = os.path.join(workdir, 'trip_data_2026-10-01.vca')
+        seed(shard, args.hours)
+        conn = sqlite3.connect(shard)
+        rows = conn.execute('SELECT COUNT(*) FROM trip_data').fetchone()[0]
+
+        started = time.perf_counter()
+        write_archive(target, conn.execute(f"SELECT {', '.join(COLUMNS)} FROM trip_data ORDER BY id"))
+        encode_s = time.perf_counter() - started
+        archive = ColumnarArchive(target)
+
+        start, end = DAY + timedelta(hours=8), DAY + timedelta(hours=9)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM trip_data WHERE timestamp >= ? AND timestamp < ? ORDER BY id"
+        sqlite_1h, expected = best_ms(lambda: conn.execute(sql, (start, end)).fetchall(), args.repeat)
+        archive_1h, got = best_ms(
+            lambda: [row for chunk in archive.iter_rows(COLUMNS, start, end) for row in chunk], args.repeat)
+        assert got == expected
+
+        analytics = TripAnalytics()
+        day = (str(DAY.date()), str((DAY + timedelta(days=1)).date()))
+        def sqlite_day():
+            cursor = conn.execute(LOAD_SQL.format(table='trip_data'), day)
+            return sum(len(rows) for rows in iter(lambda: cursor.fetchmany(250000), []))
+        def archive_day():
+            return sum(len(chunk[0]) for chunk in analytics.iter_archive(archive, *day))
+        sqlite_day_ms, sqlite_rows = best_ms(sqlite_day, args.repeat)
+        archive_day_ms, archive_rows = best_ms(archive_day, args.repeat)
+        assert sqlite_rows == archive_rows == rows
+
+        sqlite_bytes, archive_bytes = os.path.getsize(shard), os.path.getsize(target)
+        results = {
+            'rows': rows,
+            'size': {'sqlite_bytes': sqlite_bytes, 'archive_bytes': archive_bytes,
+                     'ratio': round(sqlite_bytes / archive_bytes, 1),
+                     'bytes_per_row': round(archive_bytes / rows, 2)},
+            'encode_s': round(encode_s, 2),
+            'range_1h_ms': {'sqlite': sqlite_1h, 'archive': archive_1h, 'rows': len(expected)},
+            'day_numpy_ms': {'sqlite': sqlite_day_ms, 'archive': archive_day_ms},
+        }
+        archive.close()
+        conn.close()
+
+    print(json.dumps(results, indent=2))
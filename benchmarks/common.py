@@ -0,0 +1,56 @@
+"""Helpers shared by the benchmark scripts"""
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+PYTHON_DIR = os.path.join(ROOT, 'python')
+if PYTHON_DIR not in sys.path:
+    sys.path.insert(0, PYTHON_DIR)
+# Bridges started by a benchmark publish into their own shared state segment,
+# never the one a running production bridge owns
+os.environ.setdefault('VEP_SHARED_STATE', f'vehicle_ease_bench_{os.getpid()}')
+
+def start(script, *args, cwd=None):
+    """Run a repo script as a child process with its output discarded"""
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, script), *map(str, args)],
+                            cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def stop(*processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+def get_json(url, timeout=1):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.load(response)
+
+def wait_for(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            return get_json(url)
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+def rss_kb(pid):
+    """Resident set size of a process from /proc (Linux), None elsewhere"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
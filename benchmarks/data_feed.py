@@ -0,0 +1,124 @@
+"""Engine simulator data fetch cost per frame: blocking /data GET vs DataFeed
+
+Runs local stand-ins for the broadcast hub (WebSocket, --rate samples/s)
+and for the bridge's /data endpoint (answering after --latency seconds),
+then times what one frame spends getting data:
+
+  blocking   requests.get per frame, as EngineSimulator used to
+  websocket  DataFeed subscribed to the stand-in hub
+  http       DataFeed with no hub, falling back to polling the slow /data
+  offline    DataFeed with nothing listening
+
+    python benchmarks/data_feed.py --latency 0.05 --rate 20 --frames 300
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import common  # noqa: F401  (puts python/ on sys.path)
+from common import percentile
+from data_feed import DataFeed
+
+import requests
+import websockets
+
+HUB_PORT = 8797
+HTTP_PORT = 8798
+CLOSED_PORT = 8799
+
+def make_sample(n):
+    return {'rpm': 800 + (n * 50) % 6000, 'speed': (n // 4) % 120, 'coolant': 90,
+            'throttle': n % 100, 'ts': time.time()}
+
+def run_hub(rate, ready, stop):
+    async def handler(websocket):
+        n = 0
+        while not stop.is_set():
+            await websocket.send(json.dumps(make_sample(n)))
+            n += 1
+            await asyncio.sleep(1 / rate)
+
+    async def main():
+        async with websockets.serve(handler, '127.0.0.1', HUB_PORT):
+            ready.set()
+            while not stop.is_set():
+                await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+
+def run_http(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        count = 0
+
+        def do_GET(self):
+            time.sleep(latency)
+            Handler.count += 1
+            body = json.dumps(make_sample(Handler.count)).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', HTTP_PORT), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def time_frames(fetch, frames, fps=60):
+    """Per-frame fetch times while pacing frames at fps"""
+    timings = []
+    for _ in range(frames):
+        started = time.perf_counter()
+        fetch()
+        elapsed = time.perf_counter() - started
+        timings.append(elapsed)
+        time.sleep(max(0, 1 / fps - elapsed))
+    return {
+        'fetch_ms_p50': round(percentile(timings, 0.5) * 1000, 3),
+        'fetch_ms_p99': round(percentile(timings, 0.99) * 1000, 3),
+        'fetch_ms_max': round(max(timings) * 1000, 3),
+    }
+
+def bench_feed(feed, frames):
+    feed.start()
+    time.sleep(0.5)  # let it connect (or fail over)
+    hits = []
+    result = time_frames(lambda: hits.append(feed.sample() is not None), frames)
+    result.update({'frames_with_data': sum(hits), 'samples_received': feed.received, 'source': feed.source})
+    feed.stop()
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='stand-in /data response delay (s)')
+    parser.add_argument('--rate', type=float, default=20, help='stand-in hub samples per second')
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    http_server = run_http(args.latency)
+    data_url = f'http://127.0.0.1:{HTTP_PORT}/data'
+    results = {'latency_s': args.latency, 'rate': args.rate, 'frames': args.frames}
+
+    results['blocking'] = time_frames(lambda: requests.get(data_url).json(), args.frames)
+
+    ready, stop = threading.Event(), threading.Event()
+    hub = threading.Thread(target=run_hub, args=(args.rate, ready, stop), daemon=True)
+    hub.start()
+    ready.wait(5)
+    results['websocket'] = bench_feed(DataFeed(f'ws://127.0.0.1:{HUB_PORT}', data_url), args.frames)
+    stop.set()
+    hub.join()
+
+    results['http'] = bench_feed(DataFeed(f'ws://127.0.0.1:{CLOSED_PORT}', data_url), args.frames)
+    http_server.shutdown()
+    results['offline'] = bench_feed(
+        DataFeed(f'ws://127.0.0.1:{CLOSED_PORT}', f'http://127.0.0.1:{CLOSED_PORT}/data'), args.frames)
+
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,31 @@
+"""Per-vehicle CPU overhead of the data bridge in fleet mode
+
+Starts fake_server.py and `data_bridge.py --fleet N`, lets them run, then
+reads /fleet/stats from the bridge.
+
+    python benchmarks/fleet_bridge.py --vehicles 200 --seconds 20 --batch 5
+"""
+import argparse
+import json
+import time
+
+from common import start, stop, wait_for
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--batch', type=int, default=1, help='samples per binary frame from the source')
+    args = parser.parse_args()
+
+    source = start('fake_server.py', '--batch', args.batch)
+    bridge = start('python/data_bridge.py', '--fleet', args.vehicles)
+    try:
+        wait_for('http://localhost:8766/fleet/stats')
+        time.sleep(args.seconds)
+        stats = wait_for('http://localhost:8766/fleet/stats')
+    finally:
+        stop(bridge, source)
+
+    stats['batch'] = args.batch
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,128 @@
+"""Fuel/distance integration: per-sample TripIntegrator vs the integrate_trip batch path
+
+Generates --rows samples at --rate Hz (with jitter and the odd dropped
+second) and integrates them both ways, checking they agree. Also shows
+what the old one-sample-per-second accumulation reported for the same
+stream. Then logs --stored-rows of them as today's trip_data and checks
+that /api/trip/summary, /api/analytics and DataLogger.get_trip_statistics
+report the same fuel as integrate_trip. Finally checks that a trip closed
+by idling after its last moving sample doesn't count the idle tail.
+
+    python benchmarks/fuel_integration.py --rows 2000000 --rate 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+import common  # noqa: F401  (puts python/ on sys.path)
+from fuel_model import TripIntegrator, fuel_rate, integrate_trip
+from trip_segmenter import TripSegmenter
+
+def make_samples(rows, rate, seed=1):
+    rng = np.random.default_rng(seed)
+    dt = 1 / rate + rng.uniform(-0.002, 0.002, rows)
+    dt[rng.random(rows) < 0.0005] = 30.0  # link drops / parked
+    t = 1.7e9 + np.cumsum(dt)
+    rpm = np.clip(2000 + np.cumsum(rng.integers(-20, 21, rows)), 700, 6500).astype(np.int64)
+    speed = np.clip(50 + np.cumsum(rng.normal(0, 0.2, rows)), 0, 160).astype(np.int64)
+    throttle = np.clip(30 + np.cumsum(rng.integers(-2, 3, rows)), 0, 100).astype(np.int64)
+    return t, rpm, speed, throttle
+
+def per_sample(t, rpm, speed, throttle):
+    trip = TripIntegrator()
+    for ts, r, s, th in zip(t.tolist(), rpm.tolist(), speed.tolist(), throttle.tolist()):
+        trip.add(ts, s, fuel_rate(r, th))
+    return trip.distance_km, trip.fuel_l
+
+def stored_fuel(t, rpm, speed, throttle, workdir):
+    """Fuel as each API reports it after the samples are logged (ending now), plus integrate_trip's"""
+    import api_server
+    from data_logger import DataLogger
+    t = t - t[-1] + time.time()  # keep every sample inside today
+    t = t[t >= datetime.combine(datetime.now().date(), datetime.min.time()).timestamp()]
+    rpm, speed, throttle = rpm[-len(t):], speed[-len(t):], throttle[-len(t):]
+    path = os.path.join(workdir, 'fuel.db')
+    logger = DataLogger(path)
+    rows = [(datetime.fromtimestamp(ts), r, s, 90, th, '3', logger.calculate_fuel_consumption({'rpm': r, 'throttle': th}))
+            for ts, r, s, th in zip(t.tolist(), rpm.tolist(), speed.tolist(), throttle.tolist())]
+    half = len(rows) // 2
+    api_server.DB_PATH = path
+    client = api_server.app.test_client()
+    # Two writes with a summary in between, so the incremental aggregate is exercised too
+    logger._write_rows(logger.conn, rows[:half])
+    client.get('/api/trip/summary')
+    logger._write_rows(logger.conn, rows[half:])
+    api_server.response_cache.invalidate()
+    result = {
+        'rows': len(rows),
+        'integrate_trip': round(float(integrate_trip(t, rpm, speed, throttle)[2][-1]), 3),
+        'trip_summary': client.get('/api/trip/summary').json['fuel_used_liters'],
+        'analytics': client.get('/api/analytics?days=1').json['total']['fuel_used_liters'],
+        'trip_statistics': round(logger.get_trip_statistics()[3], 3),
+    }
+    logger.close()
+    return result
+
+def idle_tail_trip(moving_seconds=120, idle_seconds=400):
+    """Summary of a 1 Hz trip that moves, then idles until idle_timeout closes it"""
+    closed = []
+    segmenter = TripSegmenter(closed.append)
+    for ts in range(moving_seconds + idle_seconds):
+        moving = ts < moving_seconds
+        segmenter.add(1.7e9 + ts, 2000 if moving else 800, 50 if moving else 0, 0.002 if moving else 0.0003)
+    assert len(closed) == 1, closed
+    return closed[0]
+
+def per_second_assumption(rpm, speed, throttle):
+    """What data_bridge used to do: every sample counted as one second"""
+    return float(speed.sum() / 3600), float(fuel_rate(rpm, throttle).sum() / 3600)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--rate', type=float, default=20)
+    parser.add_argument('--stored-rows', type=int, default=100000, help='logged to SQLite for the API check')
+    args = parser.parse_args()
+
+    t, rpm, speed, throttle = make_samples(args.rows, args.rate)
+
+    started = time.perf_counter()
+    live = per_sample(t, rpm, speed, throttle)
+    live_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _, distance, fuel = integrate_trip(t, rpm, speed, throttle)
+    batch_s = time.perf_counter() - started
+    batch = (float(distance[-1]), float(fuel[-1]))
+    assert np.allclose(live, batch, rtol=1e-9)
+
+    old = per_second_assumption(rpm, speed, throttle)
+    with tempfile.TemporaryDirectory() as workdir:
+        n = min(args.stored_rows, args.rows)
+        stored = stored_fuel(t[:n], rpm[:n], speed[:n], throttle[:n], workdir)
+    fuel_values = [value for key, value in stored.items() if key != 'rows']
+    assert max(fuel_values) - min(fuel_values) <= 0.001, stored
+
+    # Nothing after the last moving sample: idle within the duration, fuel from the moving part only
+    idle_tail = idle_tail_trip()
+    assert idle_tail['end'] - idle_tail['start'] == idle_tail['duration_seconds'] == 119, idle_tail
+    assert idle_tail['idle_seconds'] + idle_tail['moving_seconds'] <= idle_tail['duration_seconds'], idle_tail
+    assert idle_tail['fuel_used_liters'] == round(119 * 0.002, 3), idle_tail
+    print(json.dumps({
+        'rows': args.rows,
+        'rate_hz': args.rate,
+        'per_sample': {'seconds': round(live_s, 3), 'rows_per_s': round(args.rows / live_s)},
+        'batch': {'seconds': round(batch_s, 3), 'rows_per_s': round(args.rows / batch_s)},
+        'speedup': round(live_s / batch_s, 1),
+        'distance_km': round(batch[0], 3),
+        'fuel_l': round(batch[1], 3),
+        'old_per_second_distance_km': round(old[0], 3),
+        'old_per_second_fuel_l': round(old[1], 3),
+        'stored_fuel_l': stored,
+        'idle_tail_trip': idle_tail,
+    }, indent=2))
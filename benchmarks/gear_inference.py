@@ -0,0 +1,94 @@
+"""Gear inference: old if-chain / nearest-ratio scan vs the lookup table, live and vectorized
+
+Synthesizes --rows samples from a car with known ratios (--noise ratio jitter,
+gear held for a few seconds at a time) and reports per-sample cost,
+vectorized throughput, displayed gear changes with and without
+hysteresis, and how close calibrate() gets to the true ratios.
+
+    python benchmarks/gear_inference.py --rows 1000000 --noise 0.04
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (puts python/ on sys.path)
+from gear_model import GEARS, GearModel, GearTracker, calibrate
+
+TRUE_RATIOS = {'1': 340.0, '2': 190.0, '3': 128.0, '4': 97.0, '5': 78.0, '6': 65.0}
+OLD_SIM_RATIOS = {"1": 3.8, "2": 2.2, "3": 1.5, "4": 1.1, "5": 0.8, "6": 0.6}
+
+def old_bridge_gear(rpm, speed):
+    if speed == 0 or rpm < 500:
+        return "N"
+    ratio = rpm / max(1, speed)
+    if ratio > 300: return "1"
+    elif ratio > 200: return "2"
+    elif ratio > 150: return "3"
+    elif ratio > 120: return "4"
+    elif ratio > 100: return "5"
+    else: return "6"
+
+def old_sim_gear(rpm, speed):
+    if speed == 0 or rpm < 500:
+        return "N"
+    ratio = rpm / max(1, speed)
+    return min(OLD_SIM_RATIOS, key=lambda gear: abs(ratio - OLD_SIM_RATIOS[gear] * 100))
+
+def make_samples(rows, noise, seed=1):
+    rng = np.random.default_rng(seed)
+    # Hold each gear 2-10 s at 20 Hz
+    holds = rng.integers(40, 200, rows // 40 + 1)
+    gears = np.repeat(rng.integers(0, 6, len(holds)), holds)[:rows]
+    speed = rng.uniform(12, 140, rows).round()
+    ratio = np.array(list(TRUE_RATIOS.values()))[gears] * rng.normal(1, noise, rows)
+    rpm = (ratio * speed).round()
+    return rpm, speed, gears + 2  # codes into GEARS
+
+def per_sample(fn, rpm, speed):
+    started = time.perf_counter()
+    out = [fn(r, s) for r, s in zip(rpm, speed)]
+    return time.perf_counter() - started, out
+
+def changes(codes):
+    return int(np.count_nonzero(np.diff(np.asarray(codes))))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--noise', type=float, default=0.04, help='relative rpm/speed ratio jitter')
+    args = parser.parse_args()
+
+    rpm, speed, truth = make_samples(args.rows, args.noise)
+    rpm_list, speed_list = rpm.tolist(), speed.tolist()
+    calibrated = calibrate([(rpm, speed)])
+    model = GearModel(calibrated)
+    results = {'rows': args.rows, 'true_ratios': TRUE_RATIOS, 'calibrated_ratios': calibrated}
+
+    started = time.perf_counter()
+    calibrate([(rpm, speed)])
+    results['calibrate_s'] = round(time.perf_counter() - started, 3)
+
+    timings = {}
+    for name, fn in (('old_bridge_if_chain', old_bridge_gear), ('old_sim_nearest', old_sim_gear),
+                     ('table', lambda r, s: GEARS[model.classify(r, s)]),
+                     ('table_hysteresis', GearTracker(model).update)):
+        seconds, out = per_sample(fn, rpm_list, speed_list)
+        codes = np.array([GEARS.index(gear) for gear in out])
+        timings[name] = {'ns_per_sample': round(seconds / args.rows * 1e9),
+                         'accuracy': round(float(np.mean(codes == truth)), 4),
+                         'gear_changes': changes(codes)}
+    started = time.perf_counter()
+    codes = model.classify_array(rpm, speed)
+    timings['table_vectorized'] = {'ns_per_sample': round((time.perf_counter() - started) / args.rows * 1e9, 1),
+                                   'accuracy': round(float(np.mean(codes == truth)), 4),
+                                   'gear_changes': changes(codes)}
+    started = time.perf_counter()
+    codes = GearTracker(model).update_array(rpm, speed)
+    timings['table_hysteresis_vectorized'] = {
+        'ns_per_sample': round((time.perf_counter() - started) / args.rows * 1e9, 1),
+        'accuracy': round(float(np.mean(codes == truth)), 4), 'gear_changes': changes(codes)}
+    results['true_gear_changes'] = changes(truth)
+    results['inference'] = timings
+    print(json.dumps(results, indent=2))
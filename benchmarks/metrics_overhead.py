@@ -0,0 +1,108 @@
+"""Cost of the bridge's hot-path metrics relative to the ingest loop
+
+Feeds JSON frames through data_bridge.handle_frame (enrichment, rules,
+write-behind logger, hub publish) with the real metrics, then with the
+metric objects swapped for no-ops, and separately times the
+instrumentation sequence frames pay for on average.
+
+    python benchmarks/metrics_overhead.py --frames 20000 --repeat 5
+"""
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+
+import common  # noqa: F401  (puts python/ on sys.path)
+import data_bridge
+from data_logger import DataLogger
+from metrics import Counter, Histogram
+
+class NullMetric:
+    value = 1  # never a multiple of STAGE_SAMPLE_EVERY, so stages go untimed
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+HOT_METRICS = ('FRAMES_JSON', 'FRAMES_BINARY', 'SAMPLES', 'DECODE_SECONDS', 'ENRICH_SECONDS', 'PUBLISH_SECONDS')
+
+def make_frames(count):
+    frames = []
+    for i in range(count):
+        t = i / 20
+        frames.append(json.dumps({
+            "rpm": int(800 + 6000 * abs(math.sin(t / 3))),
+            "coolant": int(85 + 15 * math.sin(t / 10)),
+            "throttle": int(15 + 85 * abs(math.sin(t / 3))),
+            "speed": int(40 + 20 * math.sin(t / 2)),
+            "ts": time.time(),
+        }))
+    return frames
+
+def time_frames(frames):
+    started = time.perf_counter()
+    for frame in frames:
+        data_bridge.handle_frame(frame, False)
+    return (time.perf_counter() - started) / len(frames)
+
+def time_instrumentation(count):
+    """The frame counter check on every frame plus full stage timing on 1 in STAGE_SAMPLE_EVERY"""
+    histogram = Histogram('h', '')
+    frames = Counter('f', '')
+    samples = Counter('s', '')
+    every = data_bridge.STAGE_SAMPLE_EVERY
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    for _ in range(count):
+        frames.inc()
+        samples.inc(1)
+        if frames.value % every:
+            continue
+        a = perf_counter()
+        b = perf_counter()
+        c = perf_counter()
+        histogram.observe(b - a)
+        histogram.observe(c - b)
+        histogram.observe(perf_counter() - c)
+    return (perf_counter() - started) / count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    real = {name: getattr(data_bridge, name) for name in HOT_METRICS}
+    null = {name: NullMetric() for name in HOT_METRICS}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data_bridge.trip_logger = DataLogger(os.path.join(workdir, 'bench.db'), write_behind=True,
+                                             block_on_full=True)
+        time_frames(frames[:1000])  # warm up
+
+        with_metrics, without_metrics = [], []
+        # Interleave so drift (writer thread, CPU frequency) hits both sides
+        for _ in range(args.repeat):
+            for name, metric in real.items():
+                setattr(data_bridge, name, metric)
+            with_metrics.append(time_frames(frames))
+            for name, metric in null.items():
+                setattr(data_bridge, name, metric)
+            without_metrics.append(time_frames(frames))
+        data_bridge.trip_logger.close()
+
+    instrumentation = min(time_instrumentation(args.frames) for _ in range(args.repeat))
+    frame_cost = min(without_metrics)
+    print(json.dumps({
+        'frames': args.frames,
+        'us_per_frame_with_metrics': round(min(with_metrics) * 1e6, 3),
+        'us_per_frame_without_metrics': round(frame_cost * 1e6, 3),
+        'ab_overhead_percent': round((min(with_metrics) - frame_cost) / frame_cost * 100, 2),
+        'instrumentation_us_per_frame': round(instrumentation * 1e6, 3),
+        'instrumentation_percent_of_frame': round(instrumentation / frame_cost * 100, 2),
+    }, indent=2))
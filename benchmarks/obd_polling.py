@@ -0,0 +1,47 @@
+"""Achieved samples/sec per PID against the local ELM327 emulator
+
+Compares the scheduled OBDReader with the old loop that queried every
+PID back to back and slept 50 ms.
+
+    python benchmarks/obd_polling.py --seconds 10 --latency 0.012
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+from obd_emulator import EmulatedELM327, commands, emulated_connection_factory
+from obd_reader import OBDReader, PIDS
+
+def bench_scheduled(seconds, latency):
+    reader = OBDReader(connection_factory=emulated_connection_factory(latency)).start()
+    time.sleep(seconds)
+    reader.stop()
+    return reader.get_stats()
+
+def bench_serial_loop(seconds, latency):
+    """The original real_obd loop: four blocking queries, then sleep(0.05)"""
+    connection = EmulatedELM327(latency)
+    counts = {name: 0 for name in PIDS}
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        for name, (command_name, _, _) in PIDS.items():
+            connection.query(getattr(commands, command_name))
+            counts[name] += 1
+        time.sleep(0.05)
+    return {name: {'target_hz': PIDS[name][1], 'achieved_hz': round(count / seconds, 2)}
+            for name, count in counts.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--latency', type=float, default=0.012, help='emulated round trip per query (s)')
+    args = parser.parse_args()
+
+    print(json.dumps({
+        'latency_s': args.latency,
+        'scheduled': bench_scheduled(args.seconds, args.latency),
+        'serial_loop': bench_serial_loop(args.seconds, args.latency),
+    }, indent=2))
@@ -0,0 +1,62 @@
+"""Per-sample cost of the diagnostics rule engine
+
+Replicates the shipped rules with jittered thresholds up to --rules and
+evaluates synthetic samples for --vehicles vehicles.
+
+    python benchmarks/rule_engine.py --rules 300 --vehicles 50 --samples 20000
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+from diagnostics import VehicleDiagnostics, load_rules
+
+def make_rules(count):
+    base = load_rules()
+    rules = []
+    rng = random.Random(1)
+    while len(rules) < count:
+        rule = copy.deepcopy(base[len(rules) % len(base)])
+        rule['name'] = f"{rule['name']}_{len(rules)}"
+        for condition in rule['when'] + rule.get('clear_when', []):
+            if isinstance(condition[2], (int, float)) and condition[2]:
+                condition[2] = condition[2] * rng.uniform(0.8, 1.2)
+        rules.append(rule)
+    return rules
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rules', type=int, default=300)
+    parser.add_argument('--vehicles', type=int, default=50)
+    parser.add_argument('--samples', type=int, default=20000)
+    args = parser.parse_args()
+
+    diagnostics = VehicleDiagnostics(make_rules(args.rules))
+    samples = []
+    for i in range(args.samples):
+        t = i * 0.05
+        rpm = int(800 + 6000 * abs(math.sin(t / 3)))
+        samples.append((t, f"vehicle-{i % args.vehicles}", {
+            'rpm': rpm, 'coolant': int(85 + 25 * math.sin(t / 10)), 'throttle': 50,
+            'speed': int(rpm * 0.02) if i % 7 else 0, 'gear': '3',
+        }))
+
+    start = time.perf_counter()
+    for ts, vehicle_id, sample in samples:
+        diagnostics.check_alerts(sample, ts, vehicle_id)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'rules': args.rules,
+        'vehicles': args.vehicles,
+        'samples': args.samples,
+        'us_per_sample': round(elapsed / args.samples * 1e6, 2),
+        'ns_per_rule': round(elapsed / args.samples / args.rules * 1e9, 1),
+        'history_len': len(diagnostics.alert_history),
+    }, indent=2))
@@ -0,0 +1,181 @@
+"""End-to-end latency/throughput suite for the service stack, emitted as JSON
+
+Stages:
+  latency  fake_server -> data_bridge (-> fleet) -> broadcast hub subscriber;
+           p50/p99 of (received - sample ts), plus bridge RSS growth
+  ingest   max sustainable DataLogger write-behind rate (producer blocks
+           on a full queue, so the enqueue rate is the commit rate)
+  history  /api/history and /api/trip/summary timings on seeded databases
+
+    python benchmarks/run_suite.py --vehicles 1 10 --rate 20 --rows 1000000 --output results.json
+
+Seeding 10M/100M-row databases takes minutes to hours; pass them
+explicitly with --rows when you want those points.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import get_json, percentile, rss_kb, start, stop, wait_for
+
+import websockets
+
+HUB_URI = 'ws://localhost:8767'
+BRIDGE_URL = 'http://localhost:8766'
+
+async def collect_latencies(seconds):
+    latencies = []
+    async with websockets.connect(HUB_URI) as websocket:
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            try:
+                message = await asyncio.wait_for(websocket.recv(), timeout=1)
+            except asyncio.TimeoutError:
+                continue
+            received = time.time()
+            ts = json.loads(message).get('ts')
+            if ts:
+                latencies.append(received - ts)
+    return latencies
+
+def bench_latency(vehicles, rate, seconds, workdir):
+    source = start('fake_server.py', '--rate', rate, '--batch', 1, cwd=workdir)
+    bridge_args = ['--fleet', vehicles] if vehicles > 1 else []
+    bridge = start('python/data_bridge.py', *bridge_args, cwd=workdir)
+    try:
+        wait_for(f'{BRIDGE_URL}/hub/stats')
+        time.sleep(1)
+        rss_start = rss_kb(bridge.pid)
+        latencies = asyncio.run(collect_latencies(seconds))
+        rss_end = rss_kb(bridge.pid)
+        hub = get_json(f'{BRIDGE_URL}/hub/stats')
+        fleet = get_json(f'{BRIDGE_URL}/fleet/stats') if vehicles > 1 else None
+    finally:
+        stop(bridge, source)
+
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        'vehicles': vehicles,
+        'rate_hz': rate,
+        'samples_received': len(ms),
+        'latency_p50_ms': round(percentile(ms, 0.50), 3) if ms else None,
+        'latency_p99_ms': round(percentile(ms, 0.99), 3) if ms else None,
+        'latency_max_ms': round(max(ms), 3) if ms else None,
+        'bridge_rss_start_kb': rss_start,
+        'bridge_rss_end_kb': rss_end,
+        'hub': hub,
+        'fleet': fleet,
+    }
+
+def bench_ingest(rows, workdir):
+    from data_logger import DataLogger
+    logger = DataLogger(os.path.join(workdir, 'ingest.db'), write_behind=True,
+                        block_on_full=True, max_queue=5000)
+    sample = {'rpm': 3000, 'speed': 60, 'coolant': 90, 'throttle': 35, 'gear': '4'}
+    started = time.perf_counter()
+    for _ in range(rows):
+        logger.log_data(sample)
+    logger.flush(timeout=120)
+    elapsed = time.perf_counter() - started
+    stats = logger.get_queue_stats()
+    logger.close()
+    return {
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'sustained_rows_per_second': round(rows / elapsed),
+        'backpressure_waits': stats['backpressure_waits'],
+        'last_flush_ms': stats['last_flush_ms'],
+    }
+
+def seed_database(path, rows, chunk=50000):
+    """rows samples at 20 Hz ending now, with rollups maintained as the logger would"""
+    from data_logger import DataLogger
+    logger = DataLogger(path)
+    end = datetime.now()
+    step = timedelta(seconds=0.05)
+    ts = end - step * rows
+    written = 0
+    while written < rows:
+        batch = []
+        for i in range(min(chunk, rows - written)):
+            n = written + i
+            rpm = 800 + (n * 7) % 6000
+            batch.append((ts, rpm, rpm // 60, 80 + n % 25, n % 100, str(1 + n % 6), 0.0005))
+            ts += step
+        logger._write_rows(logger.conn, batch)
+        written += len(batch)
+    logger.close()
+
+def time_request(client, url, repeat=5):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+        size = len(response.data)
+    return {'median_ms': round(sorted(timings)[len(timings) // 2], 2), 'bytes': size}
+
+def bench_history(rows, workdir):
+    path = os.path.join(workdir, f'history_{rows}.db')
+    started = time.perf_counter()
+    seed_database(path, rows)
+    seed_seconds = time.perf_counter() - started
+
+    import api_server
+    api_server.DB_PATH = path
+    client = api_server.app.test_client()
+    result = {
+        'rows': rows,
+        'seed_seconds': round(seed_seconds, 1),
+        'db_bytes': os.path.getsize(path),
+        'queries': {},
+    }
+    for url in ('/api/history?hours=1',
+                '/api/history?hours=1&resolution=1s',
+                '/api/history?hours=24&resolution=1m',
+                '/api/history?hours=168&resolution=10m',
+                '/api/trip/summary'):
+        result['queries'][url] = time_request(client, url, repeat=3 if 'resolution' not in url else 5)
+    os.remove(path)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--rate', type=float, default=20.0, help='samples/sec per vehicle from the source')
+    parser.add_argument('--seconds', type=float, default=10.0, help='latency measurement window per run')
+    parser.add_argument('--ingest-rows', type=int, default=200000)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000],
+                        help='trip_data sizes to seed for history queries (e.g. 1000000 10000000 100000000)')
+    parser.add_argument('--skip', nargs='*', default=[], choices=['latency', 'ingest', 'history'])
+    parser.add_argument('--output', help='also write the JSON results here')
+    args = parser.parse_args()
+
+    results = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        if 'latency' not in args.skip:
+            results['latency'] = [bench_latency(v, args.rate, args.seconds, workdir) for v in args.vehicles]
+        if 'ingest' not in args.skip:
+            results['ingest'] = bench_ingest(args.ingest_rows, workdir)
+        if 'history' not in args.skip:
+            results['history'] = [bench_history(rows, workdir) for rows in args.rows]
+    results['suite_peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
@@ -0,0 +1,90 @@
+"""Shared-memory snapshot read/write cost and multi-process read scaling
+
+A writer thread updates --vehicles slots as fast as it can (the worst case
+for the seqlock) while 1..--readers processes read random vehicles for
+--seconds each.
+
+    python benchmarks/shared_state.py --vehicles 50 --readers 4 --seconds 2
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+
+import common  # noqa: F401  (puts python/ on sys.path)
+from shared_state import SharedStateReader, SharedStateWriter
+
+NAME = 'vehicle_ease_state_bench'
+ALERTS = [{'name': 'high_rpm', 'type': 'WARNING', 'message': 'HIGH RPM: 6600', 'color': '#ffaa00', 'since': 0.0}]
+
+def reader_process(vehicles, seconds, results):
+    reader = SharedStateReader(NAME)
+    ids = [f'vehicle-{i}' for i in range(vehicles)]
+    rng = random.Random()
+    reads = misses = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(1000):
+            if reader.read(ids[rng.randrange(vehicles)]) is None:
+                misses += 1
+        reads += 1000
+    results.put((reads, misses))
+
+def write_loop(writer, vehicles, stop, counter):
+    sample = {'rpm': 3000, 'coolant': 90, 'throttle': 30, 'speed': 60, 'gear': '4',
+              'fuel_rate': 2.5, 'trip_fuel': 0.1, 'fuel_efficiency': 24.0, 'trip_cost': 0.15}
+    i = 0
+    while not stop.is_set():
+        sample['ts'] = time.time()
+        sample['rpm'] = 800 + i % 6000
+        writer.write(f'vehicle-{i % vehicles}', sample, ALERTS)
+        i += 1
+    counter.append(i)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=50)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    writer = SharedStateWriter(NAME)
+    sample = {'rpm': 3000, 'coolant': 90, 'throttle': 30, 'speed': 60, 'gear': '4', 'ts': time.time()}
+    for i in range(args.vehicles):
+        writer.write(f'vehicle-{i}', sample, ALERTS)
+    started = time.perf_counter()
+    for i in range(100000):
+        writer.write('vehicle-0', sample, ALERTS)
+    write_us = (time.perf_counter() - started) / 100000 * 1e6
+
+    results = {'vehicles': args.vehicles, 'write_us': round(write_us, 3), 'scaling': []}
+    try:
+        for readers in range(1, args.readers + 1):
+            stop = threading.Event()
+            writes = []
+            thread = threading.Thread(target=write_loop, args=(writer, args.vehicles, stop, writes))
+            thread.start()
+            queue = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=reader_process, args=(args.vehicles, args.seconds, queue))
+                         for _ in range(readers)]
+            for process in processes:
+                process.start()
+            counts = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+            stop.set()
+            thread.join()
+            total = sum(reads for reads, _ in counts)
+            results['scaling'].append({
+                'readers': readers,
+                'reads_per_second': round(total / args.seconds),
+                'us_per_read': round(args.seconds * readers / total * 1e6, 3),
+                'misses': sum(misses for _, misses in counts),
+                'concurrent_writes_per_second': round(writes[0] / args.seconds),
+            })
+    finally:
+        writer.close()
+
+    print(json.dumps(results, indent=2))
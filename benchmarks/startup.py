@@ -0,0 +1,162 @@
+"""Service startup: import cost, time to READY and time to first served sample
+
+Each service is started the way launch.py starts it, with a readiness pipe
+(python/readiness.py), while the services upstream of it are already
+running in a scratch directory:
+
+  fake_server   first WebSocket sample on :8765
+  data_bridge   first /data response carrying a sample (fake_server up)
+  api_server    first 200 from /api/history (bridge up, same database)
+  engine_sim    first rendered frame, SDL dummy drivers (bridge up)
+
+Timings are medians over --runs cold starts. A separate run under
+`python -X importtime` gives each service's total import time and its
+heaviest top-level imports.
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from common import ROOT, get_json, stop, wait_for
+
+import websockets
+
+READY_FD_ENV = 'VEP_READY_FD'
+TIMEOUT = 20.0
+POLL_INTERVAL = 0.005
+TOP_IMPORTS = 8
+
+SERVICES = {
+    'fake_server': ('fake_server.py', ()),
+    'data_bridge': ('python/data_bridge.py', ()),
+    'api_server': ('python/api_server.py', ('--port', '8768')),
+    'engine_sim': ('python/engine_sim.py', ()),
+}
+UPSTREAM = {
+    'fake_server': (),
+    'data_bridge': ('fake_server',),
+    'api_server': ('fake_server', 'data_bridge'),
+    'engine_sim': ('fake_server', 'data_bridge'),
+}
+
+def spawn(name, workdir, *python_args):
+    """(process, read end of its readiness pipe)"""
+    script, args = SERVICES[name]
+    ready_read, ready_write = os.pipe()
+    env = dict(os.environ, **{READY_FD_ENV: str(ready_write)},
+               SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    process = subprocess.Popen([sys.executable, *python_args, os.path.join(ROOT, script), *args],
+                               cwd=workdir, env=env, pass_fds=(ready_write,),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE if python_args else subprocess.DEVNULL)
+    os.close(ready_write)
+    return process, ready_read
+
+def wait_ready(ready_read, timeout=TIMEOUT):
+    """perf_counter time of the READY line, None if the pipe closed or timed out without one"""
+    try:
+        if select.select([ready_read], [], [], timeout)[0]:
+            data = os.read(ready_read, 256)
+            return time.perf_counter() if data.startswith(b'READY') else None
+        return None
+    finally:
+        os.close(ready_read)
+
+async def first_websocket_sample():
+    async with websockets.connect('ws://127.0.0.1:8765') as websocket:
+        await websocket.recv()
+
+def sample_served(name):
+    """True once the service has served real data"""
+    try:
+        if name == 'fake_server':
+            asyncio.run(first_websocket_sample())
+            return True
+        if name == 'data_bridge':
+            return get_json('http://127.0.0.1:8766/data').get('rpm') is not None
+        if name == 'api_server':
+            with urllib.request.urlopen('http://127.0.0.1:8768/api/history?minutes=1', timeout=1) as response:
+                return response.status == 200
+    except (OSError, ValueError, websockets.WebSocketException):
+        return False
+    return True  # engine_sim: the first frame is its first sample
+
+def start_upstream(name, workdir):
+    processes = []
+    for upstream in UPSTREAM[name]:
+        process, ready_read = spawn(upstream, workdir)
+        processes.append(process)
+        if wait_ready(ready_read) is None:
+            stop(*processes)
+            raise RuntimeError(f"{upstream} never signalled readiness")
+    if 'data_bridge' in UPSTREAM[name]:
+        wait_for('http://127.0.0.1:8766/hub/stats')
+    return processes
+
+def time_start(name, workdir):
+    """(seconds to READY, seconds to first served sample) for one cold start"""
+    upstream = start_upstream(name, workdir)
+    started = time.perf_counter()
+    process, ready_read = spawn(name, workdir)
+    try:
+        ready = wait_ready(ready_read)
+        deadline = started + TIMEOUT
+        while not sample_served(name) and time.perf_counter() < deadline:
+            time.sleep(POLL_INTERVAL)
+        served = time.perf_counter()
+        if name == 'engine_sim':
+            served = ready or served
+    finally:
+        stop(process, *reversed(upstream))
+    return (round(ready - started, 3) if ready else None), round(served - started, 3)
+
+def parse_importtime(stderr, top=TOP_IMPORTS):
+    """Total import time and the heaviest top-level imports from -X importtime output (ms)"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, package = line.split('|')
+        if not package.startswith('  '):  # nested imports are indented further
+            imports.append((package.strip(), int(cumulative) / 1000))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return {'total_ms': round(sum(ms for _, ms in imports), 1),
+            'top': {package: round(ms, 1) for package, ms in imports[:top]}}
+
+def import_profile(name, workdir):
+    upstream = start_upstream(name, workdir)
+    process, ready_read = spawn(name, workdir, '-X', 'importtime')
+    try:
+        wait_ready(ready_read)
+    finally:
+        process.terminate()
+        stderr = process.communicate()[1].decode(errors='replace')
+        stop(*reversed(upstream))
+    return parse_importtime(stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--services', nargs='+', choices=list(SERVICES), default=list(SERVICES))
+    args = parser.parse_args()
+
+    results = {'runs': args.runs, 'services': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.services:
+            ready, served = zip(*(time_start(name, workdir) for _ in range(args.runs)))
+            ready = [seconds for seconds in ready if seconds is not None]
+            results['services'][name] = {
+                'ready_s': statistics.median(ready) if ready else None,
+                'first_sample_s': statistics.median(served),
+                'imports': import_profile(name, workdir),
+            }
+    print(json.dumps(results, indent=2))
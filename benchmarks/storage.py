@@ -0,0 +1,129 @@
+"""Day-sharded vs single-table trip_data: query times, retention and ingest during maintenance
+
+Seeds --days days of 20 Hz samples into both layouts, then times the
+last-hour raw history query and a one-day export scan. On the sharded
+layout it runs retention (--retention days) and compaction while a
+writer keeps committing 20-row batches, and compares commit latency with
+an idle run.
+
+    python benchmarks/storage.py --days 14 --rows-per-day 50000 --retention 7
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from common import percentile
+import api_server
+from data_logger import DataLogger, iter_trip_data
+from trip_shards import ShardMaintenance
+
+def seed(logger, days, rows_per_day, chunk=50000):
+    now = datetime.now()
+    step = timedelta(days=1) / rows_per_day
+    for day in range(days, 0, -1):
+        ts = now - timedelta(days=day - 1) - timedelta(days=1)
+        written = 0
+        while written < rows_per_day:
+            batch = []
+            for i in range(min(chunk, rows_per_day - written)):
+                n = written + i
+                batch.append((ts, 800 + (n * 7) % 6000, n % 120, 80 + n % 25, n % 100, str(1 + n % 6), 0.0005))
+                ts += step
+            logger._write_rows(logger.conn, batch)
+            written += len(batch)
+
+def disk_bytes(workdir):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(workdir) for name in names)
+
+def time_queries(path):
+    api_server.DB_PATH = path
+    started = time.perf_counter()
+    rows = api_server.query_trip_data(time.time() - 3600)
+    history_ms = (time.perf_counter() - started) * 1000
+    conn = sqlite3.connect(path)
+    day = datetime.now() - timedelta(days=3)
+    started = time.perf_counter()
+    exported = sum(len(chunk) for chunk in iter_trip_data(
+        conn, ('id', 'timestamp', 'rpm'), day, day + timedelta(hours=1)))
+    export_ms = (time.perf_counter() - started) * 1000
+    conn.close()
+    return {'history_1h_ms': round(history_ms, 2), 'history_rows': len(rows),
+            'export_1h_3_days_ago_ms': round(export_ms, 2), 'export_rows': exported}
+
+def commit_latencies(logger, stop):
+    """Commit 20-row batches (1 s of samples) back to back until stop is set"""
+    timings = []
+    while not stop.is_set():
+        batch = [(datetime.now(), 3000, 60, 90, 40, '4', 0.001)] * 20
+        started = time.perf_counter()
+        logger._write_rows(logger.conn, batch)
+        timings.append(time.perf_counter() - started)
+        time.sleep(0.005)
+    return timings
+
+def ingest_during(logger, action, seconds):
+    stop = threading.Event()
+    result = {}
+    writer = threading.Thread(target=lambda: result.setdefault('timings', commit_latencies(logger, stop)))
+    writer.start()
+    started = time.perf_counter()
+    outcome = action() if action else time.sleep(seconds)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    writer.join()
+    timings = result['timings']
+    return outcome, {
+        'seconds': round(elapsed, 2),
+        'commits': len(timings),
+        'commit_ms_p50': round(percentile(timings, 0.5) * 1000, 2),
+        'commit_ms_p99': round(percentile(timings, 0.99) * 1000, 2),
+        'commit_ms_max': round(max(timings) * 1000, 2),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--rows-per-day', type=int, default=50000)
+    parser.add_argument('--retention', type=int, default=7)
+    args = parser.parse_args()
+
+    results = {'days': args.days, 'rows_per_day': args.rows_per_day}
+    with tempfile.TemporaryDirectory() as workdir:
+        single_dir = os.path.join(workdir, 'single')
+        sharded_dir = os.path.join(workdir, 'sharded')
+        os.makedirs(single_dir)
+        os.makedirs(sharded_dir)
+
+        single = DataLogger(os.path.join(single_dir, 'vehicle_data.db'))
+        seed(single, args.days, args.rows_per_day)
+        results['single'] = time_queries(single.db_path)
+        results['single']['disk_bytes'] = disk_bytes(single_dir)
+        single.close()
+
+        path = os.path.join(sharded_dir, 'vehicle_data.db')
+        sharded = DataLogger(path, shard_dir=os.path.join(sharded_dir, 'shards'))
+        seed(sharded, args.days, args.rows_per_day)
+        results['sharded'] = time_queries(path)
+        results['sharded']['disk_bytes'] = disk_bytes(sharded_dir)
+
+        # Background maintenance is driven by hand here so it can be timed
+        sharded.maintenance.stop()
+        maintenance = ShardMaintenance(sharded.db_path, retention_days=args.retention)
+        _, idle = ingest_during(sharded, None, 3)
+        outcome, busy = ingest_during(sharded, maintenance.run_once, None)
+        results['maintenance'] = {
+            'expired_shards': len(outcome['expired_shards']),
+            'compacted_shards': len(outcome['compacted_shards']),
+            'disk_bytes_after': disk_bytes(sharded_dir),
+            'ingest_idle': idle,
+            'ingest_during_maintenance': busy,
+        }
+        sharded.close()
+
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,94 @@
+"""Cold start and crash recovery times under the launch.py supervisor
+
+Starts launch.py (with the fake OBD source) in a scratch directory, times
+until the bridge and API answer, then SIGKILLs the bridge and one API
+worker (found via /proc, so Linux only) and times each recovery. The
+probe URL is polled throughout to count failed requests.
+
+    python benchmarks/supervisor.py --api-workers 2
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from common import ROOT
+
+BRIDGE_PROBE = 'http://127.0.0.1:8766/hub/stats'
+API_PROBE = 'http://127.0.0.1:8768/metrics'
+
+def children(pid):
+    """{pid: command line} of a process's direct children (Linux /proc)"""
+    pids = []
+    # Children are listed per thread; restarts are spawned from the monitor thread
+    for task in os.listdir(f'/proc/{pid}/task'):
+        with open(f'/proc/{pid}/task/{task}/children') as f:
+            pids += [int(p) for p in f.read().split()]
+    found = {}
+    for child in pids:
+        try:
+            with open(f'/proc/{child}/cmdline', 'rb') as f:
+                found[child] = f.read().replace(b'\0', b' ').decode()
+        except OSError:
+            pass
+    return found
+
+def find_children(supervisor, script):
+    return {pid for pid, cmdline in children(supervisor.pid).items() if script in cmdline}
+
+def ok(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+def recover(supervisor, script, url):
+    """SIGKILL a service, then time until the supervisor's replacement answers"""
+    before = find_children(supervisor, script)
+    killed = time.time()
+    os.kill(min(before), signal.SIGKILL)
+    requests = failures = 0
+    while True:
+        requests += 1
+        answered = ok(url)
+        failures += 0 if answered else 1
+        if answered and find_children(supervisor, script) - before:
+            break
+        if time.time() - killed > 30:
+            raise RuntimeError(f'{script} did not recover')
+        time.sleep(0.01)
+    return {'recovery_s': round(time.time() - killed, 3), 'requests_during': requests,
+            'failed_requests': failures}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--api-workers', type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.time()
+        supervisor = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'launch.py'), '--no-browser', '--source', 'fake',
+             '--api-workers', str(args.api_workers)],
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+        try:
+            while not (ok(BRIDGE_PROBE) and ok(API_PROBE)):
+                if time.time() - started > 30:
+                    raise RuntimeError('services did not come up')
+                time.sleep(0.01)
+            results = {'cold_start_s': round(time.time() - started, 3), 'api_workers': args.api_workers}
+            results['bridge'] = recover(supervisor, 'data_bridge.py', BRIDGE_PROBE)
+            results['api_worker'] = recover(supervisor, 'api_server.py', API_PROBE)
+        finally:
+            supervisor.terminate()
+            shutdown_started = time.time()
+            supervisor.wait()
+        results['shutdown_s'] = round(time.time() - shutdown_started, 3)
+
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,63 @@
+"""Bytes per sample and decode cost: JSON text frames vs binary frames
+
+    python benchmarks/wire_format.py --samples 200000 --batch 20
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+from wire_format import decode_frame, encode_samples
+
+def make_samples(count):
+    samples = []
+    for i in range(count):
+        t = i * 0.05
+        rpm = 800 + 6000 * abs(math.sin(t / 3))
+        samples.append((1_700_000_000 + t, int(rpm), int(85 + 15 * math.sin(t / 10)),
+                        int(15 + 85 * abs(math.sin(t / 3))), int(rpm * 0.05 + 20 * math.sin(t / 2))))
+    return samples
+
+def bench_json(samples):
+    frames = [json.dumps({"rpm": s[1], "coolant": s[2], "throttle": s[3], "speed": s[4]}) for s in samples]
+    latest = {}
+    start = time.perf_counter()
+    for frame in frames:
+        latest.update(json.loads(frame))
+    elapsed = time.perf_counter() - start
+    return sum(len(f.encode()) for f in frames), elapsed
+
+def bench_binary(samples, batch):
+    frames = [encode_samples(samples[i:i + batch]) for i in range(0, len(samples), batch)]
+    latest = {}
+    start = time.perf_counter()
+    for frame in frames:
+        for _, rpm, coolant, throttle, speed in decode_frame(frame):
+            latest['rpm'] = rpm
+            latest['coolant'] = coolant
+            latest['throttle'] = throttle
+            latest['speed'] = speed
+    elapsed = time.perf_counter() - start
+    return sum(len(f) for f in frames), elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=20)
+    args = parser.parse_args()
+
+    samples = make_samples(args.samples)
+    results = {}
+    for name, (size, elapsed) in (
+        ('json', bench_json(samples)),
+        ('binary', bench_binary(samples, 1)),
+        (f'binary_batch{args.batch}', bench_binary(samples, args.batch)),
+    ):
+        results[name] = {
+            'bytes_per_sample': round(size / len(samples), 2),
+            'decode_ns_per_sample': round(elapsed / len(samples) * 1e9),
+        }
+    print(json.dumps(results, indent=2))
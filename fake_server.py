@@ -3,30 +3,50 @@ import asyncio
 import websockets
 import json
 import math
+import os
+import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+from wire_format import SUBPROTOCOLS, SUBPROTOCOL_BINARY, BatchEncoder
+from readiness import notify_ready
+
+# Samples per binary frame (--batch N); JSON clients always get one per frame
+BATCH_SIZE = int(sys.argv[sys.argv.index('--batch') + 1]) if '--batch' in sys.argv else 1
+# Samples per second per client (--rate HZ)
+RATE = float(sys.argv[sys.argv.index('--rate') + 1]) if '--rate' in sys.argv else 20.0
+
 async def fake_obd(websocket, path):
     print("Phone connected! Sending fake live data...")
     start_time = time.time()
-    
+    encoder = BatchEncoder(BATCH_SIZE) if websocket.subprotocol == SUBPROTOCOL_BINARY else None
+
     while True:
-        t = time.time() - start_time
+        now = time.time()
+        t = now - start_time
         rpm = 800 + 6000 * abs(math.sin(t / 3))
         throttle = 15 + 85 * abs(math.sin(t / 3))
         speed = rpm * 0.05 + 20 * math.sin(t / 2)
         coolant = 85 + 15 * math.sin(t / 10)
-        
-        data = {
-            "rpm": int(rpm),
-            "coolant": int(coolant),
-            "throttle": int(throttle),
-            "speed": int(speed),
-        }
-        await websocket.send(json.dumps(data))
-        await asyncio.sleep(0.05)
 
-start_server = websockets.serve(fake_obd, "0.0.0.0", 8765)
+        if encoder is not None:
+            frame = encoder.add(now, int(rpm), int(coolant), int(throttle), int(speed))
+            if frame is not None:
+                await websocket.send(frame)
+        else:
+            data = {
+                "rpm": int(rpm),
+                "coolant": int(coolant),
+                "throttle": int(throttle),
+                "speed": int(speed),
+                "ts": now,
+            }
+            await websocket.send(json.dumps(data))
+        await asyncio.sleep(1 / RATE)
+
+start_server = websockets.serve(fake_obd, "0.0.0.0", 8765, subprotocols=SUBPROTOCOLS)
 print("FAKE SERVER RUNNING ON ws://YOUR_IP:8765")
 print("Find your IP below ↓")
 asyncio.get_event_loop().run_until_complete(start_server)
-asyncio.get_event_loop().run_forever()
\ No newline at end of file
+notify_ready('fake_server')
+asyncio.get_event_loop().run_forever()
@@ -1,21 +1,229 @@
+import argparse
+import select
+import signal
+import socket
 import subprocess
 import sys
 import os
 import time
+import urllib.request
 import webbrowser
-from threading import Thread
-
-def start_services():
-    services = [
-        ("🌉 Data Bridge", "python/data_bridge.py"),
-        ("📊 API Server", "python/api_server.py"), 
-        ("📈 Data Logger", "python/data_logger.py"),
-        ("🔧 Diagnostics", "python/diagnostics.py")
-    ]
-    
-    for service_name, script_path in services:
-        Thread(target=run_service, args=(service_name, script_path), daemon=True).start()
-        time.sleep(1)
+from threading import Event, Lock, Thread
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+API_PORT = 8768
+# Worker i also answers on API_HEALTH_PORT + i (loopback), so probes reach that worker only
+API_HEALTH_PORT = 8780
+# Services write "READY" to this fd once serving (python/readiness.py)
+READY_FD_ENV = 'VEP_READY_FD'
+
+# Restart delay doubles per consecutive crash, and resets once a service stays up
+BACKOFF_INITIAL = 0.5
+BACKOFF_MAX = 30.0
+STABLE_AFTER = 30.0
+READY_TIMEOUT = 30.0
+HEALTH_INTERVAL = 5.0
+PROBE_INTERVAL = 0.5  # startup probe for services that don't signal readiness
+HEALTH_FAILURES = 3  # consecutive failed probes before a running service is restarted
+STOP_GRACE = 5.0
+
+def probe_http(url):
+    def probe():
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                return response.status < 500
+        except OSError:
+            return False
+    return probe
+
+def probe_tcp(port, host='127.0.0.1'):
+    def probe():
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            return False
+    return probe
+
+class Service:
+    """One supervised child process"""
+
+    def __init__(self, name, args, probe, pass_fds=(), health_checks=True):
+        self.name = name
+        self.args = args
+        self.probe = probe
+        self.pass_fds = pass_fds
+        self.health_checks = health_checks
+        self.process = None
+        self.restarts = 0
+        self.backoff = BACKOFF_INITIAL
+        self.restart_at = None
+        self.started_at = None
+        self.ready_at = None
+        self.failed_probes = 0
+        self.last_probe = 0.0
+        self.ready_pipe = None
+
+    def spawn(self):
+        self.close_ready_pipe()
+        ready_read, ready_write = os.pipe()
+        os.set_blocking(ready_read, False)
+        env = dict(os.environ, **{READY_FD_ENV: str(ready_write)})
+        # Own session: Ctrl+C reaches only the supervisor, which then stops children in order
+        self.process = subprocess.Popen([sys.executable, *self.args], pass_fds=(*self.pass_fds, ready_write),
+                                        start_new_session=True, env=env)
+        os.close(ready_write)
+        self.ready_pipe = ready_read
+        self.started_at = time.time()
+        self.ready_at = None
+        self.failed_probes = 0
+        self.last_probe = self.started_at  # first probe after PROBE_INTERVAL; the pipe usually answers first
+        self.restart_at = None
+
+    def read_ready(self):
+        """True once the child has written READY; closes the pipe on READY or EOF"""
+        try:
+            data = os.read(self.ready_pipe, 256)
+        except BlockingIOError:
+            return False
+        self.close_ready_pipe()
+        return data.startswith(b'READY')
+
+    def close_ready_pipe(self):
+        if self.ready_pipe is not None:
+            os.close(self.ready_pipe)
+            self.ready_pipe = None
+
+    def stop(self, grace=STOP_GRACE):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(grace)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️  {self.name} ignored SIGTERM, killing")
+            self.process.kill()
+            self.process.wait()
+
+class Supervisor:
+    """Starts services in parallel, waits on readiness probes, restarts crashes with backoff"""
+
+    def __init__(self, services, listeners=()):
+        self.services = services
+        # Sockets handed to children by fd; held here so restarts can reuse them
+        self.listeners = listeners
+        self.stopping = Event()
+        self.all_ready = Event()
+        self.lock = Lock()
+        self.started = None
+
+    def start(self):
+        self.started = time.time()
+        for service in self.services:
+            service.spawn()
+        Thread(target=self._monitor, name='Supervisor', daemon=True).start()
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        if not self.all_ready.wait(timeout):
+            return None
+        return time.time() - self.started
+
+    def _monitor(self):
+        while not self.stopping.is_set():
+            # Wake as soon as a child signals readiness, otherwise every 50 ms
+            pipes = [service.ready_pipe for service in self.services if service.ready_pipe is not None]
+            if pipes:
+                signalled = select.select(pipes, [], [], 0.05)[0]
+            else:
+                signalled = []
+                self.stopping.wait(0.05)
+            now = time.time()
+            with self.lock:
+                for service in self.services:
+                    if service.ready_pipe in signalled and service.read_ready() and service.ready_at is None:
+                        self._mark_ready(service, now, 'signalled')
+                    self._check(service, now)
+                if all(service.ready_at for service in self.services):
+                    self.all_ready.set()
+
+    def _mark_ready(self, service, now, how):
+        service.ready_at = now
+        service.last_probe = now
+        print(f"✅ {service.name} ready in {now - service.started_at:.2f}s ({how}, pid {service.process.pid})")
+
+    def _check(self, service, now):
+        if service.restart_at is not None:
+            if now >= service.restart_at:
+                service.restarts += 1
+                print(f"🔄 Restarting {service.name} (restart #{service.restarts})")
+                service.spawn()
+            return
+
+        code = service.process.poll()
+        if code is not None:
+            self._schedule_restart(service, now, f"exited with code {code}")
+            return
+
+        if service.ready_at is None:
+            if now - service.last_probe >= PROBE_INTERVAL:
+                service.last_probe = now
+                if service.probe():
+                    self._mark_ready(service, now, 'probed')
+                    return
+            if now - service.started_at > READY_TIMEOUT:
+                service.stop()
+                self._schedule_restart(service, now, "never became ready")
+            return
+
+        if now - service.ready_at > STABLE_AFTER:
+            service.backoff = BACKOFF_INITIAL
+        if service.health_checks and now - service.last_probe >= HEALTH_INTERVAL:
+            service.last_probe = now
+            service.failed_probes = 0 if service.probe() else service.failed_probes + 1
+            if service.failed_probes >= HEALTH_FAILURES:
+                service.stop()
+                self._schedule_restart(service, now, f"failed {HEALTH_FAILURES} health checks")
+
+    def _schedule_restart(self, service, now, reason):
+        print(f"💥 {service.name} {reason}; restarting in {service.backoff:.1f}s")
+        service.restart_at = now + service.backoff
+        service.backoff = min(service.backoff * 2, BACKOFF_MAX)
+
+    def shutdown(self):
+        self.stopping.set()
+        with self.lock:
+            for service in reversed(self.services):
+                print(f"🛑 Stopping {service.name}")
+                service.stop()
+                service.close_ready_pipe()
+        for listener in self.listeners:
+            listener.close()
+
+def start_services(api_workers=1, source=None):
+    services = []
+    if source:
+        script = {'fake': 'fake_server.py', 'real': 'real_server.py'}[source]
+        services.append(Service(f"🚗 OBD Source ({source})", [os.path.join(ROOT, script)], probe_tcp(8765)))
+    services.append(Service("🌉 Data Bridge", [os.path.join(ROOT, "python/data_bridge.py")],
+                            probe_http('http://127.0.0.1:8766/hub/stats')))
+
+    # API workers share one listening socket owned by the supervisor, so the
+    # port stays open while any single worker restarts
+    listener = socket.create_server(('0.0.0.0', API_PORT), backlog=128)
+    listener.set_inheritable(True)
+    fd = listener.fileno()
+    for i in range(api_workers):
+        name = "📊 API Server" if api_workers == 1 else f"📊 API Server #{i + 1}"
+        health_port = API_HEALTH_PORT + i
+        services.append(Service(name, [os.path.join(ROOT, "python/api_server.py"), '--fd', str(fd),
+                                       '--health-port', str(health_port)],
+                                probe_http(f'http://127.0.0.1:{health_port}/metrics'),
+                                pass_fds=(fd,)))
+
+    # Data logging and diagnostics run inside the bridge process
+    supervisor = Supervisor(services, listeners=(listener,))
+    supervisor.start()
+    return supervisor
 
 def show_system_status():
     print("\n" + "="*60)
@@ -23,7 +231,7 @@ def show_system_status():
     print("="*60)
     print("📊 Available Features:")
     print("  ✅ Real-time OBD-II Monitoring")
-    print("  ✅ Pygame 3D Engine Visualization") 
+    print("  ✅ Pygame 3D Engine Visualization")
     print("  ✅ Data Logging & Analytics")
     print("  ✅ RESTful API with Historical Data")
     print("  ✅ Smart Diagnostics & Alerts")
@@ -34,14 +242,41 @@ def show_system_status():
     print("  📱 Main Dashboard: http://localhost:8766/dashboard")
     print("  📊 Analytics: http://localhost:8766/analytics")
     print("  🔌 API Docs: http://localhost:8766/api/current")
+    print(f"  🧵 API Worker Pool: http://localhost:{API_PORT}/api/trips")
     print("="*60)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vehicle Ease Pro service supervisor")
+    parser.add_argument('--api-workers', type=int, default=1, help='API processes sharing port 8768')
+    parser.add_argument('--source', choices=['fake', 'real'], help='also run an OBD source on 8765')
+    parser.add_argument('--no-browser', action='store_true')
+    args = parser.parse_args()
+
     show_system_status()
-    start_services()
-    
-    # Open dashboard
-    time.sleep(3)
-    webbrowser.open('http://localhost:8766/dashboard')
-    
-    input("\n🎯 Press Enter to stop all services...")
\ No newline at end of file
+    supervisor = start_services(max(1, args.api_workers), args.source)
+    signal.signal(signal.SIGTERM, lambda *_: supervisor.stopping.set())
+
+    elapsed = supervisor.wait_ready()
+    if elapsed is None:
+        print("⚠️  Not every service became ready; still supervising")
+    else:
+        print(f"🚀 All services ready in {elapsed:.2f}s")
+        # Open dashboard
+        if not args.no_browser:
+            webbrowser.open('http://localhost:8766/dashboard')
+
+    if sys.stdin.isatty():
+        def wait_for_enter():
+            try:
+                input("\n🎯 Press Enter to stop all services...")
+            except EOFError:
+                return
+            supervisor.stopping.set()
+        Thread(target=wait_for_enter, daemon=True).start()
+
+    try:
+        while not supervisor.stopping.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        pass
+    supervisor.shutdown()
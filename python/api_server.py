@@ -1,76 +1,377 @@
-from flask import Flask, jsonify, request
-import sqlite3
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+import argparse
+import json
+import threading
+import time
+import zlib
 from datetime import datetime, timedelta
+from data_logger import (
+    DB_PATH, ROLLUP_RESOLUTIONS, ROLLUP_SIGNALS, rollup_table,
+    EXPORT_COLUMNS, iter_trip_data, format_ndjson, format_csv
+)
+from metrics_http import instrument_app
+from shared_state import SharedStateReader
+from diagnostics import VehicleDiagnostics
+from db_pool import POOL_SIZE, ReadPool
+from response_cache import ResponseCache, TripSummaryAggregate
+from trip_shards import trip_data_tables
+from readiness import notify_ready
 
 app = Flask(__name__)
+instrument_app(app)
+
+# Upper bound on buckets returned by a downsampled /api/history request
+MAX_HISTORY_POINTS = 300
+# trip_data column -> key used in API responses
+HISTORY_KEYS = {'coolant_temp': 'coolant'}
+# Raw trip_data columns behind query_trip_data
+RAW_HISTORY_COLUMNS = ('timestamp', 'rpm', 'speed', 'coolant_temp', 'throttle', 'gear')
+# Rows pulled per fetchmany() while streaming an export
+EXPORT_CHUNK_SIZE = 2000
+# Set by data_bridge when it serves these routes in-process; recent /api/history
+# windows are then answered from memory instead of SQLite
+recent_store = None
+# Latest per-vehicle snapshot + active alerts, published by data_bridge into shared memory
+shared_state = SharedStateReader()
+# Only used for get_health_score; the rules themselves run in the bridge
+diagnostics = VehicleDiagnostics()
+# Read-only SQLite connections reused across requests (see db())
+pool_size = POOL_SIZE
+_pool = None
+_pool_lock = threading.Lock()
+# Serialized /api/history and /api/trip/summary bodies; windows are relative
+# to now, so entries only live for a second
+response_cache = ResponseCache()
+HISTORY_TTL = 1.0
+SUMMARY_TTL = 1.0
+trip_summary = TripSummaryAggregate()
+EXPORT_FORMATS = {
+    'ndjson': (format_ndjson, 'application/x-ndjson'),
+    'csv': (format_csv, 'text/csv'),
+}
+
+def db():
+    """Borrow a pooled read-only connection: `with db() as conn:`"""
+    global _pool
+    # DB_PATH may be repointed (benchmarks, tests); a new path gets a fresh pool
+    if _pool is None or _pool.db_path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.db_path != DB_PATH:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ReadPool(DB_PATH, pool_size)
+                response_cache.invalidate()
+                trip_summary.reset(None)
+    return _pool.connection()
+
+def current_snapshot():
+    """(snapshot, None) or (None, error response) for ?vehicle=<id> (default: single-vehicle mode)"""
+    vehicle_id = request.args.get('vehicle', 'default')
+    snapshot = shared_state.read(vehicle_id)
+    if snapshot is None:
+        return None, (jsonify({'error': f'No live data for {vehicle_id} - is data_bridge running?'}), 503)
+    return snapshot, None
 
 @app.route('/api/current', methods=['GET'])
 def get_current_data():
     """Get current vehicle data"""
-    return jsonify(latest_data)
+    snapshot, error = current_snapshot()
+    if error:
+        return error
+    del snapshot['alerts']
+    return jsonify(snapshot)
 
 @app.route('/api/history', methods=['GET'])
 def get_historical_data():
     """Get historical data for charts"""
     hours = request.args.get('hours', 1, type=int)
+    minutes = request.args.get('minutes', type=int)
+    window = minutes * 60 if minutes is not None else hours * 3600
+    resolution = request.args.get('resolution')
+    max_points = request.args.get('max_points', type=int)
+    if resolution and resolution not in ROLLUP_RESOLUTIONS:
+        return jsonify({'error': f'resolution must be one of {list(ROLLUP_RESOLUTIONS)}'}), 400
+    limit = max(1, max_points or MAX_HISTORY_POINTS)
+    if resolution and -(-window // ROLLUP_RESOLUTIONS[resolution]) > limit:
+        # An explicit resolution is never widened behind the caller's back
+        return jsonify({'error': f'resolution {resolution} over {window} s gives more than {limit} points; '
+                                 'use a coarser resolution or a shorter window'}), 400
+
+    def build():
+        start = time.time() - window
+        oldest = recent_store.oldest() if recent_store is not None else None
+        in_memory = oldest is not None and oldest <= start
+        if resolution or (max_points and not in_memory):
+            return get_rollup_history(window, limit, resolution)
+        if in_memory:
+            return recent_store.query(start, max_points=max_points)
+        
+        # Older part of the window from disk, the rest (if the bridge has it) from memory
+        history = query_trip_data(start, oldest)
+        if oldest is not None:
+            history += recent_store.query(start)
+        return history
     
-    conn = sqlite3.connect('vehicle_data.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT timestamp, rpm, speed, coolant_temp, throttle, gear
-        FROM trip_data 
-        WHERE timestamp > datetime('now', ?)
-        ORDER BY timestamp
-    ''', (f'-{hours} hours',))
-    
-    data = cursor.fetchall()
-    conn.close()
+    # Keyed on the parsed values, so ?hours=1 and no arguments share an entry
+    return response_cache.respond(('history', window, resolution, max_points), HISTORY_TTL, build)
+
+def query_trip_data(start, end=None):
+    """Raw trip_data rows with start < timestamp (< end)"""
+    # Compare against datetime bounds so the timestamp index is used
+    bounds = (datetime.fromtimestamp(start), datetime.fromtimestamp(end) if end else datetime.max)
+    data = []
+    with db() as conn:
+        # Only the day shards overlapping the window are attached
+        for table in trip_data_tables(conn, bounds[0], bounds[1] if end else None):
+            if not isinstance(table, str):
+                # Archived day: only the blocks overlapping the window are inflated
+                for rows in table.iter_rows(RAW_HISTORY_COLUMNS, *bounds, start_inclusive=False,
+                                           order_by='timestamp'):
+                    data += rows
+                continue
+            data += conn.execute(f'''
+                SELECT {', '.join(RAW_HISTORY_COLUMNS)}
+                FROM {table} 
+                WHERE timestamp > ? AND timestamp < ?
+                ORDER BY timestamp
+            ''', bounds).fetchall()
     
-    return jsonify([{
+    return [{
         'timestamp': row[0],
         'rpm': row[1],
         'speed': row[2],
         'coolant': row[3],
         'throttle': row[4],
         'gear': row[5]
-    } for row in data])
+    } for row in data]
+
+def get_rollup_history(window, max_points, resolution=None):
+    """Serve the last `window` seconds from the rollup tables: buckets exactly `resolution`
+    wide when given, otherwise the finest step that keeps to max_points buckets"""
+    if resolution:
+        name = resolution
+        width = step = ROLLUP_RESOLUTIONS[resolution]
+    else:
+        widths = sorted(ROLLUP_RESOLUTIONS.items(), key=lambda item: item[1])
+        # Read from the finest table that doesn't return too many rows
+        name, width = widths[-1]
+        for candidate in widths:
+            if window / candidate[1] <= max_points * 4:
+                name, width = candidate
+                break
+        step = max(width, -(-window // max_points // width) * width)
+    
+    with db() as conn:
+        rows = conn.execute(f'''
+            SELECT * FROM {rollup_table(name)}
+            WHERE bucket >= ?
+            ORDER BY bucket
+        ''', (int(time.time()) - window,)).fetchall()
+    
+    points = []
+    current = None
+    for row in rows:
+        bucket = row[0] // step * step
+        if current is None or current[0] != bucket:
+            current = [bucket] + list(row[1:])
+            points.append(current)
+            continue
+        current[1] += row[1]
+        for i in range(len(ROLLUP_SIGNALS)):
+            j = 2 + i * 4
+            current[j] = min(current[j], row[j])
+            current[j + 1] = max(current[j + 1], row[j + 1])
+            current[j + 2] += row[j + 2]
+            current[j + 3] = row[j + 3]
+        current[-1] = row[-1]
+    
+    history = []
+    for point in points:
+        entry = {
+            'timestamp': datetime.fromtimestamp(point[0]).isoformat(' '),
+            'resolution_seconds': step,
+            'samples': point[1],
+        }
+        for i, signal in enumerate(ROLLUP_SIGNALS):
+            j = 2 + i * 4
+            key = HISTORY_KEYS.get(signal, signal)
+            entry[key] = round(point[j + 2] / point[1], 1)
+            entry[f'{key}_min'] = point[j]
+            entry[f'{key}_max'] = point[j + 1]
+            entry[f'{key}_last'] = point[j + 3]
+        entry['gear'] = point[-1]
+        history.append(entry)
+    return history
+
+@app.route('/api/export', methods=['GET'])
+def export_trip_data():
+    """Stream raw trip_data as NDJSON or CSV with flat memory use"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {list(EXPORT_FORMATS)}'}), 400
+    
+    requested = request.args.get('columns')
+    columns = [c.strip() for c in requested.split(',')] if requested else list(EXPORT_COLUMNS)
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        return jsonify({'error': f'unknown columns: {unknown}'}), 400
+    # id is always included so clients can resume with after_id
+    if 'id' not in columns:
+        columns.insert(0, 'id')
+    
+    # Parsed up front: a bad bound must be a 400, not an error halfway through the stream
+    try:
+        start, end = (datetime.fromisoformat(request.args[name]) if request.args.get(name) else None
+                      for name in ('start', 'end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO 8601 timestamps'}), 400
+    hours = request.args.get('hours', type=int)
+    if hours and not start:
+        start = datetime.now() - timedelta(hours=hours)
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+    compress = request.args.get('gzip', '0') in ('1', 'true') or (
+        request.args.get('gzip') is None and 'gzip' in request.headers.get('Accept-Encoding', '')
+    )
+    
+    formatter, mimetype = EXPORT_FORMATS[fmt]
+    
+    def generate():
+        # Held for the whole stream and returned when the client finishes or disconnects
+        with db() as conn:
+            chunks = iter_trip_data(conn, columns, start, end, after_id, limit, EXPORT_CHUNK_SIZE)
+            if not compress:
+                yield from formatter(columns, chunks)
+                return
+            gzipper = zlib.compressobj(6, zlib.DEFLATED, 31)
+            for text in formatter(columns, chunks):
+                data = gzipper.compress(text.encode())
+                if data:
+                    yield data
+            yield gzipper.flush()
+    
+    response = Response(generate(), mimetype=mimetype)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Disposition'] = f'attachment; filename=trip_data.{fmt}'
+    return response
 
 @app.route('/api/trip/summary', methods=['GET'])
 def get_trip_summary():
     """Get trip summary statistics"""
-    conn = sqlite3.connect('vehicle_data.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as points,
-            AVG(speed) as avg_speed,
-            MAX(speed) as max_speed,
-            SUM(fuel_consumption) as fuel_used,
-            MIN(timestamp) as start_time,
-            MAX(timestamp) as end_time
-        FROM trip_data 
-        WHERE date(timestamp) = date('now')
-    ''')
+    def build():
+        # Only rows logged since the previous refresh are read
+        with db() as conn:
+            result = trip_summary.refresh(conn, datetime.combine(datetime.now().date(), datetime.min.time()))
+        return {
+            'data_points': result[0],
+            'average_speed': round(result[1] or 0, 1),
+            'max_speed': result[2] or 0,
+            'fuel_used_liters': round(result[3] or 0, 3),
+            'trip_duration_minutes': calculate_duration(result[4], result[5])
+        }
     
-    result = cursor.fetchone()
-    conn.close()
+    return response_cache.respond(('summary',), SUMMARY_TTL, build)
+
+def calculate_duration(start_time, end_time):
+    """Minutes between two stored timestamps"""
+    if not start_time or not end_time:
+        return 0
+    delta = datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)
+    return round(delta.total_seconds() / 60, 1)
+
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """Distance, fuel, idle time and gear/RPM/throttle distributions per day"""
+    days = request.args.get('days', 7, type=int)
+    last_day = datetime.now().date()
+    first_day = last_day - timedelta(days=max(1, days) - 1)
+    if request.args.get('start'):
+        first_day = datetime.fromisoformat(request.args['start']).date()
+    if request.args.get('end'):
+        last_day = datetime.fromisoformat(request.args['end']).date()
     
+    from trip_analytics import TripAnalytics, combine_summaries  # pulls in NumPy; keep it off startup
+    summaries = TripAnalytics(DB_PATH).daily_summaries(first_day, last_day)
     return jsonify({
-        'data_points': result[0],
-        'average_speed': round(result[1] or 0, 1),
-        'max_speed': result[2] or 0,
-        'fuel_used_liters': round(result[3] or 0, 3),
-        'trip_duration_minutes': self.calculate_duration(result[4], result[5])
+        'total': combine_summaries(summaries),
+        'days': summaries,
     })
 
+@app.route('/api/trips', methods=['GET'])
+def list_trips():
+    """Segmented trips, newest first (page with before=<id>)"""
+    limit = min(request.args.get('limit', 20, type=int), 500)
+    before = request.args.get('before', type=int)
+    
+    with db() as conn:
+        rows = conn.execute('''
+            SELECT id, start_time, end_time, total_distance, avg_speed, max_speed, fuel_used, trip_duration, idle_time
+            FROM trip_summary
+            WHERE kind = 'trip' AND id < ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (before if before is not None else 2 ** 63 - 1, limit)).fetchall()
+    trips = [{
+        'id': row[0],
+        'start_time': row[1],
+        'end_time': row[2],
+        'distance_km': row[3],
+        'avg_speed': row[4],
+        'max_speed': row[5],
+        'fuel_used_liters': row[6],
+        'duration_seconds': row[7],
+        'idle_seconds': row[8]
+    } for row in rows]
+    return jsonify(trips)
+
+@app.route('/api/trips/<int:trip_id>', methods=['GET'])
+def get_trip(trip_id):
+    """Full stats for one segmented trip"""
+    with db() as conn:
+        row = conn.execute(
+            "SELECT id, details FROM trip_summary WHERE id = ? AND kind = 'trip'", (trip_id,)
+        ).fetchone()
+    if row is None:
+        return jsonify({'error': f'Unknown trip {trip_id}'}), 404
+    trip = json.loads(row[1])
+    trip['id'] = row[0]
+    return jsonify(trip)
+
 @app.route('/api/alerts', methods=['GET'])
 def get_alerts():
     """Get current alerts"""
-    return jsonify(diagnostics.alerts)
+    snapshot, error = current_snapshot()
+    if error:
+        return error
+    return jsonify(snapshot['alerts'])
 
 @app.route('/api/health', methods=['GET'])
 def get_health_score():
     """Get vehicle health score"""
-    return jsonify({'health_score': diagnostics.get_health_score(latest_data)})
\ No newline at end of file
+    snapshot, error = current_snapshot()
+    if error:
+        return error
+    return jsonify({'health_score': diagnostics.get_health_score(snapshot)})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vehicle Ease Pro API server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8768)
+    parser.add_argument('--fd', type=int, help='serve on an inherited listening socket (launch.py worker pool)')
+    parser.add_argument('--db-pool', type=int, default=POOL_SIZE,
+                        help='pooled read-only SQLite connections (0 = connect per request)')
+    parser.add_argument('--health-port', type=int,
+                        help='also serve on this loopback port, so a supervisor can probe this worker alone')
+    args = parser.parse_args()
+    pool_size = args.db_pool
+
+    server = make_server(args.host, args.port, app, threaded=True, fd=args.fd)
+    print(f"API server on http://{args.host}:{args.port}" + (f" (shared fd {args.fd})" if args.fd else ""))
+    if args.health_port:
+        # Same app and process; a worker that stops answering here is the one that's stuck
+        health_server = make_server('127.0.0.1', args.health_port, app, threaded=True)
+        threading.Thread(target=health_server.serve_forever, name='HealthServer', daemon=True).start()
+    notify_ready('api')
+    server.serve_forever()
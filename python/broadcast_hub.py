@@ -0,0 +1,135 @@
+import asyncio
+import collections
+import json
+import threading
+
+import websockets
+
+class Subscriber:
+    """One client's bounded mailbox - the oldest message is dropped when it is full"""
+
+    def __init__(self, topic, maxsize, wakeup):
+        self.topic = topic
+        self.queue = collections.deque(maxlen=maxsize)
+        self.wakeup = wakeup
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def offer(self, payload):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(payload)
+        self.wakeup()
+
+    def drain(self):
+        items = []
+        while self.queue:
+            items.append(self.queue.popleft())
+        return items
+
+class BroadcastHub:
+    """Push each sample to every subscriber instead of letting clients poll"""
+
+    def __init__(self, queue_size=8, coalesce=True):
+        """
+        queue_size: messages buffered per client before the oldest is dropped
+        coalesce: send a slow client only the newest snapshot it has pending
+        """
+        self.queue_size = queue_size
+        self.coalesce = coalesce
+        self.published = 0
+        self.subscribers_total = 0
+        # Counters of clients that have already disconnected
+        self._retired = {'delivered': 0, 'dropped': 0, 'coalesced': 0}
+        self._subscribers = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic=None, wakeup=None):
+        """topic=None receives every topic"""
+        subscriber = Subscriber(topic, self.queue_size, wakeup or (lambda: None))
+        with self._lock:
+            # Copy-on-write so publish() can iterate without taking the lock
+            self._subscribers = self._subscribers + (subscriber,)
+            self.subscribers_total += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+            for key in self._retired:
+                self._retired[key] += getattr(subscriber, key)
+
+    def has_subscribers(self, topic=None):
+        return any(s.topic is None or s.topic == topic for s in self._subscribers)
+
+    def publish(self, message, topic=None):
+        """Serialize once, then hand the same payload to every matching client"""
+        payload = message if isinstance(message, str) else json.dumps(message)
+        self.published += 1
+        for subscriber in self._subscribers:
+            if subscriber.topic is None or subscriber.topic == topic:
+                subscriber.offer(payload)
+
+    def _pending(self, subscriber):
+        items = subscriber.drain()
+        if self.coalesce and len(items) > 1:
+            subscriber.coalesced += len(items) - 1
+            items = items[-1:]
+        subscriber.delivered += len(items)
+        return items
+
+    def sse_stream(self, topic=None, keepalive=15):
+        """Generator for a Flask text/event-stream response"""
+        event = threading.Event()
+        subscriber = self.subscribe(topic, event.set)
+        try:
+            while True:
+                if not event.wait(keepalive):
+                    yield ': keepalive\n\n'
+                    continue
+                event.clear()
+                for payload in self._pending(subscriber):
+                    yield f'data: {payload}\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def serve_websocket(self, websocket):
+        """websockets handler - ws://host:port/?topic=<name> filters to one topic"""
+        topic = None
+        if '?topic=' in websocket.path:
+            topic = websocket.path.split('?topic=', 1)[1] or None
+
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        event = asyncio.Event()
+
+        def wakeup():
+            if threading.get_ident() == loop_thread:
+                event.set()
+            else:
+                loop.call_soon_threadsafe(event.set)
+
+        subscriber = self.subscribe(topic, wakeup)
+        try:
+            while True:
+                await event.wait()
+                event.clear()
+                for payload in self._pending(subscriber):
+                    await websocket.send(payload)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.unsubscribe(subscriber)
+
+    def get_stats(self):
+        subscribers = self._subscribers
+        return {
+            'published': self.published,
+            'subscribers': len(subscribers),
+            'subscribers_total': self.subscribers_total,
+            'queued': sum(len(s.queue) for s in subscribers),
+            'delivered': self._retired['delivered'] + sum(s.delivered for s in subscribers),
+            'dropped': self._retired['dropped'] + sum(s.dropped for s in subscribers),
+            'coalesced': self._retired['coalesced'] + sum(s.coalesced for s in subscribers),
+        }
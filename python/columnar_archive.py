@@ -0,0 +1,263 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b'VEPA'
+VERSION = 1
+BLOCK_ROWS = 65536  # rows per independently compressed block (~55 minutes at 20 Hz)
+COMPRESS_LEVEL = 6
+COLUMNS = ('id', 'timestamp', 'rpm', 'speed', 'coolant_temp', 'throttle', 'gear', 'fuel_consumption')
+INTEGER_COLUMNS = ('id', 'rpm', 'speed', 'coolant_temp', 'throttle')  # INTEGER affinity in trip_data
+
+# magic, version, column count, block count, rows, index offset, metadata JSON length
+HEADER = struct.Struct('<4sHHIQQI')
+# Block index row (int64s): ts min, ts max, id min, id max, rows, then offset, size, encoding per column
+INDEX_FIXED = 5
+
+# Column encodings in the low byte; integer encodings carry the delta dtype
+# in bits 8-15, and REAL columns stored as integers their decimal scale + 1 in bits 16+
+DELTA = 1      # first value then differences, narrowest int dtype
+DELTA_RLE = 2  # run-length (value, count) pairs over the differences - slow signals like coolant
+FLOAT = 3      # float64 bits XORed with the previous value, NULL as NaN
+DICT_RLE = 4   # gear: run-length pairs of codes into the archive's dictionary
+MAX_SCALE = 9  # decimals tried before falling back to FLOAT
+INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+def _shuffle(values):
+    """Group byte 0 of every value, then byte 1, ... - zlib finds far more repeats"""
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+def _unshuffle(data, dtype, count):
+    itemsize = np.dtype(dtype).itemsize
+    return np.frombuffer(data, np.uint8, count * itemsize).reshape(itemsize, count).T.copy().view(dtype).ravel()
+
+def _narrow(values):
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for code, dtype in enumerate(INT_DTYPES):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return code, values.astype(dtype)
+
+def _runs(values):
+    """(run values, run lengths)"""
+    starts = np.flatnonzero(np.diff(values)) + 1
+    starts = np.concatenate(([0], starts))
+    return values[starts], np.diff(np.append(starts, len(values))).astype(np.uint32)
+
+def _encode_ints(values):
+    deltas = np.empty_like(values)
+    deltas[:1] = values[:1]
+    deltas[1:] = np.diff(values)
+    run_values, run_lengths = _runs(deltas)
+    if len(run_values) * 3 < len(values):
+        code, narrow = _narrow(run_values)
+        payload = struct.pack('<I', len(run_values)) + _shuffle(narrow) + _shuffle(run_lengths)
+        return DELTA_RLE | code << 8, payload
+    code, narrow = _narrow(deltas)
+    return DELTA | code << 8, _shuffle(narrow)
+
+def _encode_numeric(column):
+    """Delta/RLE for integer blocks and for REAL blocks that are exact at a few decimals; FLOAT otherwise"""
+    try:
+        values = np.array(column)
+    except OverflowError:
+        values = np.array(column, dtype=np.float64)
+    if values.dtype.kind == 'i':
+        return _encode_ints(values.astype(np.int64))
+    values = np.array(column, dtype=np.float64)
+    if np.isfinite(values).all() and np.abs(values).max() < 1e9:
+        for scale in range(MAX_SCALE + 1):
+            scaled = np.round(values * 10 ** scale)
+            # Only when dividing back gives the identical doubles
+            if np.array_equal(scaled / 10 ** scale, values):
+                encoding, payload = _encode_ints(scaled.astype(np.int64))
+                return encoding | (scale + 1) << 16, payload
+    bits = values.view(np.uint64)
+    return FLOAT, _shuffle(bits ^ np.concatenate((np.zeros(1, np.uint64), bits[:-1])))
+
+def _decode(encoding, data, count):
+    kind, code = encoding & 0xff, encoding >> 8 & 0xff
+    if kind == FLOAT:
+        return np.bitwise_xor.accumulate(_unshuffle(data, np.uint64, count)).view(np.float64)
+    if encoding >> 16:
+        return _decode(encoding & 0xffff, data, count) / 10 ** ((encoding >> 16) - 1)
+    if kind == DELTA:
+        return np.cumsum(_unshuffle(data, INT_DTYPES[code], count), dtype=np.int64)
+    runs = struct.unpack_from('<I', data)[0]
+    dtype = INT_DTYPES[code] if kind == DELTA_RLE else np.uint16
+    values = _unshuffle(data[4:], dtype, runs)
+    lengths = _unshuffle(data[4 + runs * values.itemsize:], np.uint32, runs)
+    expanded = np.repeat(values.astype(np.int64), lengths)
+    return np.cumsum(expanded) if kind == DELTA_RLE else expanded
+
+def to_micros(value):
+    """Microseconds since 1970-01-01 of a naive datetime or stored timestamp string (no time zone maths,
+    matching how SQLite compares the text)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - datetime(1970, 1, 1)) // np.timedelta64(1, 'us').item()
+
+def timestamp_strings(micros):
+    """Stored-text form of microsecond timestamps, as str(datetime) writes them"""
+    text = np.datetime_as_string(micros.astype('datetime64[us]'), unit='us')
+    return np.char.replace(np.char.replace(text, 'T', ' '), '.000000', '').tolist()
+
+def write_archive(path, cursor, block_rows=BLOCK_ROWS):
+    """Write trip_data rows (COLUMNS order, id order) from a cursor into a columnar file; returns the row count"""
+    gear_codes = {}
+    index = []
+    total = 0
+    last_ts = None
+    time_ordered = True  # id order is also timestamp order (no late inserts)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        while True:
+            rows = cursor.fetchmany(block_rows)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            ids = np.array(columns[0], dtype=np.int64)
+            ts = np.array(columns[1], dtype='datetime64[us]').astype(np.int64)
+            entry = [int(ts.min()), int(ts.max()), int(ids.min()), int(ids.max()), len(rows)]
+            if time_ordered and ((last_ts is not None and ts[0] < last_ts) or (np.diff(ts) < 0).any()):
+                time_ordered = False
+            last_ts = ts[-1]
+            for name, column in zip(COLUMNS, columns):
+                if name == 'id':
+                    encoding, payload = _encode_ints(ids)
+                elif name == 'timestamp':
+                    encoding, payload = _encode_ints(ts)
+                elif name == 'gear':
+                    codes = np.fromiter((gear_codes.setdefault(g, len(gear_codes)) for g in column),
+                                        dtype=np.uint16, count=len(column))
+                    run_values, run_lengths = _runs(codes)
+                    encoding = DICT_RLE
+                    payload = struct.pack('<I', len(run_values)) + _shuffle(run_values) + _shuffle(run_lengths)
+                else:
+                    encoding, payload = _encode_numeric(column)
+                payload = zlib.compress(payload, COMPRESS_LEVEL)
+                entry += [f.tell(), len(payload), encoding]
+                f.write(payload)
+            index.append(entry)
+            total += len(rows)
+
+        gears = sorted(gear_codes, key=gear_codes.get)
+        index_offset = f.tell()
+        f.write(np.array(index, dtype=np.int64).tobytes())
+        metadata = json.dumps({'columns': COLUMNS, 'gears': gears, 'time_ordered': time_ordered}).encode()
+        f.write(metadata)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), len(index), total, index_offset, len(metadata)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return total
+
+class ColumnarArchive:
+    """Memory-mapped reader. The block index is a zero-copy view of the map and
+    compressed blocks are inflated straight from it, so a range read touches
+    only the blocks (and columns) it needs."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, columns, blocks, self.rows, index_offset, metadata_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a trip_data archive')
+        width = INDEX_FIXED + 3 * columns
+        self.index = np.frombuffer(self.map, np.int64, blocks * width, index_offset).reshape(blocks, width)
+        metadata_offset = index_offset + self.index.nbytes
+        metadata = json.loads(self.map[metadata_offset:metadata_offset + metadata_size])
+        self.columns = {name: i for i, name in enumerate(metadata['columns'])}
+        self.gears = metadata['gears']
+        self.time_ordered = metadata['time_ordered']
+        self.view = memoryview(self.map)
+
+    def column(self, block, name):
+        """One decoded column of one block (timestamps as int64 microseconds, gear as dictionary codes)"""
+        entry = self.index[block]
+        offset, size, encoding = entry[INDEX_FIXED + 3 * self.columns[name]:][:3]
+        return _decode(int(encoding), zlib.decompress(self.view[offset:offset + size]), int(entry[4]))
+
+    def iter_blocks(self, columns, start=None, end=None, after_id=None, start_inclusive=True, order_by='id'):
+        """Yield {column: array} per block for rows in the [start, end) window and past after_id.
+        order_by='timestamp' on a file with late inserts yields a single sorted chunk instead."""
+        blocks = self._iter_blocks(columns, start, end, after_id, start_inclusive)
+        if order_by == 'id' or self.time_ordered:
+            yield from blocks
+            return
+        blocks = list(self._iter_blocks(set(columns) | {'timestamp'}, start, end, after_id, start_inclusive))
+        if not blocks:
+            return
+        merged = {name: np.concatenate([block[name] for block in blocks]) for name in blocks[0]}
+        order = np.argsort(merged['timestamp'], kind='stable')
+        yield {name: merged[name][order] for name in columns}
+
+    def _iter_blocks(self, columns, start, end, after_id, start_inclusive):
+        start_us = to_micros(start) if start is not None else None
+        end_us = to_micros(end) if end is not None else None
+        for block, entry in enumerate(self.index):
+            if start_us is not None and entry[1] < start_us:
+                continue
+            if end_us is not None and entry[0] >= end_us:
+                continue
+            if after_id is not None and entry[3] <= after_id:
+                continue
+            mask = None
+            if start_us is not None or end_us is not None:
+                ts = self.column(block, 'timestamp')
+                mask = np.ones(len(ts), dtype=bool)
+                if start_us is not None:
+                    mask &= ts >= start_us if start_inclusive else ts > start_us
+                if end_us is not None:
+                    mask &= ts < end_us
+            if after_id is not None:
+                ids = self.column(block, 'id')
+                mask = ids > after_id if mask is None else mask & (ids > after_id)
+            if mask is not None and not mask.any():
+                continue
+            arrays = {}
+            for name in columns:
+                values = self.column(block, name)
+                arrays[name] = values if mask is None else values[mask]
+            yield arrays
+
+    def to_python(self, name, values):
+        """Column array -> list of the values SQLite would have returned"""
+        if name == 'timestamp':
+            return timestamp_strings(values)
+        if name == 'gear':
+            return [self.gears[code] for code in values.tolist()]
+        if values.dtype == np.float64 and name in INTEGER_COLUMNS:
+            # Blocks with NULLs are stored as floats; SQLite hands whole numbers back as int
+            return [None if value != value else int(value) if value.is_integer() else value
+                    for value in values.tolist()]
+        if values.dtype == np.float64:
+            return [None if value != value else value for value in values.tolist()]
+        return values.tolist()
+
+    def iter_rows(self, columns, start=None, end=None, after_id=None, limit=None,
+                  chunk_size=2000, start_inclusive=True, order_by='id'):
+        """Chunks of row tuples, like iter_trip_data's SQLite chunks"""
+        for arrays in self.iter_blocks(columns, start, end, after_id, start_inclusive, order_by):
+            lists = [self.to_python(name, arrays[name]) for name in columns]
+            rows = list(zip(*lists))
+            if limit is not None:
+                rows = rows[:limit]
+                limit -= len(rows)
+            for i in range(0, len(rows), chunk_size):
+                yield rows[i:i + chunk_size]
+            if limit is not None and limit <= 0:
+                return
+
+    def close(self):
+        self.view.release()
+        self.index = None
+        self.map.close()
@@ -1,12 +1,30 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
 import threading
 import websockets
 import json
 import asyncio
+import argparse
+import atexit
+import signal
+import sys
 import time
 from datetime import datetime
+from data_logger import DataLogger
+from broadcast_hub import BroadcastHub
+from wire_format import SUBPROTOCOLS, SUBPROTOCOL_BINARY, decode_frame
+from diagnostics import VehicleDiagnostics
+from metrics import REGISTRY, PROFILER
+from metrics_http import instrument_app
+from recent_store import RecentStore
+from fuel_model import TripIntegrator, fuel_efficiency, fuel_rate
+from gear_model import CALIBRATION_PATH, GearTracker, load_calibration
+from shared_state import SharedStateWriter
+from readiness import notify_ready
+import api_server
 
 app = Flask(__name__)
+instrument_app(app)
 
 # Store latest car data with fuel calculations
 latest_data = {
@@ -17,6 +35,7 @@ latest_data = {
     "gear": "N",
     "fuel_rate": 0.0,
     "trip_fuel": 0.0,
+    "trip_distance": 0.0,
     "fuel_efficiency": 0.0,
     "trip_cost": 0.0
 }
@@ -24,103 +43,422 @@ latest_data = {
 # Fuel calculation constants
 FUEL_PRICE = 1.50  # $ per liter - adjust for your region
 TRIP_START_TIME = time.time()
-TRIP_DISTANCE = 0.0  # km
+# Distance and fuel integrated over the real time between samples
+trip = TripIntegrator()
 
-def calculate_gear(rpm, speed):
-    """Calculate gear based on RPM and speed"""
-    if speed == 0 or rpm < 500:
-        return "N"
-    
-    # Simple gear calculation
-    ratio = rpm / max(1, speed)
-    
-    if ratio > 300: return "1"
-    elif ratio > 200: return "2" 
-    elif ratio > 150: return "3"
-    elif ratio > 120: return "4"
-    elif ratio > 100: return "5"
-    else: return "6"
+# vehicle_id -> calibrated GearModel (gear_model.py --vehicle ...); uncalibrated
+# vehicles use the default ratios
+gear_models = {}
+gear_tracker = GearTracker()
+
+# Push enriched samples to dashboards over WebSocket (HUB_PORT) and SSE (/stream)
+HUB_PORT = 8767
+hub = BroadcastHub()
+
+# Rule engine run on every sample; alert state is kept per vehicle
+diagnostics = VehicleDiagnostics()
+
+# Newest samples in memory for /api/history (fixed size, see recent_store.py)
+recent_store = RecentStore()
+api_server.recent_store = recent_store
+
+# Snapshot + active alerts per vehicle for api_server processes, created at startup
+shared_state = None
+
+# Write-behind logger, created at startup so the receive loop never waits on SQLite
+trip_logger = None
+
+# Hot-path metrics; label children are resolved once here, not per sample
+FRAMES = REGISTRY.counter('bridge_frames_received_total', 'Upstream WebSocket frames', ('encoding',))
+FRAMES_JSON = FRAMES.labels('json')
+FRAMES_BINARY = FRAMES.labels('binary')
+SAMPLES = REGISTRY.counter('bridge_samples_total', 'Samples enriched by the bridge')
+RECONNECTS = REGISTRY.counter('bridge_reconnects_total', 'Upstream connection failures')
+# Stage timings cover 1 frame in STAGE_SAMPLE_EVERY; timing every frame costs ~4% of the loop
+STAGE_SAMPLE_EVERY = 16
+STAGE_SECONDS = REGISTRY.histogram('bridge_stage_seconds', 'Per-frame time in each bridge stage (sampled)',
+                                   ('stage',))
+DECODE_SECONDS = STAGE_SECONDS.labels('decode')
+ENRICH_SECONDS = STAGE_SECONDS.labels('enrich')
+PUBLISH_SECONDS = STAGE_SECONDS.labels('publish')
+FLEET_SECONDS = STAGE_SECONDS.labels('fleet_ingest')
+REGISTRY.gauge('bridge_fleet_connected', 'Fleet vehicles with a live upstream connection').set_function(
+    lambda: sum(1 for v in list(fleet.values()) if v.connected))
+REGISTRY.gauge('recent_store_samples', 'Samples held in memory for /api/history').set_function(
+    lambda: recent_store.count)
+REGISTRY.gauge('hub_subscribers', 'Dashboards connected to the broadcast hub').set_function(
+    lambda: hub.get_stats()['subscribers'])
 
 def calculate_fuel_data(data):
     """Calculate real-time fuel consumption and efficiency"""
-    global TRIP_DISTANCE
-    
-    # Base fuel consumption model (liters per hour)
-    # Idle consumption + RPM factor + Throttle factor
-    idle_consumption = 0.8  # liters/hour at idle
-    rpm_factor = (data['rpm'] / 1000) * 0.5  # scales with RPM
-    throttle_factor = (data['throttle'] / 100) * 1.2  # scales with throttle
-    
     # Current fuel consumption rate (liters/hour)
-    current_fuel_rate = idle_consumption + rpm_factor + throttle_factor
+    current_fuel_rate = fuel_rate(data['rpm'], data['throttle'])
     
-    # Convert to liters per second for trip calculation
-    fuel_per_second = current_fuel_rate / 3600
+    # Samples arrive at ~20 Hz (or in batches), so integrate over their own timestamps
+    trip.add(data.get('ts') or time.time(), data['speed'], current_fuel_rate)
     
-    # Update trip distance (speed in km/h -> km per second)
-    distance_per_second = data['speed'] / 3600
-    TRIP_DISTANCE += distance_per_second
-    
-    # Calculate instant fuel efficiency (km/liter)
-    instant_efficiency = 0.0
-    if current_fuel_rate > 0 and data['speed'] > 0:
-        instant_efficiency = data['speed'] / current_fuel_rate  # km/l
-    
-    # Update trip fuel consumption
     latest_data['fuel_rate'] = round(current_fuel_rate, 2)
-    latest_data['trip_fuel'] += fuel_per_second
-    latest_data['fuel_efficiency'] = round(instant_efficiency, 1)
-    latest_data['trip_cost'] = round(latest_data['trip_fuel'] * FUEL_PRICE, 2)
+    latest_data['trip_fuel'] = trip.fuel_l
+    latest_data['trip_distance'] = round(trip.distance_km, 3)
+    latest_data['fuel_efficiency'] = round(fuel_efficiency(data['speed'], current_fuel_rate), 1)
+    latest_data['trip_cost'] = round(trip.fuel_l * FUEL_PRICE, 2)
     
     return latest_data
 
+class VehicleState:
+    """Live state of one vehicle in fleet mode - slots keep hundreds of these small"""
+    __slots__ = (
+        'vehicle_id', 'uri', 'connected', 'reconnects', 'samples', 'busy_ns',
+        'rpm', 'coolant', 'throttle', 'speed', 'gear',
+        'fuel_rate', 'trip_fuel', 'fuel_efficiency', 'trip_cost',
+        'trip', 'gear_tracker', 'trip_start_time', 'ts',
+    )
+
+    def __init__(self, vehicle_id, uri):
+        self.vehicle_id = vehicle_id
+        self.uri = uri
+        self.connected = False
+        self.reconnects = 0
+        self.samples = 0
+        self.busy_ns = 0
+        self.rpm = self.coolant = self.throttle = self.speed = 0
+        self.gear = "N"
+        self.fuel_rate = self.trip_fuel = self.fuel_efficiency = self.trip_cost = 0.0
+        self.trip = TripIntegrator()
+        self.gear_tracker = GearTracker(gear_models.get(vehicle_id))
+        self.trip_start_time = time.time()
+        self.ts = None
+
+    def apply(self, rpm, coolant, throttle, speed, ts=None):
+        """Same enrichment as the single-vehicle path, on this vehicle's own trip"""
+        self.ts = ts or time.time()
+        self.rpm = rpm
+        self.coolant = coolant
+        self.throttle = throttle
+        self.speed = speed
+        self.gear = self.gear_tracker.update(rpm, speed)
+
+        rate = fuel_rate(rpm, throttle)
+        self.trip.add(self.ts, speed, rate)
+        self.trip_fuel = self.trip.fuel_l
+        self.fuel_rate = round(rate, 2)
+        self.fuel_efficiency = round(fuel_efficiency(speed, rate), 1)
+        self.trip_cost = round(self.trip_fuel * FUEL_PRICE, 2)
+        self.samples += 1
+
+    @property
+    def trip_distance(self):
+        return self.trip.distance_km
+
+    def get(self, key, default=None):
+        """Dict-style lookup so diagnostics rules can read the state directly"""
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {
+            "vehicle_id": self.vehicle_id,
+            "connected": self.connected,
+            "rpm": self.rpm,
+            "coolant": self.coolant,
+            "throttle": self.throttle,
+            "speed": self.speed,
+            "gear": self.gear,
+            "fuel_rate": self.fuel_rate,
+            "trip_fuel": self.trip_fuel,
+            "fuel_efficiency": self.fuel_efficiency,
+            "trip_cost": self.trip_cost,
+            "trip_distance": round(self.trip_distance, 3),
+            "ts": self.ts,
+        }
+
+# vehicle_id -> VehicleState, filled from --fleet / --fleet-config at startup
+fleet = {}
+FLEET_STARTED = time.time()
+
 @app.route('/data')
 def get_data():
     return jsonify(latest_data)
 
+@app.route('/data/<vehicle_id>')
+def get_vehicle_data(vehicle_id):
+    vehicle = fleet.get(vehicle_id)
+    if vehicle is None:
+        return jsonify({"error": f"Unknown vehicle {vehicle_id}"}), 404
+    return jsonify(vehicle.to_dict())
+
+@app.route('/fleet')
+def get_fleet():
+    """Latest state of every vehicle"""
+    return jsonify([vehicle.to_dict() for vehicle in list(fleet.values())])
+
+@app.route('/fleet/stats')
+def get_fleet_stats():
+    """Connection counts, ingest rate and per-vehicle CPU cost"""
+    vehicles = list(fleet.values())
+    samples = sum(v.samples for v in vehicles)
+    busy_ns = sum(v.busy_ns for v in vehicles)
+    elapsed = time.time() - FLEET_STARTED
+    return jsonify({
+        "vehicles": len(vehicles),
+        "connected": sum(1 for v in vehicles if v.connected),
+        "reconnects": sum(v.reconnects for v in vehicles),
+        "samples": samples,
+        "samples_per_second": round(samples / elapsed, 1),
+        "ingest_us_per_sample": round(busy_ns / max(1, samples) / 1000, 2),
+        "ingest_cpu_percent_per_vehicle": round(busy_ns / 1e9 / elapsed / max(1, len(vehicles)) * 100, 4),
+        "process_cpu_percent": round(time.process_time() / elapsed * 100, 1),
+    })
+
+@app.route('/stream')
+def stream_data():
+    """Server-sent events feed of every enriched sample"""
+    response = Response(hub.sse_stream(request.args.get('topic')), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def active_alerts(vehicle_id):
+    state = diagnostics.engine.vehicles.get(vehicle_id)
+    return state['active'] if state else []
+
+@app.route('/alerts')
+def get_alerts():
+    """Active alerts (for ?vehicle=<id> in fleet mode) and recent raise/clear events"""
+    vehicle_id = request.args.get('vehicle', 'default')
+    return jsonify({
+        "active": active_alerts(vehicle_id),
+        "events": [e for e in list(diagnostics.alert_history)[-100:] if e['vehicle_id'] == vehicle_id],
+    })
+
+@app.route('/hub/stats')
+def get_hub_stats():
+    """Subscriber count and delivered/dropped/coalesced counters"""
+    return jsonify(hub.get_stats())
+
+@app.route('/logger/stats')
+def get_logger_stats():
+    """Report ingest queue depth and drop/backpressure counters"""
+    if trip_logger is None:
+        return jsonify({"write_behind": False})
+    return jsonify(trip_logger.get_queue_stats())
+
 @app.route('/trip/reset', methods=['POST'])
 def reset_trip():
     """Reset trip data"""
-    global TRIP_START_TIME, TRIP_DISTANCE
+    global TRIP_START_TIME
     TRIP_START_TIME = time.time()
-    TRIP_DISTANCE = 0.0
+    trip.reset()
     latest_data['trip_fuel'] = 0.0
+    latest_data['trip_distance'] = 0.0
     latest_data['trip_cost'] = 0.0
+    if trip_logger is not None:
+        trip_logger.end_trip()
     return jsonify({"status": "Trip reset"})
 
+def enrich_sample():
+    """Derive gear and fuel for the sample just written into latest_data"""
+    # Add gear calculation
+    latest_data['gear'] = gear_tracker.update(
+        latest_data.get('rpm', 0), 
+        latest_data.get('speed', 0)
+    )
+    
+    # Calculate fuel data
+    calculate_fuel_data(latest_data)
+
+    # The sample's own time: a batched frame's samples arrive microseconds apart
+    diagnostics.check_alerts(latest_data, latest_data.get('ts'))
+    if shared_state is not None:
+        shared_state.write('default', latest_data, diagnostics.alerts)
+    # Bridge clock, like the trip_data rows the logger stamps: /api/history splits a
+    # window between the two tiers by time, and replayed samples carry old ts values
+    recent_store.append(time.time(), latest_data)
+
+    if trip_logger is not None:
+        trip_logger.log_data(latest_data)
+
+def decode_samples(data, binary):
+    """Binary frames carry a batch of tuples; JSON frames one dict"""
+    if binary:
+        return decode_frame(data)
+    return (json.loads(data),)
+
+def enrich_samples(samples, binary):
+    for sample in samples:
+        if binary:
+            ts, rpm, coolant, throttle, speed = sample
+            latest_data['ts'] = ts
+            latest_data['rpm'] = rpm
+            latest_data['coolant'] = coolant
+            latest_data['throttle'] = throttle
+            latest_data['speed'] = speed
+        else:
+            latest_data.update(sample)
+        enrich_sample()
+    SAMPLES.inc(len(samples))
+
+def handle_frame(data, binary):
+    """Decode one upstream frame, enrich each sample and push the result"""
+    frames = FRAMES_BINARY if binary else FRAMES_JSON
+    frames.inc()
+    if frames.value % STAGE_SAMPLE_EVERY:
+        enrich_samples(decode_samples(data, binary), binary)
+        # One push per frame even when it carried a batch
+        hub.publish(latest_data)
+        return
+
+    start = time.perf_counter()
+    samples = decode_samples(data, binary)
+    decoded = time.perf_counter()
+    enrich_samples(samples, binary)
+    enriched = time.perf_counter()
+    hub.publish(latest_data)
+    DECODE_SECONDS.observe(decoded - start)
+    ENRICH_SECONDS.observe(enriched - decoded)
+    PUBLISH_SECONDS.observe(time.perf_counter() - enriched)
+
 async def websocket_client():
     """Connect to OBD server and forward data"""
     uri = "ws://localhost:8765"
     
     while True:
         try:
-            async with websockets.connect(uri) as websocket:
-                print("Connected to OBD server")
+            # Offer the binary encoding; servers that don't know it keep sending JSON
+            async with websockets.connect(uri, subprotocols=SUBPROTOCOLS) as websocket:
+                binary = websocket.subprotocol == SUBPROTOCOL_BINARY
+                print(f"Connected to OBD server ({'binary' if binary else 'json'})")
                 while True:
-                    data = await websocket.recv()
-                    global latest_data
-                    latest_data.update(json.loads(data))
-                    
-                    # Add gear calculation
-                    latest_data['gear'] = calculate_gear(
-                        latest_data.get('rpm', 0), 
-                        latest_data.get('speed', 0)
-                    )
-                    
-                    # Calculate fuel data
-                    calculate_fuel_data(latest_data)
+                    handle_frame(await websocket.recv(), binary)
                     
         except Exception as e:
             print(f"WebSocket error: {e}")
+            RECONNECTS.inc()
+            if shared_state is not None:
+                shared_state.write('default', latest_data, active_alerts('default'), connected=False)
             await asyncio.sleep(2)
 
+async def vehicle_client(vehicle):
+    """Fleet mode: one upstream connection per vehicle, all on the same loop"""
+    while True:
+        try:
+            async with websockets.connect(vehicle.uri, subprotocols=SUBPROTOCOLS) as websocket:
+                vehicle.connected = True
+                binary = websocket.subprotocol == SUBPROTOCOL_BINARY
+                async for data in websocket:
+                    start = time.perf_counter_ns()
+                    (FRAMES_BINARY if binary else FRAMES_JSON).inc()
+                    if binary:
+                        for ts, rpm, coolant, throttle, speed in decode_frame(data):
+                            vehicle.apply(rpm, coolant, throttle, speed, ts)
+                    else:
+                        sample = json.loads(data)
+                        vehicle.apply(sample.get('rpm', 0), sample.get('coolant', 0),
+                                      sample.get('throttle', 0), sample.get('speed', 0), sample.get('ts'))
+                    active = diagnostics.check_alerts(vehicle, vehicle.ts, vehicle.vehicle_id)
+                    if shared_state is not None:
+                        shared_state.write(vehicle.vehicle_id, vehicle, active)
+                    # Only pay for serialization when someone is listening
+                    if hub.has_subscribers(vehicle.vehicle_id):
+                        hub.publish(vehicle.to_dict(), topic=vehicle.vehicle_id)
+                    elapsed = time.perf_counter_ns() - start
+                    vehicle.busy_ns += elapsed
+                    FLEET_SECONDS.observe(elapsed / 1e9)
+        except Exception as e:
+            print(f"[{vehicle.vehicle_id}] WebSocket error: {e}")
+        vehicle.connected = False
+        vehicle.reconnects += 1
+        if shared_state is not None:
+            shared_state.write(vehicle.vehicle_id, vehicle, active_alerts(vehicle.vehicle_id), connected=False)
+        RECONNECTS.inc()
+        await asyncio.sleep(2)
+
+async def run_bridge():
+    """Upstream OBD client(s) and downstream broadcast server share one loop"""
+    async with websockets.serve(hub.serve_websocket, "0.0.0.0", HUB_PORT):
+        print(f"Broadcast hub on ws://0.0.0.0:{HUB_PORT}")
+        if fleet:
+            print(f"Fleet mode: {len(fleet)} vehicles")
+            await asyncio.gather(*(vehicle_client(vehicle) for vehicle in fleet.values()))
+        else:
+            await websocket_client()
+
+def load_fleet(count=0, config_path=None, uri="ws://localhost:8765"):
+    """--fleet N simulates N cars against one source; --fleet-config maps id -> uri"""
+    global FLEET_STARTED
+    if config_path:
+        with open(config_path) as f:
+            for vehicle_id, vehicle_uri in json.load(f).items():
+                fleet[vehicle_id] = VehicleState(vehicle_id, vehicle_uri)
+    for i in range(count):
+        vehicle_id = f"vehicle-{i + 1}"
+        fleet[vehicle_id] = VehicleState(vehicle_id, uri)
+    FLEET_STARTED = time.time()
+
+def serve_api():
+    """Answer api_server's /api/* routes from this process, so they can read recent_store"""
+    bridge_app = app.wsgi_app
+    api_app = api_server.app.wsgi_app
+
+    def dispatch(environ, start_response):
+        if environ.get('PATH_INFO', '').startswith('/api/'):
+            return api_app(environ, start_response)
+        return bridge_app(environ, start_response)
+    app.wsgi_app = dispatch
+
+def exit_on_sigterm(signum, frame):
+    """Supervisor stop: exit normally so atexit flushes the write-behind queue"""
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    sys.exit(0)
+
 def run_websocket_client():
-    asyncio.new_event_loop().run_until_complete(websocket_client())
+    asyncio.new_event_loop().run_until_complete(run_bridge())
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vehicle Ease Pro data bridge")
+    parser.add_argument('--fleet', type=int, default=0, help='simulate N vehicles against --uri')
+    parser.add_argument('--fleet-config', help='JSON file mapping vehicle_id -> ws:// uri')
+    parser.add_argument('--uri', default="ws://localhost:8765")
+    parser.add_argument('--recent-capacity', type=int, default=recent_store.capacity,
+                        help='samples kept in memory for /api/history (8 bytes x 7 columns each)')
+    parser.add_argument('--profile', action='store_true',
+                        help='start the sampling profiler (folded stacks at /debug/profile)')
+    parser.add_argument('--shard-dir', help='store raw trip_data in one database file per day here')
+    parser.add_argument('--retention-days', type=int,
+                        help='expire raw samples older than this many days (rollups are kept)')
+    parser.add_argument('--gear-calibration', default=CALIBRATION_PATH,
+                        help='per-vehicle gear ratios written by gear_model.py')
+    parser.add_argument('--archive-after-days', type=int,
+                        help='convert day shards older than this to compressed columnar archives')
+    args = parser.parse_args()
+
+    if args.profile:
+        PROFILER.start()
+    gear_models.update(load_calibration(args.gear_calibration))
+    gear_tracker = GearTracker(gear_models.get('default'))
+    if args.recent_capacity != recent_store.capacity:
+        recent_store = api_server.recent_store = RecentStore(args.recent_capacity)
+    serve_api()
+    try:
+        shared_state = SharedStateWriter()
+    except FileExistsError as e:
+        sys.exit(f"Data bridge: {e}")
+    atexit.register(shared_state.close)
+
+    if args.fleet or args.fleet_config:
+        load_fleet(args.fleet, args.fleet_config, args.uri)
+    else:
+        trip_logger = DataLogger(write_behind=True, segment_trips=True,
+                                 shard_dir=args.shard_dir, retention_days=args.retention_days,
+                                 archive_after_days=args.archive_after_days)
+        atexit.register(trip_logger.close)
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+
     # Start WebSocket client in background thread
     ws_thread = threading.Thread(target=run_websocket_client, daemon=True)
     ws_thread.start()
     
-    # Start Flask server
-    app.run(host='0.0.0.0', port=8766, debug=False)
\ No newline at end of file
+    # Bind before signalling so launch.py never sees a ready bridge refuse a connection
+    server = make_server('0.0.0.0', 8766, app, threaded=True)
+    print("Data bridge on http://0.0.0.0:8766")
+    notify_ready('bridge')
+    server.serve_forever()
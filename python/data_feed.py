@@ -0,0 +1,124 @@
+import asyncio
+import json
+import threading
+import time
+
+import websockets
+
+HUB_URI = 'ws://localhost:8767'
+DATA_URL = 'http://localhost:8766/data'
+RECONNECT_INITIAL = 0.5
+RECONNECT_MAX = 5.0
+HTTP_TIMEOUT = 1.0
+POLL_INTERVAL = 0.05  # /data polling rate while the hub is unreachable
+STALE_AFTER = 2.0  # seconds without a sample before sample() gives up
+# Signals blended between consecutive samples; the rest are taken from the newest
+INTERPOLATED = ('rpm', 'speed', 'coolant', 'throttle')
+
+class DataFeed:
+    """Latest bridge sample kept up to date on a background thread, so a
+    render loop can read it every frame without touching the network
+
+    Subscribes to the broadcast hub over a persistent WebSocket; while the hub
+    is down it polls /data over a keep-alive HTTP session and retries the hub
+    with backoff.
+    """
+
+    def __init__(self, uri=HUB_URI, data_url=DATA_URL, topic=None):
+        self.uri = uri if topic is None else f'{uri}/?topic={topic}'
+        self.data_url = data_url
+        # (previous arrival, previous sample, arrival, sample), replaced as a whole
+        # so readers never need a lock
+        self.slot = None
+        self.received = 0
+        self.source = None  # 'websocket', 'http' or None while disconnected
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='DataFeed', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(2)
+
+    def _store(self, sample):
+        now = time.monotonic()
+        slot = self.slot
+        self.slot = (slot[2], slot[3], now, sample) if slot else (now, sample, now, sample)
+        self.received += 1
+
+    def _run(self):
+        backoff = RECONNECT_INITIAL
+        session = None  # HTTP fallback only; requests isn't imported while the hub is up
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            try:
+                asyncio.run(self._subscribe())
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+                pass
+            self.source = None
+            if time.monotonic() - started > RECONNECT_MAX:
+                backoff = RECONNECT_INITIAL  # the connection had been up for a while
+            # Poll until it is time to try the hub again
+            retry_at = time.monotonic() + backoff
+            backoff = min(backoff * 2, RECONNECT_MAX)
+            while not self.stopping.is_set() and time.monotonic() < retry_at:
+                if session is None:
+                    import requests
+                    session = requests.Session()
+                self._poll(session)
+                self.stopping.wait(POLL_INTERVAL)
+        if session is not None:
+            session.close()
+
+    async def _subscribe(self):
+        async with websockets.connect(self.uri, open_timeout=HTTP_TIMEOUT, close_timeout=0.5) as websocket:
+            self.source = 'websocket'
+            while not self.stopping.is_set():
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                try:
+                    sample = json.loads(message)
+                except ValueError:
+                    continue  # one malformed message must not end the feed
+                if isinstance(sample, dict):
+                    self._store(sample)
+
+    def _poll(self, session):
+        import requests
+        try:
+            response = session.get(self.data_url, timeout=HTTP_TIMEOUT)
+            if response.status_code == 200:
+                self.source = 'http'
+                self._store(response.json())
+                return
+        except (requests.RequestException, ValueError):
+            pass
+        self.source = None
+
+    def sample(self, now=None):
+        """Newest sample with INTERPOLATED signals eased from the previous one over
+        one sample interval, or None when nothing fresh has arrived"""
+        slot = self.slot
+        if slot is None:
+            return None
+        previous_at, previous, arrived_at, latest = slot
+        now = time.monotonic() if now is None else now
+        if now - arrived_at > STALE_AFTER:
+            return None
+        interval = arrived_at - previous_at
+        if interval <= 0 or previous is latest:
+            return latest
+        fraction = min(1.0, (now - arrived_at) / interval)
+        blended = dict(latest)
+        for key in INTERPOLATED:
+            old, new = previous.get(key), latest.get(key)
+            if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+                blended[key] = old + (new - old) * fraction
+        return blended
@@ -1,29 +1,311 @@
 import json
 import csv
+import io
 import time
+import queue
+import threading
 from datetime import datetime
 import sqlite3
+from trip_segmenter import TripSegmenter
+from fuel_model import fuel_rate, interval_seconds, trapezoid
+from trip_shards import TRIP_DATA_COLUMNS, ShardMaintenance, ShardWriter, trip_data_tables
+from metrics import REGISTRY
+
+DB_PATH = 'vehicle_data.db'
+
+INSERT_TRIP_DATA = '''
+    INSERT INTO trip_data
+    (timestamp, rpm, speed, coolant_temp, throttle, gear, fuel_consumption)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Rollup tables kept alongside trip_data: name -> bucket width in seconds
+ROLLUP_RESOLUTIONS = {'1s': 1, '10s': 10, '1m': 60, '10m': 600, '1h': 3600}
+ROLLUP_SIGNALS = ('rpm', 'speed', 'coolant_temp', 'throttle')
+
+def rollup_table(resolution):
+    return f"trip_rollup_{resolution}"
+
+def _rollup_upsert_sql(resolution):
+    columns = ['bucket', 'samples']
+    updates = ['samples = samples + excluded.samples']
+    for signal in ROLLUP_SIGNALS:
+        columns += [f'{signal}_min', f'{signal}_max', f'{signal}_sum', f'{signal}_last']
+        updates += [
+            f'{signal}_min = MIN({signal}_min, excluded.{signal}_min)',
+            f'{signal}_max = MAX({signal}_max, excluded.{signal}_max)',
+            f'{signal}_sum = {signal}_sum + excluded.{signal}_sum',
+            f'{signal}_last = excluded.{signal}_last',
+        ]
+    columns.append('gear_last')
+    updates.append('gear_last = excluded.gear_last')
+    return f'''
+        INSERT INTO {rollup_table(resolution)} ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT(bucket) DO UPDATE SET {', '.join(updates)}
+    '''
+
+ROLLUP_UPSERTS = {resolution: _rollup_upsert_sql(resolution) for resolution in ROLLUP_RESOLUTIONS}
+
+def row_epochs(rows):
+    """Whole-second epoch of each trip_data row's timestamp"""
+    return [
+        int(ts.timestamp() if isinstance(ts, datetime) else datetime.fromisoformat(ts).timestamp())
+        for ts in (row[0] for row in rows)
+    ]
+
+def aggregate_rollups(rows, width, epochs):
+    """Fold trip_data rows into {bucket: [samples, min/max/sum/last per signal..., gear]}"""
+    buckets = {}
+    for row, epoch in zip(rows, epochs):
+        bucket = epoch // width * width
+        values = row[1:5]
+        agg = buckets.get(bucket)
+        if agg is None:
+            agg = [1]
+            for value in values:
+                agg += [value, value, value, value]
+            agg.append(row[5])
+            buckets[bucket] = agg
+            continue
+        agg[0] += 1
+        for i, value in enumerate(values):
+            j = 1 + i * 4
+            if value < agg[j]: agg[j] = value
+            if value > agg[j + 1]: agg[j + 1] = value
+            agg[j + 2] += value
+            agg[j + 3] = value
+        agg[-1] = row[5]
+    return buckets
+
+# Columns added to trip_summary after the original schema: name -> type
+TRIP_SUMMARY_EXTRA_COLUMNS = {
+    'kind': 'TEXT',          # 'day' (analytics rollup) or 'trip' (segmented trip)
+    'idle_time': 'REAL',     # seconds stationary with the engine running
+    'fuel_per_km': 'REAL',
+    'details': 'TEXT',       # JSON with histograms and the full summary
+}
+
+# Sample time in seconds (as trip_analytics derives it) and the stored fuel rate in L/s
+FUEL_SAMPLES_SQL = '''
+    SELECT (julianday(timestamp) - 2440587.5) * 86400.0, fuel_consumption
+    FROM {table}
+    WHERE {where}
+    ORDER BY id
+'''
+FUEL_CHUNK_ROWS = 50000
+
+class FuelTotal:
+    """Liters burned over trip_data rows, integrated over the time between
+    samples exactly as trip_analytics does. fuel_consumption is a rate (L/s),
+    so SUM() would count every 50 ms sample as a full second."""
 
-class DataLogger:
     def __init__(self):
-        self.conn = sqlite3.connect('vehicle_data.db', check_same_thread=False)
+        self.liters = 0.0
+        self.last = None  # (t, rate) of the last row folded in, carried across chunks and tables
+
+    def add_cursor(self, cursor, chunk_rows=FUEL_CHUNK_ROWS):
+        """Fold in a FUEL_SAMPLES_SQL cursor, in order"""
+        for rows in iter(lambda: cursor.fetchmany(chunk_rows), []):
+            self.add_rows(rows)
+
+    def add_rows(self, rows):
+        import numpy as np  # the ingest path never needs NumPy
+        samples = np.nan_to_num(np.array(rows, dtype=np.float64))
+        if self.last is not None:
+            samples = np.vstack((self.last, samples))
+        self.last = samples[-1]
+        self.liters += float(trapezoid(interval_seconds(samples[:, 0]), samples[:, 1]).sum())
+
+# Columns that may be selected for export, in table order
+EXPORT_COLUMNS = ('id', 'timestamp', 'rpm', 'speed', 'coolant_temp', 'throttle', 'gear', 'fuel_consumption')
+
+def iter_trip_data(conn, columns=EXPORT_COLUMNS, start=None, end=None, after_id=None,
+                   limit=None, chunk_size=2000):
+    """Yield trip_data rows in id order (unsharded table, then day shards),
+    chunk_size rows at a time, via fetchmany"""
+    conditions = []
+    params = []
+    if after_id is not None:
+        conditions.append('id > ?')
+        params.append(after_id)
+    if start is not None:
+        conditions.append('timestamp >= ?')
+        params.append(start)
+    if end is not None:
+        conditions.append('timestamp < ?')
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    tables = trip_data_tables(conn, start, end, after_id)
+    cursor = None
+    try:
+        for table in tables:
+            if not isinstance(table, str):
+                if limit is not None and limit <= 0:
+                    break
+                # Archived day: decoded straight from the columnar file
+                for rows in table.iter_rows(columns, start, end, after_id, limit, chunk_size):
+                    if limit is not None:
+                        limit -= len(rows)
+                    yield rows
+                continue
+            sql = f"SELECT {', '.join(columns)} FROM {table} {where} ORDER BY id"
+            if limit is not None:
+                if limit <= 0:
+                    break
+                cursor = conn.execute(sql + ' LIMIT ?', params + [limit])
+            else:
+                cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if limit is not None:
+                    limit -= len(rows)
+                yield rows
+            cursor.close()
+    finally:
+        if cursor is not None:
+            cursor.close()
+        tables.close()
+
+def format_ndjson(columns, chunks):
+    """One JSON object per line, one string per chunk"""
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+def format_csv(columns, chunks):
+    """CSV with a header line, one string per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+INSERT_TRIP_SUMMARY = '''
+    INSERT INTO trip_summary
+    (start_time, end_time, total_distance, avg_speed, max_speed, fuel_used, trip_duration,
+     kind, idle_time, fuel_per_km, details)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def trip_summary_row(summary, kind):
+    """Map a trip/day summary dict onto the trip_summary columns"""
+    return (
+        summary['start_time'], summary['end_time'], summary['total_distance_km'],
+        summary['avg_speed'], summary['max_speed'], summary['fuel_used_liters'],
+        int(summary['duration_seconds']), kind, summary['idle_seconds'], summary['fuel_per_km'],
+        json.dumps(summary)
+    )
+
+class ClosedTrip(dict):
+    """Queue item carrying a finished trip summary to the writer thread"""
+
+COMMIT_SECONDS = REGISTRY.histogram('logger_commit_seconds', 'trip_data insert + rollup transaction time')
+BATCH_ROWS = REGISTRY.histogram('logger_batch_rows', 'Rows per committed batch',
+                                buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000))
+ROWS_WRITTEN = REGISTRY.counter('logger_rows_written_total', 'trip_data rows committed')
+ROWS_DROPPED = REGISTRY.counter('logger_rows_dropped_total', 'Rows dropped on a full write-behind queue')
+QUEUE_DEPTH = REGISTRY.gauge('logger_queue_depth', 'Rows waiting for the writer thread')
+
+# Sentinel telling the writer thread to flush what it has and exit
+_STOP = object()
+
+class DataLogger:
+    def __init__(self, db_path=DB_PATH, write_behind=False, batch_size=500,
+                 flush_interval=1.0, max_queue=20000, block_on_full=False,
+                 synchronous='NORMAL', segment_trips=False, shard_dir=None, retention_days=None,
+                 archive_after_days=None):
+        """
+        write_behind: queue samples and insert them from a background thread
+        batch_size: rows per executemany/commit once the queue is busy
+        flush_interval: durability window - max seconds a row waits in memory
+        max_queue: bound on queued rows before dropping (or blocking)
+        block_on_full: apply backpressure to the producer instead of dropping
+        segment_trips: detect trips in the stream and write trip_summary rows
+        shard_dir: write new trip_data rows into one database file per day here
+        retention_days: expire raw rows older than this (rollups and day summaries stay)
+        archive_after_days: convert day shards older than this to compressed columnar archives
+        """
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.conn = self._connect()
+        self.shard_dir = shard_dir
+        self.shards = None
+        # Set once tables exist; with write_behind the writer thread creates them so
+        # startup doesn't wait on schema checks and migrations
+        self._schema_ready = threading.Event()
+        if not write_behind:
+            self._setup_schema()
+        self.maintenance = None
+        if shard_dir or retention_days is not None:
+            self.maintenance = ShardMaintenance(db_path, retention_days, archive_after_days=archive_after_days).start()
+
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_on_full = block_on_full
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'backpressure_waits': 0,
+            'flushes': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0,
+            'trips_written': 0,
+        }
+        self.segmenter = TripSegmenter(self._on_trip_closed) if segment_trips else None
+
+        self._queue = None
+        self._writer = None
+        if write_behind:
+            self._queue = queue.Queue(maxsize=max_queue)
+            self._writer = threading.Thread(target=self._writer_loop, name='DataLoggerWriter', daemon=True)
+            self._writer.start()
+            QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL lets readers (API, stats) run while the writer commits
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        return conn
+
+    def _setup_schema(self):
         self.create_tables()
-        
+        if self.shard_dir:
+            self.shards = ShardWriter(self.conn, self.shard_dir, self.synchronous)
+        self._schema_ready.set()
+
+    def wait_schema(self, timeout=10.0):
+        """Block until tables exist (immediately unless write_behind is still setting up)"""
+        return self._schema_ready.wait(timeout)
+
     def create_tables(self):
         cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trip_data (
-                id INTEGER PRIMARY KEY,
-                timestamp DATETIME,
-                rpm INTEGER,
-                speed INTEGER,
-                coolant_temp INTEGER,
-                throttle INTEGER,
-                gear TEXT,
-                fuel_consumption REAL
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS trip_data {TRIP_DATA_COLUMNS}')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trip_data_timestamp ON trip_data(timestamp)')
+
+        for resolution in ROLLUP_RESOLUTIONS:
+            signal_columns = ''.join(
+                f'{signal}_min REAL, {signal}_max REAL, {signal}_sum REAL, {signal}_last REAL, '
+                for signal in ROLLUP_SIGNALS
             )
-        ''')
-        
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {rollup_table(resolution)} (
+                    bucket INTEGER PRIMARY KEY,
+                    samples INTEGER,
+                    {signal_columns}gear_last TEXT
+                )
+            ''')
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS trip_summary (
                 id INTEGER PRIMARY KEY,
@@ -36,15 +318,16 @@ class DataLogger:
                 trip_duration INTEGER
             )
         ''')
+        existing = {row[1] for row in cursor.execute('PRAGMA table_info(trip_summary)')}
+        for column, column_type in TRIP_SUMMARY_EXTRA_COLUMNS.items():
+            if column not in existing:
+                cursor.execute(f'ALTER TABLE trip_summary ADD COLUMN {column} {column_type}')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trip_summary_kind_start ON trip_summary(kind, start_time)')
         self.conn.commit()
-    
-    def log_data(self, data):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO trip_data 
-            (timestamp, rpm, speed, coolant_temp, throttle, gear, fuel_consumption)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
+
+    def build_row(self, data):
+        """Turn a live sample into a trip_data row (timestamped now)"""
+        return (
             datetime.now(),
             data['rpm'],
             data['speed'],
@@ -52,27 +335,193 @@ class DataLogger:
             data['throttle'],
             data.get('gear', 'N'),
             self.calculate_fuel_consumption(data)
-        ))
-        self.conn.commit()
-    
+        )
+
+    def log_data(self, data):
+        row = self.build_row(data)
+        if self.segmenter is not None:
+            self.segmenter.add(row[0].timestamp(), row[1], row[2], row[6])
+        if not self.write_behind:
+            self._write_rows(self.conn, [row])
+            return True
+
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            if not self.block_on_full:
+                self.stats['dropped'] += 1
+                ROWS_DROPPED.inc()
+                return False
+            self.stats['backpressure_waits'] += 1
+            self._queue.put(row)
+        self.stats['enqueued'] += 1
+        return True
+
+    def _write_rows(self, conn, rows):
+        start = time.perf_counter()
+        days = self.shards.prepare(conn, rows) if self.shards is not None else None
+        with conn:
+            if days is not None:
+                self.shards.insert(conn, days)
+            else:
+                conn.executemany(INSERT_TRIP_DATA, rows)
+            self._update_rollups(conn, rows)
+        self.stats['written'] += len(rows)
+        self.stats['flushes'] += 1
+        self.stats['last_batch_size'] = len(rows)
+        elapsed = time.perf_counter() - start
+        self.stats['last_flush_ms'] = round(elapsed * 1000, 3)
+        COMMIT_SECONDS.observe(elapsed)
+        BATCH_ROWS.observe(len(rows))
+        ROWS_WRITTEN.inc(len(rows))
+
+    def _on_trip_closed(self, summary):
+        trip = ClosedTrip(summary)
+        trip['start_time'] = str(datetime.fromtimestamp(summary['start']))
+        trip['end_time'] = str(datetime.fromtimestamp(summary['end']))
+        if not self.write_behind:
+            self._write_trip(self.conn, trip)
+        else:
+            # Never dropped - a trip row is worth a short wait
+            self._queue.put(trip)
+
+    def _write_trip(self, conn, trip):
+        with conn:
+            conn.execute(INSERT_TRIP_SUMMARY, trip_summary_row(trip, 'trip'))
+        self.stats['trips_written'] += 1
+
+    def end_trip(self):
+        """Close the trip in progress now (e.g. manual trip reset)"""
+        if self.segmenter is not None:
+            return self.segmenter.close()
+        return None
+
+    def _update_rollups(self, conn, rows):
+        """Merge a batch into every rollup table (same transaction as the insert)"""
+        epochs = row_epochs(rows)
+        for resolution, width in ROLLUP_RESOLUTIONS.items():
+            buckets = aggregate_rollups(rows, width, epochs)
+            conn.executemany(
+                ROLLUP_UPSERTS[resolution],
+                [(bucket, *agg) for bucket, agg in buckets.items()]
+            )
+
+    def rebuild_rollups(self, chunk_size=5000):
+        """Backfill rollup tables from existing trip_data rows"""
+        self.wait_schema()
+        reader = self._connect()
+        columns = ('timestamp', 'rpm', 'speed', 'coolant_temp', 'throttle', 'gear')
+        with self.conn:
+            for resolution in ROLLUP_RESOLUTIONS:
+                self.conn.execute(f'DELETE FROM {rollup_table(resolution)}')
+            for rows in iter_trip_data(reader, columns, chunk_size=chunk_size):
+                self._update_rollups(self.conn, rows)
+        reader.close()
+
+    def _writer_loop(self):
+        """Drain the queue and commit in batches on a size or time trigger"""
+        try:
+            self._setup_schema()
+        except sqlite3.Error as e:
+            print(f"DataLogger schema error: {e}")
+            self._schema_ready.set()  # don't leave readers waiting; their queries will report it
+        conn = self._connect()
+        batch = []
+        waiters = []
+        deadline = None
+        running = True
+
+        while running:
+            timeout = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                running = False
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif isinstance(item, ClosedTrip):
+                # Rows up to the end of the trip go in first
+                try:
+                    if batch:
+                        self._write_rows(conn, batch)
+                    self._write_trip(conn, item)
+                except sqlite3.Error as e:
+                    print(f"DataLogger write error: {e}")
+                batch = []
+                deadline = None
+            elif item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if batch and (len(batch) >= self.batch_size or due or waiters or not running):
+                try:
+                    self._write_rows(conn, batch)
+                except sqlite3.Error as e:
+                    print(f"DataLogger write error: {e}")
+                batch = []
+                deadline = None
+
+            for event in waiters:
+                event.set()
+            waiters = []
+
+        conn.close()
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been committed"""
+        if not self.write_behind:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self.end_trip()
+        if self.maintenance is not None:
+            self.maintenance.stop()
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+        self.conn.close()
+
+    def get_queue_stats(self):
+        stats = dict(self.stats)
+        stats['write_behind'] = self.write_behind
+        stats['queue_depth'] = self._queue.qsize() if self._queue else 0
+        stats['queue_capacity'] = self._queue.maxsize if self._queue else 0
+        return stats
+
     def calculate_fuel_consumption(self, data):
-        # Simple fuel calculation based on RPM and throttle
-        base_consumption = 0.0002  # liters per second at idle
-        rpm_factor = data['rpm'] / 1000 * 0.001
-        throttle_factor = data['throttle'] / 100 * 0.002
-        return base_consumption + rpm_factor + throttle_factor
-    
+        # Stored as liters per second, what the trip integrations expect
+        return fuel_rate(data['rpm'], data['throttle']) / 3600
+
     def get_trip_statistics(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as data_points,
-                AVG(speed) as avg_speed,
-                MAX(speed) as max_speed,
-                SUM(fuel_consumption) as total_fuel,
-                MIN(timestamp) as start_time,
-                MAX(timestamp) as end_time
-            FROM trip_data 
-            WHERE date(timestamp) = date('now')
-        ''')
-        return cursor.fetchone()
\ No newline at end of file
+        """(data_points, avg_speed, max_speed, total_fuel, start_time, end_time) for today"""
+        self.wait_schema()
+        day_start = datetime.combine(datetime.now().date(), datetime.min.time())
+        points, speed_sum, max_speed, start_time, end_time = 0, 0, None, None, None
+        fuel = FuelTotal()
+        for table in trip_data_tables(self.conn, day_start):
+            row = self.conn.execute(f'''
+                SELECT COUNT(*), SUM(speed), MAX(speed), MIN(timestamp), MAX(timestamp)
+                FROM {table}
+                WHERE timestamp >= ?
+            ''', (day_start,)).fetchone()
+            if not row[0]:
+                continue
+            points += row[0]
+            speed_sum += row[1] or 0
+            max_speed = row[2] if max_speed is None else max(max_speed, row[2])
+            start_time = start_time or row[3]
+            end_time = row[4]
+            cursor = self.conn.execute(FUEL_SAMPLES_SQL.format(table=table, where='timestamp >= ?'), (day_start,))
+            fuel.add_cursor(cursor)
+            cursor.close()
+        return (points, speed_sum / points if points else None, max_speed,
+                fuel.liters if points else None, start_time, end_time)
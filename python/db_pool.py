@@ -0,0 +1,99 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from metrics import REGISTRY
+
+# Readers allowed to run queries at once; further requests wait for a free connection
+POOL_SIZE = 8
+# Per-connection LRU of compiled statements, keyed by SQL text
+CACHED_STATEMENTS = 256
+ACQUIRE_TIMEOUT = 10.0
+
+POOL_WAIT_SECONDS = REGISTRY.histogram('db_pool_wait_seconds', 'Time spent waiting for a pooled SQLite connection')
+POOL_CONNECTS = REGISTRY.counter('db_pool_connects_total', 'SQLite connections opened by the read pool')
+
+class ReadPool:
+    """Bounded pool of read-only SQLite connections shared by request threads
+
+    Connections open with mode=ro and query_only, so they can never take the
+    writer's lock; the logger keeps the database in WAL mode, which lets them
+    read while it commits. size=0 disables pooling (connect per request).
+    """
+
+    def __init__(self, db_path, size=POOL_SIZE, cached_statements=CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.size = size
+        self.cached_statements = cached_statements
+        # LIFO so the most recently used (warmest cache) connection goes out first
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(f'file:{quote(self.db_path)}?mode=ro', uri=True,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.execute('PRAGMA query_only=ON')
+        POOL_CONNECTS.inc()
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            grow = self._opened < self.size
+            if grow:
+                self._opened += 1
+        if grow:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        with POOL_WAIT_SECONDS.time():
+            try:
+                return self._idle.get(timeout=ACQUIRE_TIMEOUT)
+            except queue.Empty:
+                raise RuntimeError(f'no SQLite connection free after {ACQUIRE_TIMEOUT}s') from None
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the with block"""
+        if self.size <= 0:
+            conn = self._connect()
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+        conn = self._acquire()
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            # Don't hand a possibly broken connection to the next request
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -1,56 +1,191 @@
-class VehicleDiagnostics:
+import collections
+import json
+import operator
+import os
+import string
+import time
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diagnostic_rules.json')
+HISTORY_SIZE = 1000  # raise/clear events kept per VehicleDiagnostics
+RATE_SUFFIX = '_rate'  # "rpm_rate" = d(rpm)/dt in units per second
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+def load_rules(path=RULES_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+class Rule:
+    """One compiled rule: AND of (signal, op, value) conditions plus timing"""
+    __slots__ = ('name', 'type', 'message', 'color', 'when', 'clear_when',
+                 'for_seconds', 'clear_after_seconds', 'fields')
+
+    def __init__(self, config):
+        self.name = config['name']
+        self.type = config.get('type', 'WARNING')
+        self.message = config.get('message', self.name)
+        self.color = config.get('color', '#ffaa00')
+        self.when = self._compile(config['when'])
+        # Hysteresis: without clear_when the alert clears as soon as `when` stops holding
+        self.clear_when = self._compile(config['clear_when']) if 'clear_when' in config else None
+        self.for_seconds = config.get('for_seconds', 0)
+        self.clear_after_seconds = config.get('clear_after_seconds', 0)
+        self.fields = [f for _, f, _, _ in string.Formatter().parse(self.message) if f]
+
+    @staticmethod
+    def _compile(conditions):
+        """Build one predicate function for an AND of conditions
+
+        Generated source avoids a Python-level loop and operator call per
+        condition; signal names and thresholds are passed as default
+        arguments rather than spliced into the source.
+        """
+        terms = []
+        constants = {}
+        for i, (signal, op, value) in enumerate(conditions):
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op!r}")
+            constants[f's{i}'] = signal
+            constants[f'c{i}'] = value
+            terms.append(f'(v[s{i}] is not None and v[s{i}] {op} c{i})')
+        args = ''.join(f', {name}={name}' for name in constants)
+        predicate = eval(f"lambda v{args}: {' and '.join(terms) or 'True'}", {}, constants)
+        predicate.signals = {signal for signal, _, _ in conditions}
+        return predicate
+
+    def signals(self):
+        signals = self.when.signals | (self.clear_when.signals if self.clear_when else set())
+        return signals | set(self.fields)
+
+class RuleState:
+    __slots__ = ('active', 'pending_since', 'clear_since', 'alert')
+
     def __init__(self):
+        self.active = False
+        self.pending_since = None
+        self.clear_since = None
+        self.alert = None
+
+class RuleEngine:
+    """Evaluates every rule per sample, per vehicle, emitting raise/clear edges only"""
+
+    def __init__(self, rules):
+        self.rules = [Rule(config) for config in rules]
+        signals = set().union(*(rule.signals() for rule in self.rules)) if self.rules else set()
+        self.rate_signals = tuple(
+            (s, s[:-len(RATE_SUFFIX)]) for s in signals if s.endswith(RATE_SUFFIX)
+        )
+        # Raw signals copied out of each sample once, so rules do plain dict lookups
+        self.signals = tuple(
+            {s for s in signals if not s.endswith(RATE_SUFFIX)} | {signal for _, signal in self.rate_signals}
+        )
+        self.vehicles = {}
+
+    def _vehicle(self, vehicle_id):
+        vehicle = self.vehicles.get(vehicle_id)
+        if vehicle is None:
+            vehicle = self.vehicles[vehicle_id] = {
+                'states': [RuleState() for _ in self.rules],
+                'previous': None,
+                'active': [],
+            }
+        return vehicle
+
+    def evaluate(self, sample, ts=None, vehicle_id='default'):
+        """Returns (active alerts, events raised/cleared by this sample)"""
+        ts = time.time() if ts is None else ts
+        vehicle = self._vehicle(vehicle_id)
+
+        values = {signal: sample.get(signal) for signal in self.signals}
+        if self.rate_signals:
+            previous = vehicle['previous']
+            for rate_signal, signal in self.rate_signals:
+                current = values[signal]
+                rate = None
+                if previous is not None and current is not None and ts > previous[0]:
+                    before = previous[1][signal]
+                    if before is not None:
+                        rate = (current - before) / (ts - previous[0])
+                values[rate_signal] = rate
+            vehicle['previous'] = (ts, values)
+
+        events = []
+        for rule, state in zip(self.rules, vehicle['states']):
+            if not state.active:
+                if rule.when(values):
+                    if state.pending_since is None:
+                        state.pending_since = ts
+                    if ts - state.pending_since >= rule.for_seconds:
+                        state.active = True
+                        state.pending_since = None
+                        state.clear_since = None
+                        state.alert = {
+                            'name': rule.name,
+                            'type': rule.type,
+                            'message': rule.message.format_map(_FormatValues(values, rule.fields)),
+                            'color': rule.color,
+                            'since': ts,
+                        }
+                        events.append({'event': 'raise', 'vehicle_id': vehicle_id, 'ts': ts, **state.alert})
+                else:
+                    state.pending_since = None
+            else:
+                if rule.clear_when is not None:
+                    clearing = rule.clear_when(values)
+                else:
+                    clearing = not rule.when(values)
+                if clearing:
+                    if state.clear_since is None:
+                        state.clear_since = ts
+                    if ts - state.clear_since >= rule.clear_after_seconds:
+                        events.append({'event': 'clear', 'vehicle_id': vehicle_id, 'ts': ts, **state.alert})
+                        state.active = False
+                        state.clear_since = None
+                        state.alert = None
+                else:
+                    state.clear_since = None
+
+        if events:
+            vehicle['active'] = [state.alert for state in vehicle['states'] if state.active]
+        return vehicle['active'], events
+
+class _FormatValues(dict):
+    def __init__(self, values, fields):
+        super().__init__((field, values.get(field)) for field in fields)
+
+    def __missing__(self, key):
+        return ''
+
+class VehicleDiagnostics:
+    def __init__(self, rules=None, history_size=HISTORY_SIZE):
+        self.engine = RuleEngine(load_rules() if rules is None else rules)
         self.alerts = []
-        self.alert_history = []
-        
-    def check_alerts(self, data):
-        current_alerts = []
-        
-        # Overheating alert
-        if data['coolant'] > 105:
-            current_alerts.append({
-                'type': 'CRITICAL',
-                'message': f'ENGINE OVERHEATING: {data["coolant"]}°C',
-                'color': '#ff0000'
-            })
-        
-        # High RPM warning
-        if data['rpm'] > 6500:
-            current_alerts.append({
-                'type': 'WARNING', 
-                'message': f'HIGH RPM: {data["rpm"]}',
-                'color': '#ffaa00'
-            })
-        
-        # Low coolant temp (cold engine)
-        if data['coolant'] < 70 and data['rpm'] > 1500:
-            current_alerts.append({
-                'type': 'INFO',
-                'message': 'Engine cold - avoid high RPM',
-                'color': '#00aaff'
-            })
-            
-        # Gear mismatch detection
-        if data.get('gear') != 'N' and data['speed'] == 0 and data['rpm'] > 1200:
-            current_alerts.append({
-                'type': 'WARNING',
-                'message': 'Vehicle stationary with high RPM',
-                'color': '#ffaa00'
-            })
-        
-        self.alerts = current_alerts
-        if current_alerts:
-            self.alert_history.extend(current_alerts)
-            
+        # Edge-triggered raise/clear events, oldest evicted first
+        self.alert_history = collections.deque(maxlen=history_size)
+
+    def check_alerts(self, data, ts=None, vehicle_id='default'):
+        current_alerts, events = self.engine.evaluate(data, ts, vehicle_id)
+        if vehicle_id == 'default':
+            self.alerts = current_alerts
+        if events:
+            self.alert_history.extend(events)
+
         return current_alerts
-    
+
     def get_health_score(self, data):
         score = 100
-        
+
         # Deduct points for issues
         if data['coolant'] > 100: score -= 30
         if data['coolant'] > 90: score -= 10
         if data['rpm'] > 6000: score -= 15
         if data.get('gear') == 'N' and data['speed'] > 5: score -= 20
-        
-        return max(0, score)
\ No newline at end of file
+
+        return max(0, score)
@@ -1,139 +1,180 @@
+import argparse
+import json
+import os
 import pygame
 import math
 import sys
-import requests
-import json
+import time
 from pygame.locals import *
+from data_feed import DataFeed
+from fuel_model import fuel_efficiency, fuel_rate
+from gear_model import GearTracker, load_calibration
+from readiness import notify_ready
+
+# Rendered text surfaces kept; values repeat (gears, statuses, rpm steps) so most lookups hit
+TEXT_CACHE_SIZE = 512
+BACKGROUND_COLOR = (0, 0, 0)
 
 class EngineSimulator:
-    def __init__(self):
-        pygame.init()
+    def __init__(self, full_redraw=False, feed=None):
+        # Only the modules we use; pygame.init() also brings up audio and joysticks
+        pygame.display.init()
+        pygame.font.init()
         self.width, self.height = 900, 600  # Increased width for gear display
         self.screen = pygame.display.set_mode((self.width, self.height))
         pygame.display.set_caption("Vehicle Ease Pro - Engine Simulator")
         self.clock = pygame.time.Clock()
         self.font = pygame.font.Font(None, 36)
         self.small_font = pygame.font.Font(None, 24)
-        
+
         # Engine state
         self.rpm = 0
         self.coolant_temp = 0
         self.throttle = 0
         self.speed = 0
         self.gear = "N"  # N, 1, 2, 3, 4, 5, 6, R
-        
+
         # Piston positions (V6 engine)
         self.pistons = [0, 120, 240, 60, 180, 300]  # degrees offset
-        
-        # Gear ratios (typical manual transmission)
-        self.gear_ratios = {
-            "R": -3.5, "1": 3.8, "2": 2.2, "3": 1.5, 
-            "4": 1.1, "5": 0.8, "6": 0.6
-        }
+        self.crank_angle = 0.0
+        self.last_ticks = None
 
-  def draw_fuel_display(self):
-    """Draw fuel efficiency information"""
-    # Fuel display background
-    pygame.draw.rect(self.screen, (20, 20, 20), (650, 270, 200, 120), border_radius=15)
-    pygame.draw.rect(self.screen, (0, 100, 0), (650, 270, 200, 120), 3, border_radius=15)
-    
-    # Fuel efficiency
-    efficiency = max(0, self.speed / max(1, self.rpm/500))  # Simplified calculation
-    efficiency_text = self.font.render(f"{efficiency:.1f} km/L", True, (0, 255, 0))
-    efficiency_rect = efficiency_text.get_rect(center=(750, 300))
-    self.screen.blit(efficiency_text, efficiency_rect)
-    
-    # Fuel rate
-    fuel_rate = 0.8 + (self.rpm / 1000 * 0.5) + (self.throttle / 100 * 1.2)
-    rate_text = self.small_font.render(f"Fuel: {fuel_rate:.1f} L/h", True, (100, 255, 100))
-    rate_rect = rate_text.get_rect(center=(750, 330))
-    self.screen.blit(rate_text, rate_rect)
-    
-    # Efficiency status
-    if efficiency > 15:
-        status = "EXCELLENT"
-        color = (0, 255, 0)
-    elif efficiency > 10:
-        status = "GOOD"
-        color = (255, 200, 0)
-    elif efficiency > 5:
-        status = "POOR"
-        color = (255, 100, 0)
-    else:
-        status = "VERY POOR"
-        color = (255, 0, 0)
-    
-    status_text = self.small_font.render(status, True, color)
-    status_rect = status_text.get_rect(center=(750, 360))
-    self.screen.blit(status_text, status_rect) 
-
-    self.draw_fuel_display()  # Add this line     
-        
-    def calculate_gear(self):
-        """Calculate current gear based on RPM and speed"""
-        if self.speed == 0 or self.rpm < 500:
-            return "N"
-        
-        # Simple gear calculation based on RPM/speed ratio
-        ratio = self.rpm / max(1, self.speed)
-        
-        # Find closest matching gear
-        closest_gear = "N"
-        min_diff = float('inf')
-        
-        for gear, gear_ratio in self.gear_ratios.items():
-            if gear == "R":  # Skip reverse for forward motion
-                continue
-            diff = abs(ratio - gear_ratio * 100)  # Scale factor
-            if diff < min_diff:
-                min_diff = diff
-                closest_gear = gear
-        
-        return closest_gear
+        # Only used when simulating; live samples carry the bridge's gear
+        self.gear_tracker = GearTracker(load_calibration().get('default'))
+
+        # Rendering state: only what changed since the last frame is redrawn and pushed
+        # to the display. full_redraw restores the old clear/redraw/flip-everything loop
+        self.full_redraw = full_redraw
+        self.background = self.build_static_layer()
+        self.text_cache = {}
+        self.slots = {}  # text slot -> ((text, color), rect on screen)
+        self.sprites = []  # rects of last frame's pistons and flames
+        self.shown_gear = None
+        self.dirty = []
+        self.needs_full = True
+
+        # Bridge samples arrive on their own thread; started by run() unless the caller already did
+        self.feed = feed or DataFeed()
+
+    def build_static_layer(self):
+        """Everything that never changes, drawn once and used to erase moving parts"""
+        layer = pygame.Surface((self.width, self.height)).convert()
+        layer.fill(BACKGROUND_COLOR)
 
-    def fetch_data(self):
-        """Get data from WebSocket server"""
-        try:
-            response = requests.get('http://localhost:8766/data')
-            if response.status_code == 200:
-                data = response.json()
-                self.rpm = data.get('rpm', 0)
-                self.coolant_temp = data.get('coolant', 0)
-                self.throttle = data.get('throttle', 0)
-                self.speed = data.get('speed', 0)
-                self.gear = self.calculate_gear()
-        except:
-            # Fallback to simulated data with gear calculation
-            self.rpm = min(8000, self.rpm + 100 if self.throttle > 50 else max(800, self.rpm - 100))
-            self.coolant_temp = 80 + (self.rpm / 8000 * 40)
-            self.throttle = (self.throttle + 10) % 100
-            self.speed = int(self.rpm * 0.02)
-            self.gear = self.calculate_gear()
-
-    def draw_engine_block(self):
-        """Draw the engine block"""
         # Engine block
-        pygame.draw.rect(self.screen, (100, 100, 100), (200, 150, 400, 200), border_radius=10)
-        
+        pygame.draw.rect(layer, (100, 100, 100), (200, 150, 400, 200), border_radius=10)
         # Cylinder banks (V6)
         for i in range(3):
             # Left bank
-            pygame.draw.rect(self.screen, (80, 80, 80), (250, 160 + i*60, 30, 40))
-            # Right bank  
-            pygame.draw.rect(self.screen, (80, 80, 80), (520, 160 + i*60, 30, 40))
+            pygame.draw.rect(layer, (80, 80, 80), (250, 160 + i*60, 30, 40))
+            # Right bank
+            pygame.draw.rect(layer, (80, 80, 80), (520, 160 + i*60, 30, 40))
+
+        # Speed and fuel panel backgrounds
+        for y, height in ((100, 150), (270, 120)):
+            pygame.draw.rect(layer, (20, 20, 20), (650, y, 200, height), border_radius=15)
+            pygame.draw.rect(layer, (0, 100, 0), (650, y, 200, height), 3, border_radius=15)
+
+        # Speed unit
+        unit_text = self.small_font.render("km/h", True, (100, 255, 100))
+        layer.blit(unit_text, unit_text.get_rect(center=(750, 180)))
+        return layer
+
+    def render_text(self, font, text, color):
+        """font.render, memoized by value"""
+        if self.full_redraw:
+            return font.render(text, True, color)
+        key = (font, text, color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            if len(self.text_cache) >= TEXT_CACHE_SIZE:
+                self.text_cache.clear()
+            surface = self.text_cache[key] = font.render(text, True, color)
+        return surface
+
+    def draw_text(self, slot, font, text, color, **position):
+        """Blit text into a named slot, skipped entirely when the value is unchanged"""
+        previous = self.slots.get(slot)
+        if previous is not None and previous[0] == (text, color):
+            return
+        surface = self.render_text(font, text, color)
+        rect = surface.get_rect(**position)
+        if previous is not None:
+            self.erase(previous[1])
+            self.dirty.append(previous[1])
+        self.screen.blit(surface, rect)
+        self.slots[slot] = ((text, color), rect)
+        self.dirty.append(rect)
+
+    def erase(self, rect):
+        self.screen.blit(self.background, rect, rect)
+
+    def draw_fuel_display(self):
+        """Draw fuel efficiency information"""
+        # Same model the bridge uses for /data
+        rate = fuel_rate(self.rpm, self.throttle)
+        efficiency = fuel_efficiency(self.speed, rate)
+        self.draw_text('efficiency', self.font, f"{efficiency:.1f} km/L", (0, 255, 0), center=(750, 300))
+
+        # Fuel rate
+        self.draw_text('fuel_rate', self.small_font, f"Fuel: {rate:.1f} L/h", (100, 255, 100), center=(750, 330))
+
+        # Efficiency status
+        if efficiency > 15:
+            status = "EXCELLENT"
+            color = (0, 255, 0)
+        elif efficiency > 10:
+            status = "GOOD"
+            color = (255, 200, 0)
+        elif efficiency > 5:
+            status = "POOR"
+            color = (255, 100, 0)
+        else:
+            status = "VERY POOR"
+            color = (255, 0, 0)
+
+        self.draw_text('efficiency_status', self.small_font, status, color, center=(750, 360))
+
+    def calculate_gear(self):
+        """Calculate current gear based on RPM and speed"""
+        return self.gear_tracker.update(self.rpm, self.speed)
+
+    def fetch_data(self):
+        """Latest (interpolated) sample from the background feed - never waits on the network"""
+        data = self.feed.sample()
+        if data is None:
+            self.simulate()
+            return
+        self.rpm = round(data.get('rpm') or 0)
+        self.coolant_temp = data.get('coolant') or 0
+        self.throttle = round(data.get('throttle') or 0)
+        self.speed = round(data.get('speed') or 0)
+        self.gear = data.get('gear') or self.calculate_gear()
+
+    def simulate(self):
+        """Fallback to simulated data with gear calculation"""
+        self.rpm = min(8000, self.rpm + 100 if self.throttle > 50 else max(800, self.rpm - 100))
+        self.coolant_temp = 80 + (self.rpm / 8000 * 40)
+        self.throttle = (self.throttle + 10) % 100
+        self.speed = int(self.rpm * 0.02)
+        self.gear = self.calculate_gear()
 
     def draw_pistons(self):
         """Draw moving pistons based on RPM"""
         if self.rpm == 0:
             return
-            
-        time_ms = pygame.time.get_ticks()
-        cycle_time = 60000 / max(1, self.rpm)  # ms per revolution
-        
+
+        # Advance the crank by this frame's share of a revolution; deriving the angle
+        # from absolute time would jump the pistons whenever rpm changes
+        time_ms = time.perf_counter() * 1000  # pygame's ticks stay 0 without pygame.init()
+        elapsed = time_ms - self.last_ticks if self.last_ticks is not None else 0
+        self.last_ticks = time_ms
+        self.crank_angle = (self.crank_angle + elapsed * self.rpm / 60000 * 360) % 360
+
         for i, offset in enumerate(self.pistons):
-            angle = ((time_ms / cycle_time * 360) + offset) % 360
+            angle = (self.crank_angle + offset) % 360
             piston_y = 200 + math.sin(math.radians(angle)) * 30
-            
+
             # Determine bank position
             if i < 3:  # Left bank
                 x_pos = 265
@@ -141,117 +182,168 @@ class EngineSimulator:
             else:  # Right bank
                 x_pos = 535
                 y_pos = 180 + (i-3)*60
-            
+
             # Piston
-            pygame.draw.rect(self.screen, (200, 200, 100), (x_pos-10, piston_y, 20, 15))
+            self.sprites.append(pygame.draw.rect(self.screen, (200, 200, 100), (x_pos-10, piston_y, 20, 15)))
             # Connecting rod
-            pygame.draw.line(self.screen, (150, 150, 150), (x_pos, y_pos), (x_pos, piston_y), 3)
+            self.sprites.append(pygame.draw.line(self.screen, (150, 150, 150), (x_pos, y_pos), (x_pos, piston_y), 3))
 
     def draw_exhaust(self):
         """Draw exhaust flames based on RPM and throttle"""
         if self.rpm > 3000 and self.throttle > 70:
             flame_intensity = min(1.0, (self.rpm - 3000) / 5000)
-            
-            # Left exhaust
-            for i in range(3):
-                flame_height = 20 + flame_intensity * 30
-                flame_width = 10 + flame_intensity * 10
-                points = [
-                    (240, 350 + i*20),
-                    (240 - flame_width, 350 + i*20 + flame_height),
-                    (240 + flame_width, 350 + i*20 + flame_height)
-                ]
-                color = (255, 100, 0) if flame_intensity > 0.7 else (255, 200, 0)
-                pygame.draw.polygon(self.screen, color, points)
-            
-            # Right exhaust
-            for i in range(3):
-                flame_height = 20 + flame_intensity * 30
-                flame_width = 10 + flame_intensity * 10
-                points = [
-                    (560, 350 + i*20),
-                    (560 - flame_width, 350 + i*20 + flame_height),
-                    (560 + flame_width, 350 + i*20 + flame_height)
-                ]
-                color = (255, 100, 0) if flame_intensity > 0.7 else (255, 200, 0)
-                pygame.draw.polygon(self.screen, color, points)
+            color = (255, 100, 0) if flame_intensity > 0.7 else (255, 200, 0)
+            flame_height = 20 + flame_intensity * 30
+            flame_width = 10 + flame_intensity * 10
+
+            # Left and right exhaust
+            for x in (240, 560):
+                for i in range(3):
+                    points = [
+                        (x, 350 + i*20),
+                        (x - flame_width, 350 + i*20 + flame_height),
+                        (x + flame_width, 350 + i*20 + flame_height)
+                    ]
+                    self.sprites.append(pygame.draw.polygon(self.screen, color, points))
 
     def draw_digital_speedometer(self):
         """Draw digital speedometer with gear indicator"""
-        # Speed display background
-        pygame.draw.rect(self.screen, (20, 20, 20), (650, 100, 200, 150), border_radius=15)
-        pygame.draw.rect(self.screen, (0, 100, 0), (650, 100, 200, 150), 3, border_radius=15)
-        
         # Speed value
-        speed_text = self.font.render(f"{self.speed}", True, (0, 255, 0))
-        speed_rect = speed_text.get_rect(center=(750, 150))
-        self.screen.blit(speed_text, speed_rect)
-        
-        # Speed unit
-        unit_text = self.small_font.render("km/h", True, (100, 255, 100))
-        unit_rect = unit_text.get_rect(center=(750, 180))
-        self.screen.blit(unit_text, unit_rect)
-        
-        # Gear indicator
+        self.draw_text('speed', self.font, f"{self.speed}", (0, 255, 0), center=(750, 150))
+
+        # Gear indicator; the label overlaps the box, so both are redrawn together
+        if self.gear == self.shown_gear:
+            return
+        self.shown_gear = self.gear
         gear_bg_color = (0, 100, 0) if self.gear != "N" else (100, 100, 0)
-        pygame.draw.rect(self.screen, gear_bg_color, (700, 200, 100, 40), border_radius=10)
-        
-        gear_text = self.font.render(self.gear, True, (255, 255, 255))
-        gear_rect = gear_text.get_rect(center=(750, 220))
-        self.screen.blit(gear_text, gear_rect)
-        
+        box = pygame.draw.rect(self.screen, gear_bg_color, (700, 200, 100, 40), border_radius=10)
+
+        gear_text = self.render_text(self.font, self.gear, (255, 255, 255))
+        self.screen.blit(gear_text, gear_text.get_rect(center=(750, 220)))
+
         # Gear label
-        gear_label = self.small_font.render("GEAR", True, (150, 150, 150))
+        gear_label = self.render_text(self.small_font, "GEAR", (150, 150, 150))
         gear_label_rect = gear_label.get_rect(center=(750, 240))
         self.screen.blit(gear_label, gear_label_rect)
+        self.dirty.append(box.union(gear_label_rect))
 
     def draw_gauges(self):
         """Draw digital gauges"""
         # RPM
-        rpm_text = self.font.render(f"RPM: {self.rpm}", True, (0, 255, 0))
-        self.screen.blit(rpm_text, (50, 450))
-        
+        self.draw_text('rpm', self.font, f"RPM: {self.rpm}", (0, 255, 0), topleft=(50, 450))
+
         # Coolant
-        coolant_text = self.font.render(f"Coolant: {self.coolant_temp}°C", True, (0, 255, 0))
-        self.screen.blit(coolant_text, (50, 490))
-        
+        self.draw_text('coolant', self.font, f"Coolant: {self.coolant_temp:.0f}°C", (0, 255, 0), topleft=(50, 490))
+
         # Throttle
-        throttle_text = self.font.render(f"Throttle: {self.throttle}%", True, (0, 255, 0))
-        self.screen.blit(throttle_text, (50, 530))
-        
+        self.draw_text('throttle', self.font, f"Throttle: {self.throttle}%", (0, 255, 0), topleft=(50, 530))
+
         # Speed (smaller - main display is in speedometer)
-        speed_text = self.small_font.render(f"Speed: {self.speed} km/h", True, (100, 255, 100))
-        self.screen.blit(speed_text, (400, 530))
+        self.draw_text('speed_small', self.small_font, f"Speed: {self.speed} km/h", (100, 255, 100), topleft=(400, 530))
+
+    def render(self):
+        """Draw one frame and push only the changed areas to the display"""
+        self.dirty = []
+        full = self.full_redraw or self.needs_full
+        if full:
+            self.screen.blit(self.background, (0, 0))
+            self.slots.clear()
+            self.sprites = []
+            self.shown_gear = None
+            self.needs_full = False
+
+        # Moving parts: erase last frame's, then draw this frame's
+        for rect in self.sprites:
+            self.erase(rect)
+        self.dirty += self.sprites
+        self.sprites = []
+        self.draw_pistons()
+        self.draw_exhaust()
+        self.dirty += self.sprites
+
+        self.draw_digital_speedometer()
+        self.draw_fuel_display()
+        self.draw_gauges()
+
+        if full:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty)
+
+    def handle_events(self):
+        """False once the window is closed or Esc pressed"""
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                return False
+            elif event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                # Window contents lost (uncovered, restored): repaint everything once
+                self.needs_full = True
+            elif event.type == KEYDOWN:
+                if event.key == K_UP:
+                    self.throttle = min(100, self.throttle + 10)
+                elif event.key == K_DOWN:
+                    self.throttle = max(0, self.throttle - 10)
+                elif event.key == K_ESCAPE:
+                    return False
+        return True
 
     def run(self):
-        running = True
-        while running:
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    running = False
-                elif event.type == KEYDOWN:
-                    if event.key == K_UP:
-                        self.throttle = min(100, self.throttle + 10)
-                    elif event.key == K_DOWN:
-                        self.throttle = max(0, self.throttle - 10)
-                    elif event.key == K_ESCAPE:
-                        running = False
-            
+        if self.feed.thread is None:
+            self.feed.start()
+        ready = False
+        while self.handle_events():
             self.fetch_data()
-            self.screen.fill((0, 0, 0))
-            
-            self.draw_engine_block()
-            self.draw_pistons()
-            self.draw_exhaust()
-            self.draw_digital_speedometer()
-            self.draw_gauges()
-            
-            pygame.display.flip()
+            self.render()
+            if not ready:
+                notify_ready('engine_sim')  # first frame is on screen
+                ready = True
             self.clock.tick(60)
-        
+
+        self.feed.stop()
         pygame.quit()
         sys.exit()
 
+    def bench(self, seconds, fps=60):
+        """Render simulated data for `seconds` and return frame time / CPU stats"""
+        frame_times = []
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            self.handle_events()
+            self.simulate()
+            frame_started = time.perf_counter()
+            self.render()
+            frame_times.append(time.perf_counter() - frame_started)
+            if fps:
+                self.clock.tick(fps)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        frame_times.sort()
+        pygame.quit()
+        return {
+            'mode': 'full_redraw' if self.full_redraw else 'dirty_rects',
+            'frames': len(frame_times),
+            'fps': round(len(frame_times) / elapsed, 1),
+            'frame_ms_mean': round(sum(frame_times) / len(frame_times) * 1000, 3),
+            'frame_ms_p50': round(frame_times[len(frame_times) // 2] * 1000, 3),
+            'frame_ms_p99': round(frame_times[int(len(frame_times) * 0.99)] * 1000, 3),
+            'cpu_percent': round(cpu / elapsed * 100, 1),
+        }
+
 if __name__ == "__main__":
-    simulator = EngineSimulator()
-    simulator.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Vehicle Ease Pro engine simulator")
+    parser.add_argument('--bench', type=float, metavar='SECONDS',
+                        help='render simulated data headless (SDL dummy driver) and print frame times')
+    parser.add_argument('--fps', type=int, default=60, help='frame cap for --bench (0 = uncapped)')
+    parser.add_argument('--full-redraw', action='store_true', help='clear and redraw the whole screen every frame')
+    args = parser.parse_args()
+
+    if args.bench:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        print(json.dumps(EngineSimulator(args.full_redraw).bench(args.bench, args.fps), indent=2))
+    else:
+        # Connect to the hub while SDL sets up the window
+        feed = DataFeed().start()
+        simulator = EngineSimulator(args.full_redraw, feed)
+        simulator.run()
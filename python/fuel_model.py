@@ -0,0 +1,64 @@
+# Fuel flow model (liters/hour): idle flow plus terms that scale with RPM and throttle
+IDLE_L_PER_HOUR = 0.8
+L_PER_HOUR_PER_1000_RPM = 0.5
+FULL_THROTTLE_L_PER_HOUR = 1.2
+# Intervals longer than this (logger stopped, car parked, dropped link) are not integrated
+MAX_GAP_SECONDS = 5.0
+
+def fuel_rate(rpm, throttle):
+    """Fuel flow in liters/hour; works on scalars and NumPy arrays alike"""
+    return IDLE_L_PER_HOUR + rpm / 1000 * L_PER_HOUR_PER_1000_RPM + throttle / 100 * FULL_THROTTLE_L_PER_HOUR
+
+def fuel_efficiency(speed, rate):
+    """Instant km per liter at speed (km/h) and fuel rate (L/h)"""
+    return speed / rate if speed > 0 and rate > 0 else 0.0
+
+class TripIntegrator:
+    """Running trip distance and fuel for a live stream, integrated over the
+    real time between samples (trapezoidal), whatever the sample rate"""
+    __slots__ = ('max_gap', 'distance_km', 'fuel_l', 'last_ts', 'last_speed', 'last_rate')
+
+    def __init__(self, max_gap=MAX_GAP_SECONDS):
+        self.max_gap = max_gap
+        self.reset()
+
+    def reset(self):
+        self.distance_km = 0.0
+        self.fuel_l = 0.0
+        self.last_ts = None
+        self.last_speed = 0.0
+        self.last_rate = 0.0
+
+    def add(self, ts, speed, rate):
+        """ts in epoch seconds, speed in km/h, rate in L/h"""
+        if self.last_ts is not None:
+            dt = ts - self.last_ts
+            if 0 < dt <= self.max_gap:
+                self.distance_km += dt * (speed + self.last_speed) / 7200
+                self.fuel_l += dt * (rate + self.last_rate) / 7200
+        self.last_ts = ts
+        self.last_speed = speed
+        self.last_rate = rate
+
+def interval_seconds(t, max_gap=MAX_GAP_SECONDS):
+    """np.diff(t) with negative and over-long intervals zeroed, so they add nothing"""
+    import numpy as np  # the live paths above don't need NumPy
+    dt = np.diff(t)
+    dt[(dt < 0) | (dt > max_gap)] = 0.0
+    return dt
+
+def trapezoid(dt, values):
+    """Per-interval integral of values over dt (from interval_seconds)"""
+    return dt * (values[1:] + values[:-1]) / 2
+
+def integrate_trip(t, rpm, speed, throttle, max_gap=MAX_GAP_SECONDS):
+    """Batch version of TripIntegrator over whole sample arrays: returns
+    (fuel rate L/h, cumulative distance km, cumulative fuel L) per sample"""
+    import numpy as np
+    rate = fuel_rate(np.asarray(rpm, dtype=np.float64), np.asarray(throttle, dtype=np.float64))
+    dt = interval_seconds(np.asarray(t, dtype=np.float64), max_gap)
+    distance = np.zeros(len(rate))
+    fuel = np.zeros(len(rate))
+    np.cumsum(trapezoid(dt, np.asarray(speed, dtype=np.float64)) / 3600, out=distance[1:])
+    np.cumsum(trapezoid(dt, rate) / 3600, out=fuel[1:])
+    return rate, distance, fuel
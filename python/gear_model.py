@@ -0,0 +1,209 @@
+import argparse
+import bisect
+import json
+import math
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+# Gear codes shared with the analytics arrays (index into GEARS)
+GEARS = ('N', 'R', '1', '2', '3', '4', '5', '6')
+GEAR_CODES = {gear: code for code, gear in enumerate(GEARS)}
+FORWARD_GEARS = GEARS[2:]
+NEUTRAL = GEAR_CODES['N']
+
+# Default rpm per km/h in each gear; the band edges (geometric means of
+# neighbours) land on the old 300/200/150/120/100 thresholds
+DEFAULT_RATIOS = {'1': 350.0, '2': 250.0, '3': 175.0, '4': 135.0, '5': 110.0, '6': 90.0}
+IDLE_RPM = 500       # below this (or stopped) the car is in neutral
+RATIO_STEP = 1.0     # lookup table resolution, rpm per km/h
+TABLE_SIZE = 1024    # ratios past the end read the last entry (lowest gear)
+HOLD_SAMPLES = 4     # a new gear must be seen this many samples in a row (200 ms at 20 Hz)
+
+# Calibration: moving samples only, clustered on log(rpm / speed)
+CALIBRATION_PATH = 'gear_calibration.json'
+CALIBRATION_MIN_SPEED = 10      # km/h; clutch slip and crawling smear the ratio below this
+CALIBRATION_MIN_SAMPLES = 1000
+HISTOGRAM_BINS = 4096
+KMEANS_ITERATIONS = 50
+
+class GearModel:
+    """rpm/speed ratio -> gear via a precomputed table, so classification is
+    one division and one list index per sample"""
+
+    def __init__(self, ratios=None):
+        self.ratios = dict(ratios or DEFAULT_RATIOS)
+        gears = sorted(self.ratios, key=self.ratios.get)  # highest gear (lowest ratio) first
+        edges = [math.sqrt(self.ratios[a] * self.ratios[b]) for a, b in zip(gears, gears[1:])]
+        self.table = [GEAR_CODES[gears[bisect.bisect(edges, (i + 0.5) * RATIO_STEP)]] for i in range(TABLE_SIZE)]
+        self._array = None
+
+    def classify(self, rpm, speed):
+        """Gear code of one sample"""
+        if speed <= 0 or rpm < IDLE_RPM:
+            return NEUTRAL
+        return self.table[min(int(rpm / speed / RATIO_STEP), TABLE_SIZE - 1)]
+
+    def classify_array(self, rpm, speed):
+        """Gear codes of whole NumPy columns at once"""
+        import numpy as np  # the live paths never need NumPy
+        if self._array is None:
+            self._array = np.array(self.table, dtype=np.int64)
+        rpm = np.asarray(rpm, dtype=np.float64)
+        speed = np.asarray(speed, dtype=np.float64)
+        moving = (speed > 0) & (rpm >= IDLE_RPM)
+        index = np.zeros(len(rpm), dtype=np.int64)
+        np.floor_divide(rpm, speed * RATIO_STEP, out=index, where=moving, casting='unsafe')
+        codes = self._array[np.clip(index, 0, TABLE_SIZE - 1)]
+        codes[~moving] = NEUTRAL
+        return codes
+
+class GearTracker:
+    """Per-stream gear with hysteresis: a different gear is only reported once it
+    has been classified HOLD_SAMPLES times in a row, so ratio noise near a band
+    edge doesn't flicker the display"""
+    __slots__ = ('model', 'hold', 'code', 'candidate', 'count')
+
+    def __init__(self, model=None, hold=HOLD_SAMPLES):
+        self.model = model or GearModel()
+        self.hold = hold
+        self.code = NEUTRAL
+        self.candidate = NEUTRAL
+        self.count = 0
+
+    @property
+    def gear(self):
+        return GEARS[self.code]
+
+    def update(self, rpm, speed):
+        """Feed one sample; returns the gear name to show"""
+        code = self.model.classify(rpm, speed)
+        if code == self.code:
+            self.count = 0
+        else:
+            if code == self.candidate:
+                self.count += 1
+            else:
+                self.candidate, self.count = code, 1
+            if self.count >= self.hold:
+                self.code, self.count = code, 0
+        return GEARS[self.code]
+
+    def update_array(self, rpm, speed):
+        """Same as calling update() on every sample in order, over NumPy columns;
+        returns gear codes and leaves the tracker where update() would"""
+        import numpy as np
+        raw = self.model.classify_array(rpm, speed)
+        if len(raw) == 0:
+            return raw
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(raw)) + 1))
+        values = raw[starts]
+        lengths = np.diff(np.append(starts, len(raw)))
+        # Samples of the first run already counted before this array
+        seen = np.zeros(len(values), dtype=np.int64)
+        if values[0] == self.candidate and values[0] != self.code:
+            seen[0] = self.count
+        # A run switches the gear once it reaches hold samples; the gear after
+        # each run is the value of the last run that did
+        switches = lengths + seen >= self.hold
+        last = np.maximum.accumulate(np.where(switches, np.arange(len(values)), -1))
+        after = np.where(last >= 0, values[np.maximum(last, 0)], self.code)
+        before = np.concatenate(([self.code], after[:-1]))
+
+        codes = np.repeat(before, lengths)
+        # From the hold-th sample of a switching run on, the run's own value
+        switch_at = starts + np.maximum(self.hold - 1 - seen, 0)
+        marks = np.zeros(len(raw) + 1, dtype=np.int64)
+        np.add.at(marks, switch_at[switches], 1)
+        np.add.at(marks, (starts + lengths)[switches], -1)
+        switched = np.cumsum(marks[:-1]) > 0
+        codes[switched] = raw[switched]
+
+        self.code = int(after[-1])
+        if not switches[-1] and values[-1] != self.code:
+            self.candidate, self.count = int(values[-1]), int(lengths[-1] + seen[-1])
+        else:
+            self.count = 0
+        return codes
+
+def calibrate(chunks, gears=len(FORWARD_GEARS)):
+    """Learn per-gear ratios from (rpm, speed) NumPy chunks: 1-D k-means on
+    log(rpm / speed) over a histogram, so memory stays flat however many
+    samples there are. Returns {gear: ratio} or None with too little driving."""
+    import numpy as np
+    low, high = math.log(10), math.log(TABLE_SIZE * RATIO_STEP)
+    counts = np.zeros(HISTOGRAM_BINS)
+    for rpm, speed in chunks:
+        rpm = np.asarray(rpm, dtype=np.float64)
+        speed = np.asarray(speed, dtype=np.float64)
+        moving = (speed >= CALIBRATION_MIN_SPEED) & (rpm >= IDLE_RPM)
+        counts += np.histogram(np.log(rpm[moving] / speed[moving]), HISTOGRAM_BINS, (low, high))[0]
+    if counts.sum() < CALIBRATION_MIN_SAMPLES:
+        return None
+
+    centers = (np.arange(HISTOGRAM_BINS) + 0.5) * (high - low) / HISTOGRAM_BINS + low
+    # Seed with evenly spaced quantiles of the distribution
+    cdf = np.cumsum(counts) / counts.sum()
+    means = centers[np.searchsorted(cdf, (np.arange(gears) + 0.5) / gears)]
+    for _ in range(KMEANS_ITERATIONS):
+        nearest = np.abs(centers[:, None] - means[None, :]).argmin(axis=1)
+        weights = np.bincount(nearest, weights=counts, minlength=gears)
+        sums = np.bincount(nearest, weights=counts * centers, minlength=gears)
+        updated = np.where(weights > 0, sums / np.maximum(weights, 1e-12), means)
+        if np.allclose(updated, means):
+            break
+        means = updated
+    # Highest ratio is first gear
+    ratios = sorted(np.exp(means).tolist(), reverse=True)
+    return {gear: round(ratio, 2) for gear, ratio in zip(FORWARD_GEARS, ratios)}
+
+def load_calibration(path=CALIBRATION_PATH):
+    """{vehicle_id: GearModel} from a calibration file; {} if there is none yet"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {vehicle_id: GearModel(entry['ratios']) for vehicle_id, entry in json.load(f).items()}
+
+def save_calibration(vehicle_id, ratios, samples, path=CALIBRATION_PATH):
+    """Add or replace one vehicle's ratios in the calibration file"""
+    calibration = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            calibration = json.load(f)
+    calibration[vehicle_id] = {'ratios': ratios, 'samples': samples,
+                               'calibrated_at': datetime.now().isoformat(timespec='seconds')}
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(tmp, path)
+
+if __name__ == "__main__":
+    import numpy as np
+    from data_logger import DB_PATH, iter_trip_data
+
+    # trip_data has no vehicle column and only the single-vehicle bridge logs it, so
+    # every row in --db is taken to be one car; --vehicle only names the entry
+    parser = argparse.ArgumentParser(description='Learn gear ratios from logged trip_data')
+    parser.add_argument('--db', default=DB_PATH,
+                        help="database holding only this vehicle's driving (one per car)")
+    parser.add_argument('--vehicle', default='default',
+                        help='calibration entry to write; rows are not filtered by it')
+    parser.add_argument('--days', type=int, default=30, help='history to learn from')
+    parser.add_argument('--out', default=CALIBRATION_PATH)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    samples = [0]
+    def chunks():
+        start = datetime.now() - timedelta(days=args.days)
+        for rows in iter_trip_data(conn, ('rpm', 'speed'), start, chunk_size=250000):
+            columns = np.nan_to_num(np.array(rows, dtype=np.float64)).T
+            samples[0] += len(rows)
+            yield columns[0], columns[1]
+    ratios = calibrate(chunks())
+    conn.close()
+    if ratios is None:
+        print(f"Not enough driving in the last {args.days} days to calibrate ({samples[0]} samples)")
+        raise SystemExit(1)
+    save_calibration(args.vehicle, ratios, samples[0], args.out)
+    print(f"⚙️  {args.vehicle}: {ratios} from {samples[0]} samples -> {args.out}")
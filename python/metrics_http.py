@@ -0,0 +1,48 @@
+import time
+
+from flask import Response, g, jsonify, request
+
+from metrics import CONTENT_TYPE, PROFILER, REGISTRY
+
+# /debug/profile starts threads and exposes stacks; only local callers may use it
+LOOPBACK = ('127.0.0.1', '::1')
+
+def instrument_app(app, registry=REGISTRY):
+    """Per-route latency plus /metrics and /debug/profile on a Flask app
+
+    Latency is time to the response object, so streamed bodies (exports,
+    SSE) count their setup only.
+    """
+    requests = registry.histogram('http_request_duration_seconds', 'Flask request latency',
+                                  ('app', 'endpoint', 'status'))
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            requests.labels(app.name, request.endpoint or 'unknown', str(response.status_code)).observe(
+                time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    @app.route('/debug/profile', methods=['GET', 'POST'])
+    def profile():
+        """GET: folded stacks so far; POST ?enable=1|0 (&reset=1) toggles sampling. Loopback only."""
+        if request.remote_addr not in LOOPBACK:
+            return jsonify({'error': '/debug/profile is only served to localhost'}), 403
+        if request.method == 'POST':
+            if request.args.get('reset'):
+                PROFILER.reset()
+            if request.args.get('enable', '1') == '1':
+                PROFILER.start()
+            else:
+                PROFILER.stop()
+            return jsonify({'running': PROFILER.running, 'samples': PROFILER.samples})
+        return Response(PROFILER.folded(request.args.get('limit', type=int)), mimetype='text/plain')
@@ -0,0 +1,69 @@
+import math
+import threading
+import time
+from types import SimpleNamespace
+
+# Command names the emulator answers, mirroring obd.commands attributes
+commands = SimpleNamespace(
+    RPM='RPM',
+    THROTTLE_POS='THROTTLE_POS',
+    SPEED='SPEED',
+    COOLANT_TEMP='COOLANT_TEMP',
+)
+
+class EmulatedValue:
+    """Stand-in for a pint quantity - values are already in the units we ask for"""
+
+    def __init__(self, magnitude):
+        self.magnitude = magnitude
+
+    def to(self, unit):
+        return self
+
+class EmulatedResponse:
+    def __init__(self, value):
+        self.value = value
+
+class EmulatedELM327:
+    """Local stand-in for an obd.OBD connection to an ELM327 dongle
+
+    Each query sleeps for a serial round trip and holds a lock, because a
+    real adapter can only answer one request at a time. Signals follow the
+    same curves as fake_server.py.
+    """
+
+    def __init__(self, latency=0.012, jitter=0.004):
+        self.latency = latency
+        self.jitter = jitter
+        self.queries = 0
+        self._start = time.time()
+        self._link = threading.Lock()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+    def _signal(self, name, t):
+        rpm = 800 + 6000 * abs(math.sin(t / 3))
+        if name == 'RPM':
+            return rpm
+        if name == 'THROTTLE_POS':
+            return 15 + 85 * abs(math.sin(t / 3))
+        if name == 'SPEED':
+            return rpm * 0.05 + 20 * math.sin(t / 2)
+        if name == 'COOLANT_TEMP':
+            return 85 + 15 * math.sin(t / 10)
+        return None
+
+    def query(self, command):
+        name = getattr(command, 'name', command)
+        with self._link:
+            self.queries += 1
+            time.sleep(self.latency + self.jitter * math.sin(self.queries))
+            value = self._signal(name, time.time() - self._start)
+        return EmulatedResponse(None if value is None else EmulatedValue(value))
+
+def emulated_connection_factory(latency=0.012):
+    return lambda: (EmulatedELM327(latency), commands)
@@ -0,0 +1,128 @@
+import heapq
+import threading
+import time
+
+# Snapshot key -> (python-OBD command name, poll rate in Hz, value converter)
+PIDS = {
+    'rpm': ('RPM', 20, lambda value: int(value.magnitude)),
+    'throttle': ('THROTTLE_POS', 20, lambda value: int(value.magnitude)),
+    'speed': ('SPEED', 10, lambda value: int(value.to('km/h').magnitude)),
+    'coolant': ('COOLANT_TEMP', 1, lambda value: int(value.to('degC').magnitude)),
+}
+
+def open_obd_connection():
+    """Default connection factory - auto-detects the ELM327 dongle"""
+    import obd
+    return obd.OBD(), obd.commands
+
+class OBDReader:
+    """Single shared OBD poller running on its own thread
+
+    The serial link can only carry one request at a time, so instead of
+    querying every PID back to back we run an earliest-deadline schedule:
+    each PID is polled at its own rate and slow PIDs never delay fast ones
+    by more than one round trip.
+    """
+
+    def __init__(self, connection_factory=open_obd_connection, pids=PIDS, retry_delay=2.0):
+        self.connection_factory = connection_factory
+        self.pids = pids
+        self.retry_delay = retry_delay
+        self.connected = False
+        self.sequence = 0
+        self._values = {name: 0 for name in pids}
+        self._snapshot = dict(self._values)
+        self._stats = {name: {'queries': 0, 'errors': 0, 'busy_s': 0.0} for name in pids}
+        self._started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='OBDReader', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def snapshot(self):
+        """Latest values for every PID - a new dict is swapped in on each update"""
+        return self._snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                connection, commands = self.connection_factory()
+            except Exception as e:
+                print(f"OBD connection error: {e}")
+                connection = None
+            if connection is None or not connection.is_connected():
+                self.connected = False
+                self._stop.wait(self.retry_delay)
+                continue
+
+            self.connected = True
+            print("REAL CAR CONNECTED! Streaming live data...")
+            try:
+                self._poll(connection, commands)
+            except Exception as e:
+                # Serial errors, bad conversions: drop the link and reconnect after a pause
+                print(f"OBD polling error: {e}")
+                self.connected = False
+                connection.close()
+                self._stop.wait(self.retry_delay)
+                continue
+            self.connected = False
+            connection.close()
+
+    def _poll(self, connection, commands):
+        now = time.monotonic()
+        schedule = []
+        for name, (command_name, rate, convert) in self.pids.items():
+            heapq.heappush(schedule, (now, name, getattr(commands, command_name), 1.0 / rate, convert))
+
+        while not self._stop.is_set():
+            due, name, command, period, convert = heapq.heappop(schedule)
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+
+            started = time.monotonic()
+            response = connection.query(command)
+            finished = time.monotonic()
+
+            stats = self._stats[name]
+            stats['queries'] += 1
+            stats['busy_s'] += finished - started
+            if response.value is None:
+                stats['errors'] += 1
+            else:
+                self._values[name] = convert(response.value)
+                self.sequence += 1
+                self._snapshot = dict(self._values)
+
+            # Don't try to catch up in a burst if the link fell behind
+            next_due = due + period
+            if next_due < finished:
+                next_due = finished + period
+            heapq.heappush(schedule, (next_due, name, command, period, convert))
+
+            if not connection.is_connected():
+                print("OBD connection lost")
+                return
+
+    def get_stats(self):
+        elapsed = max(1e-9, time.monotonic() - (self._started_at or time.monotonic()))
+        result = {}
+        for name, (command_name, rate, _) in self.pids.items():
+            stats = self._stats[name]
+            result[name] = {
+                'target_hz': rate,
+                'achieved_hz': round(stats['queries'] / elapsed, 2),
+                'errors': stats['errors'],
+                'avg_query_ms': round(stats['busy_s'] / max(1, stats['queries']) * 1000, 2),
+            }
+        return result
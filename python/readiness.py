@@ -0,0 +1,16 @@
+import os
+
+# launch.py hands each child the write end of a pipe under this name
+READY_FD_ENV = 'VEP_READY_FD'
+
+def notify_ready(detail=''):
+    """Tell the supervisor this service is serving; a no-op when run by hand"""
+    fd = os.environ.pop(READY_FD_ENV, None)  # once, and not inherited by our own children
+    if fd is None:
+        return False
+    try:
+        os.write(int(fd), f"READY {detail}\n".encode())
+        os.close(int(fd))
+    except (OSError, ValueError):
+        return False
+    return True
@@ -0,0 +1,139 @@
+import bisect
+import math
+import threading
+import time
+from array import array
+from datetime import datetime
+
+# Signals kept per sample; gear is stored as a code (N=0, 1-6) like the analytics arrays
+SIGNALS = ('rpm', 'speed', 'coolant', 'throttle', 'fuel_rate', 'gear')
+GEAR_CODES = {'N': 0.0, '1': 1.0, '2': 2.0, '3': 3.0, '4': 4.0, '5': 5.0, '6': 6.0}
+GEAR_NAMES = {code: name for name, code in GEAR_CODES.items()}
+# Signals in bucketed history, named and ordered as the rollup tier returns them
+HISTORY_SIGNALS = ('rpm', 'speed', 'coolant', 'throttle')
+# One hour at 20 Hz; 7 float64 columns -> ~4 MB, allocated up front
+RECENT_CAPACITY = 72000
+
+def _stored(value):
+    """A signal as SQLite's INTEGER affinity would return it"""
+    return int(value) if value.is_integer() else value
+
+class RecentStore:
+    """Fixed-size ring of the newest samples, one array('d') per signal
+
+    append() is O(1) and never allocates. Timestamps are kept non-decreasing
+    (a sample older than the previous one is stamped with the previous
+    time), so range lookups are a binary search over the ring.
+    """
+
+    def __init__(self, capacity=RECENT_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.columns = {signal: array('d', bytes(8 * capacity)) for signal in SIGNALS}
+        # Attribute aliases for the append path
+        self.rpm, self.speed, self.coolant, self.throttle, self.fuel_rate, self.gear = self.columns.values()
+        self.head = 0  # next slot to write
+        self.count = 0
+        self.lock = threading.Lock()
+
+    @property
+    def memory_bytes(self):
+        return self.capacity * 8 * (len(self.columns) + 1)
+
+    def append(self, ts, sample):
+        get = sample.get
+        with self.lock:
+            head = self.head
+            if self.count and ts < self.timestamps[head - 1]:
+                ts = self.timestamps[head - 1]
+            self.timestamps[head] = ts
+            self.rpm[head] = get('rpm') or 0
+            self.speed[head] = get('speed') or 0
+            self.coolant[head] = get('coolant') or 0
+            self.throttle[head] = get('throttle') or 0
+            self.fuel_rate[head] = get('fuel_rate') or 0
+            self.gear[head] = GEAR_CODES.get(get('gear'), 0.0)
+            self.head = head + 1 if head + 1 < self.capacity else 0
+            if self.count < self.capacity:
+                self.count += 1
+
+    def _physical(self, i):
+        """Logical index (0 = oldest) -> slot in the arrays"""
+        i += self.head - self.count
+        return i + self.capacity if i < 0 else i
+
+    def _bisect(self, ts):
+        """First logical index with timestamp > ts"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[self._physical(mid)] > ts:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def oldest(self):
+        """Timestamp of the oldest retained sample, None when empty"""
+        with self.lock:
+            return self.timestamps[self._physical(0)] if self.count else None
+
+    def _copy(self, column, first, last):
+        """Copy logical [first, last) out of one ring column, in order"""
+        a, b = self._physical(first), self._physical(last - 1) + 1
+        if a < b:
+            return column[a:b]
+        return column[a:] + column[:b]
+
+    def range(self, start, end=None):
+        """(timestamps, {signal: values}) for start < ts <= end, as array copies"""
+        with self.lock:
+            first = self._bisect(start)
+            last = self.count if end is None else self._bisect(end)
+            if first >= last:
+                return array('d'), {signal: array('d') for signal in SIGNALS}
+            timestamps = self._copy(self.timestamps, first, last)
+            values = {signal: self._copy(column, first, last) for signal, column in self.columns.items()}
+        return timestamps, values
+
+    def query(self, start, end=None, max_points=None):
+        """History entries shaped like /api/history rows, averaged into
+        at most max_points equal-time buckets when given"""
+        timestamps, values = self.range(start, end)
+        n = len(timestamps)
+        if not n:
+            return []
+        if not max_points or n <= max_points:
+            # Same keys and types as the trip_data rows (INTEGER columns hand whole values back as ints)
+            fromtimestamp = datetime.fromtimestamp
+            return [{
+                'timestamp': fromtimestamp(ts).isoformat(' '),
+                'rpm': _stored(rpm), 'speed': _stored(speed), 'coolant': _stored(coolant),
+                'throttle': _stored(throttle), 'gear': GEAR_NAMES.get(gear, 'N'),
+            } for ts, rpm, speed, coolant, throttle, gear in zip(
+                timestamps, values['rpm'], values['speed'], values['coolant'], values['throttle'], values['gear'])]
+
+        # Same buckets and fields as the rollup tier: whole-second steps aligned to
+        # the epoch, mean/min/max/last per signal
+        window = (time.time() if end is None else end) - start
+        step = max(1, math.ceil(window / max_points))
+        history = []
+        lo = 0
+        while lo < n:
+            bucket = timestamps[lo] // step * step
+            hi = bisect.bisect_left(timestamps, bucket + step, lo)
+            entry = {
+                'timestamp': datetime.fromtimestamp(bucket).isoformat(' '),
+                'resolution_seconds': step,
+                'samples': hi - lo,
+            }
+            for signal in HISTORY_SIGNALS:
+                column = values[signal][lo:hi]
+                entry[signal] = round(sum(column) / len(column), 1)
+                entry[f'{signal}_min'] = min(column)
+                entry[f'{signal}_max'] = max(column)
+                entry[f'{signal}_last'] = column[-1]
+            entry['gear'] = GEAR_NAMES.get(values['gear'][hi - 1], 'N')
+            history.append(entry)
+            lo = hi
+        return history
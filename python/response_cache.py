@@ -0,0 +1,141 @@
+import collections
+import copy
+import hashlib
+import threading
+import time
+
+from flask import Response, current_app, request
+
+from data_logger import FUEL_SAMPLES_SQL, FuelTotal
+from metrics import REGISTRY
+from trip_shards import trip_data_tables
+
+CACHE_CAPACITY = 256  # serialized responses kept, least recently used evicted first
+
+CACHE_REQUESTS = REGISTRY.counter('api_cache_requests_total', 'API response cache lookups', ['result'])
+CACHE_HITS = CACHE_REQUESTS.labels('hit')
+CACHE_MISSES = CACHE_REQUESTS.labels('miss')
+NOT_MODIFIED = CACHE_REQUESTS.labels('not_modified')
+
+class ResponseCache:
+    """LRU of serialized JSON bodies with a per-entry TTL and an ETag each"""
+
+    def __init__(self, capacity=CACHE_CAPACITY):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()  # key -> (body, etag, expires)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, ttl):
+        entry = (body, hashlib.blake2b(body, digest_size=8).hexdigest(), time.monotonic() + ttl)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, prefix=None):
+        """Drop every entry, or those whose key tuple starts with prefix"""
+        with self.lock:
+            if prefix is None:
+                self.entries.clear()
+                return
+            for key in [key for key in self.entries if key[0] == prefix]:
+                del self.entries[key]
+
+    def respond(self, key, ttl, build):
+        """JSON response for key from the cache, or from build() on a miss;
+        304 when the client's If-None-Match already names this body"""
+        entry = self.get(key)
+        if entry is None:
+            CACHE_MISSES.inc()
+            entry = self.put(key, current_app.json.dumps(build()).encode() + b'\n', ttl)
+        else:
+            CACHE_HITS.inc()
+        body, etag, _ = entry
+        if request.if_none_match.contains(etag):
+            NOT_MODIFIED.inc()
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response
+
+class TripSummaryAggregate:
+    """Running totals over today's trip_data, advanced by folding in only the
+    rows past the last seen id instead of rescanning the whole day"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset(None)
+
+    def reset(self, day_start):
+        self.day_start = day_start
+        self.high_water = 0  # largest trip_data id folded in so far
+        self.points = 0
+        self.speed_sum = 0.0
+        self.max_speed = None
+        self.fuel = FuelTotal()
+        self.start_time = None
+        self.end_time = None
+
+    def refresh(self, conn, day_start):
+        """Fold rows added since the last call; returns (points, avg, max speed, fuel, start, end)"""
+        with self.lock:
+            if day_start != self.day_start:
+                self.reset(day_start)
+            while True:
+                # Today's rows live in the unsharded table and/or today's day shard
+                batches = []
+                # Fuel is integrated across the new rows in order; kept aside until they're folded in
+                fuel = copy.deepcopy(self.fuel)
+                high_water = 0
+                for table in trip_data_tables(conn, day_start):
+                    table_high = conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0] or 0
+                    high_water = max(high_water, table_high)
+                    if table_high <= self.high_water:
+                        continue
+                    # The id bound keeps the new high-water consistent with what was aggregated.
+                    # First pass: today's rows via the timestamp index; after that a rowid
+                    # range (the unary + keeps SQLite off the timestamp index)
+                    if self.high_water:
+                        where = 'id > ? AND id <= ? AND +timestamp >= ?'
+                        params = (self.high_water, table_high, day_start)
+                    else:
+                        where = 'timestamp >= ? AND id <= ?'
+                        params = (day_start, table_high)
+                    batches.append(conn.execute(f'''
+                        SELECT COUNT(*), SUM(speed), MAX(speed), MIN(timestamp), MAX(timestamp)
+                        FROM {table}
+                        WHERE {where}
+                    ''', params).fetchone())
+                    cursor = conn.execute(FUEL_SAMPLES_SQL.format(table=table, where=where), params)
+                    fuel.add_cursor(cursor)
+                    cursor.close()
+                if high_water >= self.high_water:
+                    break
+                # Rows were deleted or the database replaced: start over (still under the lock)
+                self.reset(day_start)
+            for points, speed_sum, max_speed, start_time, end_time in batches:
+                if not points:
+                    continue
+                self.points += points
+                self.speed_sum += speed_sum or 0
+                self.max_speed = max_speed if self.max_speed is None else max(self.max_speed, max_speed or 0)
+                self.start_time = start_time if self.start_time is None else min(self.start_time, start_time)
+                self.end_time = end_time if self.end_time is None else max(self.end_time, end_time)
+            self.fuel = fuel
+            self.high_water = high_water
+            average = self.speed_sum / self.points if self.points else None
+            return self.points, average, self.max_speed, self.fuel.liters, self.start_time, self.end_time
@@ -0,0 +1,275 @@
+import json
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+# POSIX shared memory segment the bridge publishes into
+SHARED_STATE_NAME = os.environ.get('VEP_SHARED_STATE', 'vehicle_ease_state')
+MAX_VEHICLES = 256
+ALERT_BYTES = 2048  # JSON of one vehicle's active alerts; longer lists are cut to fit
+
+MAGIC = b'VEPS'
+VERSION = 3
+# magic, version, slot count, slot size, generation (creation time - changes when the bridge
+# restarts), pid of the writer that owns the segment
+HEADER = struct.Struct('<4sBxHIdI')
+HEADER_SIZE = 64
+# Per-slot sequence counter, odd while the writer is inside the slot. It is
+# accessed through a memoryview cast to 'Q' so each access is one aligned
+# 8-byte copy; struct.pack_into zero-fills its target before packing, which
+# readers would see as a counter of 0.
+SEQ_SIZE = 8
+# vehicle_id, connected, ts, written, rpm, coolant, throttle, speed, gear, fuel_rate, trip_fuel,
+# fuel_efficiency, trip_cost, trip_distance, alerts_version, alerts_len. ts is the
+# sample's own (source clock, possibly replayed); written is the bridge's wall clock
+RECORD = struct.Struct('<32s?dd4d3s5dIH')
+# Readers treat a slot not written for this long as stale and re-attach
+STALE_AFTER = 2.0
+# Whole cache lines, which also keeps every sequence counter 8-byte aligned
+SLOT_SIZE = -(-(SEQ_SIZE + RECORD.size + ALERT_BYTES) // 64) * 64
+
+# Segments created by a writer in this process (or a forked parent), which
+# share its resource tracker registration
+_OWNED = set()
+
+def _attach(name):
+    """Open an existing segment without handing it to this process's resource tracker,
+    which would otherwise unlink the bridge's segment when a reader exits"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name)
+        if name not in _OWNED:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+def _owner_alive(shm):
+    """True if the segment carries our header and the writer that created it is still running"""
+    if shm.size < HEADER.size:
+        return False
+    magic, version, _, _, _, pid = HEADER.unpack_from(shm.buf, 0)
+    if magic != MAGIC or version != VERSION or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # running as another user
+    return True
+
+def _number(value):
+    """Signals are stored as doubles; whole values go back out as ints, as the sources send them"""
+    return int(value) if value.is_integer() else value
+
+class SharedStateWriter:
+    """Single writer (the bridge): one seqlock-protected slot per vehicle"""
+
+    def __init__(self, name=SHARED_STATE_NAME, max_vehicles=MAX_VEHICLES):
+        try:
+            existing = _attach(name)
+        except FileNotFoundError:
+            pass
+        else:
+            alive = _owner_alive(existing)
+            existing.close()
+            if alive:
+                raise FileExistsError(f"shared state segment {name} belongs to a running bridge; "
+                                      "set VEP_SHARED_STATE to use another one")
+            # Left behind by a bridge that was killed; readers re-attach by generation
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+        self.shm = shared_memory.SharedMemory(name, create=True, size=HEADER_SIZE + max_vehicles * SLOT_SIZE)
+        _OWNED.add(name)
+        self.buf = self.shm.buf
+        self.seqs = self.buf.cast('Q')
+        self.max_vehicles = max_vehicles
+        self.slots = {}  # vehicle_id -> [offset, seq, alerts list last encoded, alerts_version, alerts bytes]
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, max_vehicles, SLOT_SIZE, time.time(), os.getpid())
+
+    def _slot(self, vehicle_id):
+        slot = self.slots.get(vehicle_id)
+        if slot is None:
+            if len(self.slots) >= self.max_vehicles:
+                return None
+            slot = self.slots[vehicle_id] = [HEADER_SIZE + len(self.slots) * SLOT_SIZE, 0, None, 0, b'[]']
+        return slot
+
+    def write(self, vehicle_id, data, alerts=(), connected=True):
+        """data: latest_data dict or a VehicleState (anything with .get)"""
+        slot = self._slot(vehicle_id)
+        if slot is None:
+            return False
+        offset, seq = slot[0], slot[1]
+        # The rule engine replaces a vehicle's active list only when an alert
+        # is raised or cleared, so identity tells us when to re-encode
+        if alerts is not slot[2]:
+            encoded = json.dumps(alerts).encode()
+            while len(encoded) > ALERT_BYTES and alerts:
+                alerts = alerts[:-1]
+                encoded = json.dumps(alerts).encode()
+            slot[2] = alerts
+            slot[3] += 1
+            slot[4] = encoded
+        encoded = slot[4]
+
+        get = data.get
+        buf = self.buf
+        self.seqs[offset >> 3] = seq + 1
+        RECORD.pack_into(
+            buf, offset + SEQ_SIZE,
+            vehicle_id.encode()[:32], connected, get('ts') or time.time(), time.time(),
+            get('rpm') or 0, get('coolant') or 0, get('throttle') or 0, get('speed') or 0,
+            (get('gear') or 'N').encode()[:3],
+            get('fuel_rate') or 0.0, get('trip_fuel') or 0.0, get('fuel_efficiency') or 0.0,
+            get('trip_cost') or 0.0, get('trip_distance') or 0.0,
+            slot[3], len(encoded),
+        )
+        start = offset + SEQ_SIZE + RECORD.size
+        buf[start:start + len(encoded)] = encoded
+        self.seqs[offset >> 3] = seq + 2
+        slot[1] = seq + 2
+        return True
+
+    def close(self):
+        self.seqs.release()
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+        _OWNED.discard(self.shm.name)
+
+class SharedStateReader:
+    """Lock-free reader for any number of processes; attaches lazily and
+    re-attaches when the bridge restarts with a new segment"""
+
+    RETRY_TIMEOUT = 0.1  # seconds to wait on a writer stuck inside a slot
+    REATTACH_INTERVAL = 1.0
+
+    def __init__(self, name=SHARED_STATE_NAME):
+        self.name = name
+        # seqs is set before shm everywhere so the cast view is released first;
+        # SharedMemory can't unmap while a view of it is alive
+        self.seqs = None
+        self.shm = None
+        self.generation = None
+        self.index = {}  # vehicle_id -> offset
+        self.alerts_cache = {}  # offset -> (alerts_version, parsed alerts)
+        self.last_attach = 0.0
+
+    def _attach(self):
+        now = time.time()
+        if now - self.last_attach < self.REATTACH_INTERVAL:
+            return self.shm is not None
+        self.last_attach = now
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            # Bridge stopped (its segment is unlinked on exit): stop serving the frozen snapshot
+            self.seqs = None
+            self.shm = None
+            return False
+        magic, version, _, _, generation, _ = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION or generation == self.generation:
+            shm.close()
+            return self.shm is not None
+        # The old mapping is dropped rather than closed: another request thread may still be reading it
+        self.seqs = shm.buf.cast('Q')
+        self.shm = shm
+        self.generation = generation
+        self.index = {}
+        self.alerts_cache = {}
+        return True
+
+    def _read_slot(self, offset):
+        """(record tuple, alerts bytes) copied under the seqlock, None if never written"""
+        buf = self.shm.buf
+        seqs = self.seqs
+        attempt = 0
+        deadline = None
+        while True:
+            before = seqs[offset >> 3]
+            if not before & 1:
+                record = RECORD.unpack_from(buf, offset + SEQ_SIZE)
+                start = offset + SEQ_SIZE + RECORD.size
+                alerts = bytes(buf[start:start + record[-1]])
+                if seqs[offset >> 3] == before:
+                    return (record, alerts) if before else None
+            attempt += 1
+            if attempt > 10:
+                # The writer was preempted mid-update (likely when cores are scarce); wait for it
+                if deadline is None:
+                    deadline = time.monotonic() + self.RETRY_TIMEOUT
+                elif time.monotonic() > deadline:
+                    return None
+                time.sleep(0.00005)
+            elif attempt > 2:
+                os.sched_yield()
+
+    def _find(self, vehicle_id):
+        offset = self.index.get(vehicle_id)
+        if offset is not None:
+            return offset
+        slots = HEADER.unpack_from(self.shm.buf, 0)[2]
+        wanted = vehicle_id.encode()[:32].ljust(32, b'\0')
+        for i in range(slots):
+            offset = HEADER_SIZE + i * SLOT_SIZE
+            if bytes(self.shm.buf[offset + SEQ_SIZE:offset + SEQ_SIZE + 32]) == wanted:
+                self.index[vehicle_id] = offset
+                return offset
+            if not self.seqs[offset >> 3]:
+                break  # slots fill in order
+        return None
+
+    def read(self, vehicle_id='default'):
+        """Latest snapshot as a dict (latest_data keys plus alerts), None if unavailable"""
+        if self.shm is None and not self._attach():
+            return None
+        offset = self._find(vehicle_id)
+        result = self._read_slot(offset) if offset is not None else None
+        if result is None or time.time() - result[0][3] > STALE_AFTER:
+            # Missing or stale: the bridge may have restarted into a new segment, or be gone
+            if not self._attach():
+                return None
+            new_offset = self._find(vehicle_id)
+            new_result = self._read_slot(new_offset) if new_offset is not None else None
+            if new_result is not None:
+                offset, result = new_offset, new_result
+        if result is None:
+            return None
+
+        record, alerts = result
+        (_, connected, ts, _, rpm, coolant, throttle, speed, gear, fuel_rate, trip_fuel,
+         fuel_efficiency, trip_cost, trip_distance, alerts_version, _) = record
+        cached = self.alerts_cache.get(offset)
+        if cached is None or cached[0] != alerts_version:
+            cached = self.alerts_cache[offset] = (alerts_version, json.loads(alerts))
+        return {
+            'vehicle_id': vehicle_id,
+            'connected': connected,
+            'ts': ts,
+            'rpm': _number(rpm),
+            'coolant': _number(coolant),
+            'throttle': _number(throttle),
+            'speed': _number(speed),
+            'gear': gear.rstrip(b'\0').decode(),
+            'fuel_rate': fuel_rate,
+            'trip_fuel': trip_fuel,
+            'fuel_efficiency': fuel_efficiency,
+            'trip_cost': trip_cost,
+            'trip_distance': trip_distance,
+            'alerts': cached[1],
+        }
+
+    def vehicles(self):
+        """vehicle_ids with a slot in the current segment"""
+        if self.shm is None and not self._attach():
+            return []
+        ids = []
+        for i in range(HEADER.unpack_from(self.shm.buf, 0)[2]):
+            offset = HEADER_SIZE + i * SLOT_SIZE
+            if not self.seqs[offset >> 3]:
+                break
+            ids.append(bytes(self.shm.buf[offset + SEQ_SIZE:offset + SEQ_SIZE + 32]).rstrip(b'\0').decode())
+        return ids
@@ -0,0 +1,212 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from data_logger import DB_PATH, INSERT_TRIP_SUMMARY, trip_summary_row
+from trip_shards import trip_data_tables
+from fuel_model import MAX_GAP_SECONDS, interval_seconds, trapezoid
+from gear_model import GEAR_CODES, GEARS, GearTracker, load_calibration
+
+# Rows pulled from SQLite per NumPy batch
+CHUNK_ROWS = 250000
+
+RPM_BIN = 500       # rpm histogram bucket width
+RPM_BINS = 17       # 0..8000+
+THROTTLE_BIN = 10   # throttle histogram bucket width (%)
+THROTTLE_BINS = 11  # 0..100
+
+# julianday() -> seconds; timestamps are stored as local time text,
+# which is all we need for differences. Gear is mapped to its code in SQL
+# so each chunk converts to a single float array in one call.
+LOAD_SQL = f'''
+    SELECT (julianday(timestamp) - 2440587.5) * 86400.0, rpm, speed, throttle, fuel_consumption,
+        CASE gear {' '.join(f"WHEN '{gear}' THEN {code}" for gear, code in GEAR_CODES.items())} ELSE 0 END
+    FROM {{table}}
+    WHERE timestamp >= ? AND timestamp < ?
+    ORDER BY timestamp
+'''
+# The LOAD_SQL columns as stored in a columnar archive
+ARCHIVE_COLUMNS = ('timestamp', 'rpm', 'speed', 'throttle', 'fuel_consumption', 'gear')
+
+class TripAccumulator:
+    """Batch aggregates over a window, fed one NumPy column chunk at a time"""
+
+    def __init__(self):
+        self.samples = 0
+        self.start = None
+        self.end = None
+        self.moving_seconds = 0.0
+        self.distance_km = 0.0
+        self.fuel_l = 0.0
+        self.idle_seconds = 0.0
+        self.max_speed = 0
+        self.gear_seconds = np.zeros(len(GEARS))
+        self.rpm_seconds = np.zeros(RPM_BINS)
+        self.throttle_seconds = np.zeros(THROTTLE_BINS)
+        # Last row of the previous chunk so integration is continuous across chunks
+        self._carry = None
+
+    def add_chunk(self, t, rpm, speed, throttle, fuel, gear):
+        if len(t) == 0:
+            return
+        self.samples += len(t)
+        if self.start is None:
+            self.start = t[0]
+        self.end = t[-1]
+        self.max_speed = max(self.max_speed, int(speed.max()))
+
+        if self._carry is not None:
+            t, rpm, speed, throttle, fuel, gear = (
+                np.concatenate(([c], column)) for c, column in zip(self._carry, (t, rpm, speed, throttle, fuel, gear))
+            )
+        self._carry = (t[-1], rpm[-1], speed[-1], throttle[-1], fuel[-1], gear[-1])
+        if len(t) < 2:
+            return
+
+        # Gaps over MAX_GAP_SECONDS (logger stopped, car parked) count as zero
+        dt = interval_seconds(t, MAX_GAP_SECONDS)
+        self.moving_seconds += dt.sum()
+
+        # Trapezoidal integration: speed km/h -> km, fuel L/s -> L
+        self.distance_km += float(trapezoid(dt, speed).sum() / 3600)
+        self.fuel_l += float(trapezoid(dt, fuel).sum())
+
+        # Time-weighted distributions, attributed to the state at the start of each interval
+        left_speed = speed[:-1]
+        left_rpm = rpm[:-1]
+        self.idle_seconds += float(dt[(left_speed == 0) & (left_rpm > 0)].sum())
+        self.gear_seconds += np.bincount(gear[:-1], weights=dt, minlength=len(GEARS))
+        self.rpm_seconds += np.bincount(
+            np.clip(left_rpm // RPM_BIN, 0, RPM_BINS - 1).astype(np.int64), weights=dt, minlength=RPM_BINS)
+        self.throttle_seconds += np.bincount(
+            np.clip(throttle[:-1] // THROTTLE_BIN, 0, THROTTLE_BINS - 1).astype(np.int64), weights=dt,
+            minlength=THROTTLE_BINS)
+
+    def result(self):
+        hours = self.moving_seconds / 3600
+        return {
+            'data_points': self.samples,
+            'duration_seconds': round(self.moving_seconds, 1),
+            'total_distance_km': round(self.distance_km, 3),
+            'avg_speed': round(self.distance_km / hours, 1) if hours else 0.0,
+            'max_speed': self.max_speed,
+            'fuel_used_liters': round(self.fuel_l, 3),
+            'fuel_per_km': round(self.fuel_l / self.distance_km, 4) if self.distance_km else None,
+            'idle_seconds': round(self.idle_seconds, 1),
+            'gear_seconds': {gear: round(float(s), 1) for gear, s in zip(GEARS, self.gear_seconds) if s},
+            'rpm_seconds': [round(float(s), 1) for s in self.rpm_seconds],
+            'throttle_seconds': [round(float(s), 1) for s in self.throttle_seconds],
+        }
+
+class TripAnalytics:
+    """Vectorized summaries over trip_data, persisted per day into trip_summary"""
+
+    def __init__(self, db_path=DB_PATH, gear_model=None):
+        """gear_model: re-infer gears from rpm/speed with these (calibrated) ratios
+        instead of trusting the logged gear; defaults to the 'default' calibration if any"""
+        self.db_path = db_path
+        self.gear_model = gear_model or load_calibration().get('default')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def iter_chunks(self, conn, start, end, chunk_rows=CHUNK_ROWS):
+        """Yield column arrays (t, rpm, speed, throttle, fuel, gear) for [start, end)"""
+        # Unsharded table first, then only the day shards overlapping the window
+        tables = trip_data_tables(conn, start, end)
+        cursor = None
+        try:
+            for table in tables:
+                if not isinstance(table, str):
+                    yield from self.iter_archive(table, start, end)
+                    continue
+                cursor = conn.execute(LOAD_SQL.format(table=table), (start, end))
+                for rows in iter(lambda: cursor.fetchmany(chunk_rows), []):
+                    columns = np.nan_to_num(np.array(rows, dtype=np.float64)).T
+                    yield columns[0], columns[1], columns[2], columns[3], columns[4], columns[5].astype(np.int64)
+                cursor.close()
+        finally:
+            if cursor is not None:
+                cursor.close()
+            tables.close()
+
+    def iter_archive(self, archive, start, end):
+        """Same chunks from an archived day, one per overlapping block"""
+        # Archive gear dictionary code -> GEAR_CODES code
+        gear_codes = np.array([GEAR_CODES.get(gear, 0) for gear in archive.gears] or [0], dtype=np.int64)
+        for block in archive.iter_blocks(ARCHIVE_COLUMNS, start, end, order_by='timestamp'):
+            signals = [np.nan_to_num(block[name].astype(np.float64)) for name in ARCHIVE_COLUMNS[1:5]]
+            yield (block['timestamp'] / 1e6, *signals, gear_codes[block['gear']])
+
+    def summarize(self, start, end, conn=None):
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            accumulator = TripAccumulator()
+            tracker = GearTracker(self.gear_model) if self.gear_model else None
+            for chunk in self.iter_chunks(conn, start, end):
+                if tracker is not None:
+                    chunk = (*chunk[:5], tracker.update_array(chunk[1], chunk[2]))
+                accumulator.add_chunk(*chunk)
+        finally:
+            if own:
+                conn.close()
+        summary = accumulator.result()
+        summary['start_time'] = str(start)
+        summary['end_time'] = str(end)
+        return summary
+
+    def persist(self, conn, summary, kind='day'):
+        conn.execute(INSERT_TRIP_SUMMARY, trip_summary_row(summary, kind))
+
+    def daily_summaries(self, first_day, last_day):
+        """Per-day summaries; closed days are computed once and then read back from trip_summary"""
+        conn = self._connect()
+        today = datetime.now().date()
+        results = []
+        try:
+            stored = {
+                row[0]: json.loads(row[1]) for row in conn.execute('''
+                    SELECT start_time, details FROM trip_summary
+                    WHERE kind = 'day' AND start_time >= ? AND start_time <= ?
+                ''', (str(first_day), str(last_day)))
+            }
+            day = first_day
+            while day <= last_day:
+                summary = stored.get(str(day))
+                if summary is None:
+                    summary = self.summarize(str(day), str(day + timedelta(days=1)), conn)
+                    # Today is still growing - compute it, but don't freeze it
+                    if day < today and summary['data_points']:
+                        with conn:
+                            self.persist(conn, summary)
+                results.append(summary)
+                day += timedelta(days=1)
+        finally:
+            conn.close()
+        return results
+
+def combine_summaries(summaries):
+    """Roll per-day summaries up into one window total"""
+    total = {
+        'days': len(summaries),
+        'data_points': sum(s['data_points'] for s in summaries),
+        'duration_seconds': round(sum(s['duration_seconds'] for s in summaries), 1),
+        'total_distance_km': round(sum(s['total_distance_km'] for s in summaries), 3),
+        'max_speed': max((s['max_speed'] for s in summaries), default=0),
+        'fuel_used_liters': round(sum(s['fuel_used_liters'] for s in summaries), 3),
+        'idle_seconds': round(sum(s['idle_seconds'] for s in summaries), 1),
+        'gear_seconds': {},
+        'rpm_seconds': [round(sum(col), 1) for col in zip(*(s['rpm_seconds'] for s in summaries))],
+        'throttle_seconds': [round(sum(col), 1) for col in zip(*(s['throttle_seconds'] for s in summaries))],
+    }
+    for s in summaries:
+        for gear, seconds in s['gear_seconds'].items():
+            total['gear_seconds'][gear] = round(total['gear_seconds'].get(gear, 0) + seconds, 1)
+    hours = total['duration_seconds'] / 3600
+    total['avg_speed'] = round(total['total_distance_km'] / hours, 1) if hours else 0.0
+    distance = total['total_distance_km']
+    total['fuel_per_km'] = round(total['fuel_used_liters'] / distance, 4) if distance else None
+    return total
@@ -0,0 +1,128 @@
+import threading
+
+from fuel_model import MAX_GAP_SECONDS
+
+class OpenTrip:
+    """Running aggregates for the trip in progress - O(1) per sample"""
+    __slots__ = (
+        'start', 'last_ts', 'last_active', 'last_speed', 'last_fuel', 'samples',
+        'distance_km', 'fuel_l', 'moving_seconds', 'idle_seconds', 'max_speed', 'speed_sum',
+        'active_totals',
+    )
+
+    def __init__(self, ts, speed, fuel):
+        self.start = ts
+        self.last_ts = ts
+        self.last_active = ts
+        self.last_speed = speed
+        self.last_fuel = fuel
+        self.samples = 1
+        self.distance_km = 0.0
+        self.fuel_l = 0.0
+        self.moving_seconds = 0.0
+        self.idle_seconds = 0.0
+        self.max_speed = speed
+        self.speed_sum = speed
+        self.active_totals = self.totals()
+
+    def totals(self):
+        """(samples, distance_km, fuel_l, moving_seconds, idle_seconds, speed_sum) so far"""
+        return (self.samples, self.distance_km, self.fuel_l,
+                self.moving_seconds, self.idle_seconds, self.speed_sum)
+
+class TripSegmenter:
+    """Splits the live sample stream into trips from speed/RPM idle gaps
+
+    A trip opens on the first moving sample and closes once the car has
+    been stationary for idle_timeout seconds, the engine has been off for
+    engine_off_timeout seconds, or the stream has gone quiet for longer
+    than idle_timeout. The trip ends at the last moving sample, and its
+    totals are the ones at that sample - the idle tail is not counted.
+    """
+
+    def __init__(self, on_trip_closed, idle_timeout=300.0, engine_off_timeout=15.0,
+                 min_duration=30.0, max_gap=MAX_GAP_SECONDS):
+        self.on_trip_closed = on_trip_closed
+        self.idle_timeout = idle_timeout
+        self.engine_off_timeout = engine_off_timeout
+        self.min_duration = min_duration
+        self.max_gap = max_gap
+        self.trip = None
+        self.trips_closed = 0
+        self._engine_off_since = None
+        # add() runs on the ingest thread, close() also on API threads (trip reset)
+        self._lock = threading.RLock()
+
+    def add(self, ts, rpm, speed, fuel_rate):
+        """ts in epoch seconds, speed in km/h, fuel_rate in liters/second"""
+        with self._lock:
+            self._add(ts, rpm, speed, fuel_rate)
+
+    def _add(self, ts, rpm, speed, fuel_rate):
+        trip = self.trip
+        if trip is not None and ts - trip.last_ts > self.idle_timeout:
+            self.close()
+            trip = None
+
+        if trip is None:
+            if speed > 0:
+                self.trip = OpenTrip(ts, speed, fuel_rate)
+                self._engine_off_since = None
+            return
+
+        dt = ts - trip.last_ts
+        if 0 < dt <= self.max_gap:
+            trip.distance_km += dt * (speed + trip.last_speed) / 2 / 3600
+            trip.fuel_l += dt * (fuel_rate + trip.last_fuel) / 2
+            if speed > 0:
+                trip.moving_seconds += dt
+            elif rpm > 0:
+                trip.idle_seconds += dt
+        trip.samples += 1
+        trip.speed_sum += speed
+        if speed > trip.max_speed:
+            trip.max_speed = speed
+        trip.last_ts = ts
+        trip.last_speed = speed
+        trip.last_fuel = fuel_rate
+
+        if speed > 0:
+            trip.last_active = ts
+            trip.active_totals = trip.totals()
+            self._engine_off_since = None
+        elif rpm == 0:
+            if self._engine_off_since is None:
+                self._engine_off_since = ts
+            if ts - self._engine_off_since >= self.engine_off_timeout:
+                self.close()
+        elif ts - trip.last_active >= self.idle_timeout:
+            self.close()
+
+    def close(self):
+        """Finish the open trip (if any) and hand its summary to on_trip_closed"""
+        with self._lock:
+            trip = self.trip
+            self.trip = None
+            self._engine_off_since = None
+        if trip is None or trip.last_active - trip.start < self.min_duration:
+            return None
+
+        duration = trip.last_active - trip.start
+        samples, distance_km, fuel_l, moving_seconds, idle_seconds, speed_sum = trip.active_totals
+        summary = {
+            'start': trip.start,
+            'end': trip.last_active,
+            'duration_seconds': round(duration, 1),
+            'data_points': samples,
+            'total_distance_km': round(distance_km, 3),
+            'avg_speed': round(distance_km / (duration / 3600), 1) if duration else 0.0,
+            'avg_sample_speed': round(speed_sum / samples, 1),
+            'max_speed': trip.max_speed,
+            'fuel_used_liters': round(fuel_l, 3),
+            'fuel_per_km': round(fuel_l / distance_km, 4) if distance_km else None,
+            'idle_seconds': round(idle_seconds, 1),
+            'moving_seconds': round(moving_seconds, 1),
+        }
+        self.trips_closed += 1
+        self.on_trip_closed(summary)
+        return summary
@@ -0,0 +1,351 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+# Column list shared by the unsharded trip_data table and every day shard
+TRIP_DATA_COLUMNS = '''(
+    id INTEGER PRIMARY KEY,
+    timestamp DATETIME,
+    rpm INTEGER,
+    speed INTEGER,
+    coolant_temp INTEGER,
+    throttle INTEGER,
+    gear TEXT,
+    fuel_consumption REAL
+)'''
+
+# Catalog in the main database: one row per day file. ids are global across
+# the unsharded table and all shards, so min_id/max_id route id ranges too
+CREATE_SHARD_CATALOG = '''
+    CREATE TABLE IF NOT EXISTS trip_data_shards (
+        day TEXT PRIMARY KEY,
+        path TEXT,
+        min_id INTEGER,
+        max_id INTEGER,
+        rows INTEGER,
+        compacted INTEGER DEFAULT 0
+    )
+'''
+
+UPSERT_SHARD = '''
+    INSERT INTO trip_data_shards (day, path, min_id, max_id, rows) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(day) DO UPDATE SET max_id = excluded.max_id, rows = rows + excluded.rows, compacted = 0
+'''
+
+ARCHIVE_SUFFIX = '.vca'  # day shards converted to the columnar archive format
+
+MAINTENANCE_INTERVAL = 3600.0
+MAINTENANCE_DELAY = 60.0  # first pass after startup, out of the way of reconnect bursts
+DELETE_CHUNK = 10000  # unsharded rows deleted per transaction so ingest can interleave
+
+def day_of(value):
+    """'YYYY-MM-DD' of a datetime, date or stored timestamp string"""
+    return str(value)[:10]
+
+def shard_file(shard_dir, day):
+    return os.path.join(shard_dir, f'trip_data_{day}.db')
+
+def is_archive(path):
+    return path.endswith(ARCHIVE_SUFFIX)
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+def open_archive(path):
+    """Shared memory-mapped reader for an archived day, kept open across requests"""
+    with _archives_lock:
+        archive = _archives.get(path)
+        if archive is None:
+            from columnar_archive import ColumnarArchive  # numpy only once archives exist
+            archive = _archives[path] = ColumnarArchive(path)
+        return archive
+
+def forget_archive(path):
+    """Drop a cached reader and unmap its file, so a deleted archive's space is released"""
+    with _archives_lock:
+        archive = _archives.pop(path, None)
+    if archive is not None:
+        try:
+            archive.close()
+        except BufferError:
+            pass  # a reader still holds a view; the map goes when that does
+
+def prune_archives(conn):
+    """Forget cached archives the catalog no longer lists (expired by another process)"""
+    if not _archives:
+        return
+    try:
+        listed = {path for (path,) in conn.execute('SELECT path FROM trip_data_shards')}
+    except sqlite3.OperationalError:
+        return  # no catalog in this database
+    for path in [path for path in list(_archives) if path not in listed]:
+        forget_archive(path)
+
+def list_shards(conn, start=None, end=None, after_id=None):
+    """[(day, path)] of shards that can hold rows in [start, end) / past after_id, oldest first"""
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append('day >= ?')
+        params.append(day_of(start))
+    if end is not None:
+        conditions.append('day <= ?')
+        params.append(day_of(end))
+    if after_id is not None:
+        conditions.append('max_id > ?')
+        params.append(after_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    try:
+        return conn.execute(f'SELECT day, path FROM trip_data_shards {where} ORDER BY day', params).fetchall()
+    except sqlite3.OperationalError:
+        return []  # database that has never been sharded
+
+@contextmanager
+def attach(conn, path, alias='shard'):
+    conn.execute(f'ATTACH DATABASE ? AS {alias}', (path,))
+    try:
+        yield f'{alias}.trip_data'
+    finally:
+        conn.execute(f'DETACH DATABASE {alias}')
+
+def trip_data_tables(conn, start=None, end=None, after_id=None):
+    """Yield the trip_data tables covering [start, end) in time (and id) order:
+    the unsharded main table, then each matching day shard, attached while the
+    caller queries it. Archived days are yielded as ColumnarArchive readers
+    instead of table names. Close any cursor on a table before advancing."""
+    yield 'main.trip_data'
+    prune_archives(conn)
+    for _, path in list_shards(conn, start, end, after_id):
+        # Expired since the catalog was read; ATTACH would create an empty file
+        if not os.path.exists(path):
+            forget_archive(path)
+            continue
+        if is_archive(path):
+            yield open_archive(path)
+            continue
+        with attach(conn, path) as table:
+            yield table
+
+class ShardWriter:
+    """Routes trip_data inserts into one database file per local day"""
+
+    def __init__(self, conn, shard_dir, synchronous='NORMAL'):
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shard_dir = os.path.abspath(shard_dir)
+        self.synchronous = synchronous
+        self.attached = {}  # connection -> {day: schema alias}
+        conn.execute(CREATE_SHARD_CATALOG)
+        conn.commit()
+        last_id = conn.execute('SELECT MAX(id) FROM trip_data').fetchone()[0] or 0
+        for _, path in list_shards(conn)[-1:]:
+            if is_archive(path) or not os.path.exists(path):
+                continue  # archived days are closed; the catalog max_id covers them
+            # The newest shard itself, in case its catalog update didn't land
+            with attach(conn, path) as table:
+                last_id = max(last_id, conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0] or 0)
+        last_id = max(last_id, conn.execute('SELECT MAX(max_id) FROM trip_data_shards').fetchone()[0] or 0)
+        self.next_id = last_id + 1
+
+    def _split(self, rows):
+        """{day: rows}; batches almost always fall inside one day"""
+        first, last = day_of(rows[0][0]), day_of(rows[-1][0])
+        if first == last:
+            return {first: rows}
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(day_of(row[0]), []).append(row)
+        return by_day
+
+    def prepare(self, conn, rows):
+        """Attach the shards a batch needs (ATTACH can't run inside a transaction)
+        and detach the ones it doesn't, e.g. yesterday's after midnight"""
+        attached = self.attached.setdefault(conn, {})
+        days = self._split(rows)
+        for day in days:
+            if day in attached:
+                continue
+            alias = 'shard_' + day.replace('-', '')
+            conn.execute(f'ATTACH DATABASE ? AS {alias}', (shard_file(self.shard_dir, day),))
+            conn.execute(f'PRAGMA {alias}.journal_mode=WAL')
+            conn.execute(f'PRAGMA {alias}.synchronous={self.synchronous}')
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {alias}.trip_data {TRIP_DATA_COLUMNS}')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {alias}.idx_trip_data_timestamp ON trip_data(timestamp)')
+            conn.commit()
+            attached[day] = alias
+        for day in [day for day in attached if day not in days]:
+            conn.execute(f'DETACH DATABASE {attached.pop(day)}')
+        return days
+
+    def insert(self, conn, days):
+        """Inside the caller's transaction: insert each day's rows with global ids and update the catalog"""
+        aliases = self.attached[conn]
+        for day, rows in days.items():
+            first = self.next_id
+            conn.executemany(f'''
+                INSERT INTO {aliases[day]}.trip_data
+                (id, timestamp, rpm, speed, coolant_temp, throttle, gear, fuel_consumption)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(first + i, *row) for i, row in enumerate(rows)])
+            self.next_id += len(rows)
+            conn.execute(UPSERT_SHARD, (day, shard_file(self.shard_dir, day), first, self.next_id - 1, len(rows)))
+
+class ShardMaintenance:
+    """Background retention and compaction: expires raw rows older than
+    retention_days (rollups and per-day summaries are kept), converts day
+    shards older than archive_after_days to columnar archives and VACUUMs the
+    rest once they are closed. Only the shard being worked on is touched, so
+    ingest into today's shard carries on."""
+
+    def __init__(self, db_path, retention_days=None, interval=MAINTENANCE_INTERVAL, archive_after_days=None):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        # Never today's shard: it is still being written
+        self.archive_after_days = max(1, archive_after_days) if archive_after_days is not None else None
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='ShardMaintenance', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _loop(self):
+        delay = min(MAINTENANCE_DELAY, self.interval)
+        while not self.stopping.wait(delay):
+            try:
+                result = self.run_once()
+                if any(result.values()):
+                    print(f"🗄️  Storage maintenance: {result}")
+            except sqlite3.Error as e:
+                print(f"Storage maintenance error: {e}")
+            delay = self.interval
+
+    def run_once(self, today=None):
+        today = today or datetime.now().date()
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute(CREATE_SHARD_CATALOG)
+            conn.commit()
+            result = {'expired_shards': [], 'expired_rows': 0, 'archived_shards': [], 'compacted_shards': []}
+            if self.retention_days is not None:
+                cutoff = today - timedelta(days=self.retention_days)
+                result['expired_shards'], result['expired_rows'] = self.expire(conn, cutoff)
+            if self.archive_after_days is not None:
+                result['archived_shards'] = self.archive(conn, today - timedelta(days=self.archive_after_days))
+            result['compacted_shards'] = self.compact(conn, today)
+            return result
+        finally:
+            conn.close()
+
+    def expire(self, conn, cutoff):
+        """Drop raw rows from days before cutoff, persisting their day summaries first"""
+        oldest = [day for (day, _) in list_shards(conn, end=cutoff - timedelta(days=1))]
+        first = conn.execute('SELECT MIN(timestamp) FROM trip_data').fetchone()[0]
+        if first is not None and day_of(first) < str(cutoff):
+            oldest.insert(0, day_of(first))
+        if not oldest:
+            return [], 0
+
+        # Closed days are summarized into trip_summary once; do it while the rows exist
+        from trip_analytics import TripAnalytics
+        TripAnalytics(self.db_path).daily_summaries(date.fromisoformat(oldest[0]), cutoff - timedelta(days=1))
+
+        expired = []
+        for day, path in list_shards(conn, end=cutoff - timedelta(days=1)):
+            with conn:
+                conn.execute('DELETE FROM trip_data_shards WHERE day = ?', (day,))
+            # Readers attach by catalog, so none pick the file up after this
+            forget_archive(path)
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            expired.append(day)
+
+        deleted = 0
+        while not self.stopping.is_set():
+            with conn:
+                count = conn.execute('''
+                    DELETE FROM trip_data WHERE id IN (
+                        SELECT id FROM trip_data WHERE timestamp < ? LIMIT ?
+                    )
+                ''', (datetime.combine(cutoff, datetime.min.time()), DELETE_CHUNK)).rowcount
+            deleted += count
+            if count < DELETE_CHUNK:
+                break
+        return expired, deleted
+
+    def archive(self, conn, cutoff):
+        """Convert day shards from before cutoff into columnar archives, then drop the SQLite files"""
+        from columnar_archive import COLUMNS, ColumnarArchive, write_archive
+        archived = []
+        for day, path in list_shards(conn, end=cutoff - timedelta(days=1)):
+            if self.stopping.is_set():
+                break
+            if is_archive(path) or not os.path.exists(path):
+                continue
+            target = os.path.splitext(path)[0] + ARCHIVE_SUFFIX
+            shard = sqlite3.connect(path, timeout=5)
+            try:
+                rows, max_id = shard.execute('SELECT COUNT(*), MAX(id) FROM trip_data').fetchone()
+                written = write_archive(target, shard.execute(f"SELECT {', '.join(COLUMNS)} FROM trip_data ORDER BY id"))
+            except sqlite3.OperationalError as e:
+                print(f"Archiving of {day} deferred: {e}")
+                continue
+            finally:
+                shard.close()
+            # Read it back before the SQLite copy goes
+            archive = ColumnarArchive(target)
+            ok = archive.rows == written == rows and (not rows or int(archive.index[:, 3].max()) == max_id)
+            archive.close()
+            if not ok:
+                print(f"Archive of {day} failed verification; keeping {path}")
+                os.remove(target)
+                continue
+            with conn:
+                conn.execute('UPDATE trip_data_shards SET path = ?, compacted = 1 WHERE day = ?', (target, day))
+            before = sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+            # Readers that listed the old path before the update skip it once it is gone
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            archived.append((day, before, os.path.getsize(target)))
+        return archived
+
+    def compact(self, conn, today):
+        """VACUUM closed day shards that haven't been compacted since their last write"""
+        compacted = []
+        for day, path in conn.execute(
+                'SELECT day, path FROM trip_data_shards WHERE compacted = 0 AND day < ? ORDER BY day',
+                (str(today),)).fetchall():
+            if self.stopping.is_set() or not os.path.exists(path):
+                break
+            if is_archive(path):
+                continue
+            started = time.perf_counter()
+            shard = sqlite3.connect(path, timeout=5)
+            try:
+                shard.execute('VACUUM')
+                shard.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except sqlite3.OperationalError as e:
+                # Busy (e.g. a long export has it attached) - try again next pass
+                print(f"Compaction of {day} deferred: {e}")
+                continue
+            finally:
+                shard.close()
+            with conn:
+                conn.execute('UPDATE trip_data_shards SET compacted = 1 WHERE day = ?', (day,))
+            compacted.append((day, round(time.perf_counter() - started, 3)))
+        return compacted
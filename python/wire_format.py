@@ -0,0 +1,77 @@
+import struct
+
+# WebSocket subprotocols offered on the 8765 sample stream; plain JSON
+# text frames are still sent to clients that don't ask for either
+SUBPROTOCOL_BINARY = 'vep.bin.v1'
+SUBPROTOCOL_JSON = 'vep.json'
+SUBPROTOCOLS = [SUBPROTOCOL_BINARY, SUBPROTOCOL_JSON]
+
+MAGIC = b'VE'
+VERSION = 1
+
+# magic, version, flags (reserved), sample count, timestamp of first sample (epoch s)
+HEADER = struct.Struct('<2sBBHd')
+# ms since previous sample, rpm, coolant + 40 (OBD offset), throttle %, speed km/h
+RECORD = struct.Struct('<HHBBH')
+FIELDS = ('rpm', 'coolant', 'throttle', 'speed')
+
+class WireFormatError(ValueError):
+    pass
+
+def _clamp(value, low, high):
+    return low if value < low else high if value > high else value
+
+def encode_samples(samples):
+    """samples: [(timestamp, rpm, coolant, throttle, speed), ...] -> one binary frame"""
+    base = samples[0][0]
+    parts = [HEADER.pack(MAGIC, VERSION, 0, len(samples), base)]
+    previous = base
+    for ts, rpm, coolant, throttle, speed in samples:
+        parts.append(RECORD.pack(
+            _clamp(int(round((ts - previous) * 1000)), 0, 0xFFFF),
+            _clamp(int(rpm), 0, 0xFFFF),
+            _clamp(int(coolant) + 40, 0, 0xFF),
+            _clamp(int(throttle), 0, 0xFF),
+            _clamp(int(speed), 0, 0xFFFF),
+        ))
+        previous = ts
+    return b''.join(parts)
+
+def decode_frame(frame):
+    """Binary frame -> [(timestamp, rpm, coolant, throttle, speed), ...]"""
+    if len(frame) < HEADER.size:
+        raise WireFormatError('frame shorter than header')
+    magic, version, _, count, ts = HEADER.unpack_from(frame)
+    if magic != MAGIC or version != VERSION:
+        raise WireFormatError(f'unsupported frame {magic!r} v{version}')
+    if len(frame) != HEADER.size + count * RECORD.size:
+        raise WireFormatError('frame length does not match sample count')
+
+    samples = []
+    for dt_ms, rpm, coolant, throttle, speed in RECORD.iter_unpack(memoryview(frame)[HEADER.size:]):
+        ts += dt_ms / 1000
+        samples.append((ts, rpm, coolant - 40, throttle, speed))
+    return samples
+
+class BatchEncoder:
+    """Collects samples until batch_size are buffered, then returns a frame"""
+
+    def __init__(self, batch_size=1):
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+
+    def add(self, ts, rpm, coolant, throttle, speed):
+        self.pending.append((ts, rpm, coolant, throttle, speed))
+        if len(self.pending) < self.batch_size:
+            return None
+        frame = encode_samples(self.pending)
+        self.pending = []
+        return frame
+
+    def flush(self):
+        """Frame of whatever is still buffered (a short last batch), None if nothing is"""
+        if not self.pending:
+            return None
+        frame = encode_samples(self.pending)
+        self.pending = []
+        return frame
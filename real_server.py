@@ -2,31 +2,59 @@
 import asyncio
 import websockets
 import json
-import obd
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+from obd_reader import OBDReader
+from wire_format import SUBPROTOCOLS, SUBPROTOCOL_BINARY, encode_samples
+from readiness import notify_ready
+
+SEND_INTERVAL = 0.05  # 20 Hz snapshots to every client
+clients = set()
+binary_clients = set()
 
 async def real_obd(websocket, path):
-    connection = obd.OBD()
-    if not connection.is_connected():
-        await websocket.send(json.dumps({"error": "No car connected"}))
-        return
-    
-    print("REAL CAR CONNECTED! Streaming live data...")
+    # All clients share one OBD connection; the broadcaster does the sending
+    group = binary_clients if websocket.subprotocol == SUBPROTOCOL_BINARY else clients
+    group.add(websocket)
+    print(f"Client connected ({len(clients) + len(binary_clients)} total)")
+    try:
+        await websocket.wait_closed()
+    finally:
+        group.discard(websocket)
+
+async def broadcast_snapshots(reader):
+    last_sequence = None
     while True:
-        rpm = connection.query(obd.commands.RPM)
-        coolant = connection.query(obd.commands.COOLANT_TEMP)
-        throttle = connection.query(obd.commands.THROTTLE_POS)
-        speed = connection.query(obd.commands.SPEED)
+        if clients and not reader.connected:
+            websockets.broadcast(clients, json.dumps({"error": "No car connected"}))
+        elif reader.connected and reader.sequence != last_sequence:
+            last_sequence = reader.sequence
+            snapshot = reader.snapshot()
+            # Encode once per tick, whatever the number of clients
+            if clients:
+                websockets.broadcast(clients, json.dumps(snapshot))
+            if binary_clients:
+                websockets.broadcast(binary_clients, encode_samples([(
+                    time.time(), snapshot['rpm'], snapshot['coolant'],
+                    snapshot['throttle'], snapshot['speed']
+                )]))
+        await asyncio.sleep(SEND_INTERVAL)
 
-        data = {
-            "rpm": int(rpm.value.magnitude) if rpm.value else 0,
-            "coolant": int(coolant.value.to("degC").magnitude) if coolant.value else 0,
-            "throttle": int(throttle.value.magnitude) if throttle.value else 0,
-            "speed": int(speed.value.to("km/h").magnitude) if speed.value else 0,
-        }
-        await websocket.send(json.dumps(data))
-        await asyncio.sleep(0.05)
+async def main(reader):
+    async with websockets.serve(real_obd, "0.0.0.0", 8765, subprotocols=SUBPROTOCOLS):
+        print("REAL OBD SERVER RUNNING")
+        notify_ready('real_server')
+        await broadcast_snapshots(reader)
 
-start_server = websockets.serve(real_obd, "0.0.0.0", 8765)
-print("REAL OBD SERVER RUNNING")
-asyncio.get_event_loop().run_until_complete(start_server)
-asyncio.get_event_loop().run_forever()
\ No newline at end of file
+if __name__ == "__main__":
+    if '--emulate' in sys.argv:
+        # No dongle: poll the local ELM327 stand-in instead
+        from obd_emulator import emulated_connection_factory
+        reader = OBDReader(connection_factory=emulated_connection_factory())
+    else:
+        reader = OBDReader()
+    reader.start()
+    asyncio.run(main(reader))
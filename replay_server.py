@@ -0,0 +1,197 @@
+# replay_server.py  ← REPLAY RECORDED TRIPS ON THE 8765 PROTOCOL
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+from data_logger import DB_PATH, iter_trip_data
+from wire_format import SUBPROTOCOLS, SUBPROTOCOL_BINARY, BatchEncoder
+
+REPLAY_COLUMNS = ('id', 'timestamp', 'rpm', 'speed', 'coolant_temp', 'throttle')
+REPORT_INTERVAL = 5.0
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value).timestamp()
+
+def iter_db_samples(db_path, start=None, end=None):
+    """(ts, rpm, coolant, throttle, speed) from trip_data, oldest first"""
+    conn = sqlite3.connect(db_path)
+    try:
+        for rows in iter_trip_data(conn, REPLAY_COLUMNS, start, end):
+            for _, ts, rpm, speed, coolant, throttle in rows:
+                yield parse_timestamp(ts), rpm, coolant, throttle, speed
+    finally:
+        conn.close()
+
+def iter_file_samples(path):
+    """Same tuples from an /api/export NDJSON or CSV file (optionally .gz)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='') as f:
+        if '.csv' in path:
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            yield (parse_timestamp(record['timestamp']), int(record['rpm']), int(record['coolant_temp']),
+                   int(record['throttle']), int(record['speed']))
+
+class ReplayStats:
+    def __init__(self):
+        self.started = time.time()
+        self.samples = 0
+        self.connections = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+        self._window_samples = 0
+        self._window_lag_max = 0.0
+
+    def record(self, lag):
+        self.samples += 1
+        self._window_samples += 1
+        self.lag_sum += lag
+        if lag > self.lag_max:
+            self.lag_max = lag
+        if lag > self._window_lag_max:
+            self._window_lag_max = lag
+
+    def report(self, window):
+        line = {
+            'samples_per_second': round(self._window_samples / window, 1),
+            'window_max_lag_ms': round(self._window_lag_max * 1000, 2),
+            'connections': self.connections,
+            'total_samples': self.samples,
+        }
+        self._window_samples = 0
+        self._window_lag_max = 0.0
+        return line
+
+    def summary(self):
+        elapsed = time.time() - self.started
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'samples': self.samples,
+            'samples_per_second': round(self.samples / elapsed, 1) if elapsed else 0.0,
+            'avg_lag_ms': round(self.lag_sum / self.samples * 1000, 2) if self.samples else 0.0,
+            'max_lag_ms': round(self.lag_max * 1000, 2),
+        }
+
+class ReplayServer:
+    """Streams recorded samples to each client at speed x real time (speed=0: as fast as possible)
+
+    Lag is how far behind its schedule each sample leaves the server. JSON
+    frames carry sent_at so consumers can measure end-to-end latency too.
+    """
+
+    def __init__(self, sources, speed=1.0, batch=1, loop=False, stagger=0.0):
+        self.sources = sources
+        self.speed = speed
+        self.batch = batch
+        self.loop = loop
+        self.stagger = stagger
+        self.stats = ReplayStats()
+        self._next_source = 0
+
+    async def handler(self, websocket, path=None):
+        index = self._next_source
+        self._next_source += 1
+        source = self.sources[index % len(self.sources)]
+        binary = websocket.subprotocol == SUBPROTOCOL_BINARY
+        self.stats.connections += 1
+        print(f"Replay client {index + 1} connected ({'binary' if binary else 'json'})")
+        try:
+            while True:
+                await self._replay(websocket, source(), binary, index * self.stagger)
+                if not self.loop:
+                    break
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.stats.connections -= 1
+
+    async def _replay(self, websocket, samples, binary, skip_seconds):
+        encoder = BatchEncoder(self.batch) if binary else None
+        first_ts = None
+        wall_start = time.time()
+        sent = 0
+        for ts, rpm, coolant, throttle, speed in samples:
+            if first_ts is None:
+                first_ts = ts + skip_seconds
+            if ts < first_ts:
+                continue
+
+            if self.speed > 0:
+                due = wall_start + (ts - first_ts) / self.speed
+                delay = due - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lag = max(0.0, time.time() - due)
+            else:
+                lag = 0.0
+
+            if encoder is not None:
+                frame = encoder.add(ts, rpm, coolant, throttle, speed)
+                if frame is not None:
+                    await websocket.send(frame)
+            else:
+                await websocket.send(json.dumps({
+                    "rpm": rpm, "coolant": coolant, "throttle": throttle, "speed": speed,
+                    "ts": ts, "sent_at": time.time(),
+                }))
+            self.stats.record(lag)
+
+            sent += 1
+            if self.speed <= 0 and sent % 256 == 0:
+                # Let other connections run when replaying flat out
+                await asyncio.sleep(0)
+
+        # The tail of the recording rarely fills a whole batch
+        if encoder is not None:
+            frame = encoder.flush()
+            if frame is not None:
+                await websocket.send(frame)
+
+    async def reporter(self):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            print(json.dumps(self.stats.report(REPORT_INTERVAL)))
+
+async def main(args):
+    if args.file:
+        sources = [lambda path=path: iter_file_samples(path) for path in args.file]
+    else:
+        sources = [lambda: iter_db_samples(args.db, args.start, args.end)]
+
+    server = ReplayServer(sources, speed=args.speed, batch=args.batch, loop=args.loop, stagger=args.stagger)
+    async with websockets.serve(server.handler, "0.0.0.0", args.port, subprotocols=SUBPROTOCOLS):
+        pace = "as fast as possible" if args.speed <= 0 else f"{args.speed}x real time"
+        print(f"REPLAY SERVER RUNNING ON ws://0.0.0.0:{args.port} ({pace})")
+        try:
+            await server.reporter()
+        finally:
+            print(json.dumps(server.stats.summary()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded trip_data over the OBD WebSocket protocol")
+    parser.add_argument('--db', default=DB_PATH, help='SQLite database to replay from')
+    parser.add_argument('--start', help='first timestamp to replay (YYYY-MM-DD[ HH:MM:SS])')
+    parser.add_argument('--end', help='stop before this timestamp')
+    parser.add_argument('--file', action='append', help='/api/export NDJSON or CSV file; repeat for more vehicles')
+    parser.add_argument('--speed', type=float, default=1.0, help='real-time multiplier, 0 = as fast as possible')
+    parser.add_argument('--batch', type=int, default=1, help='samples per frame for binary clients')
+    parser.add_argument('--loop', action='store_true', help='start over when a recording ends')
+    parser.add_argument('--stagger', type=float, default=0.0,
+                        help='seconds into the recording each further client starts, so vehicles differ')
+    parser.add_argument('--port', type=int, default=8765)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass